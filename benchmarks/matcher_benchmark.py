@@ -0,0 +1,113 @@
+import random
+import string
+import time
+from argparse import ArgumentParser
+from typing import Dict, List, Optional, Tuple
+
+from src.matcher import TriageMatcher
+
+
+def random_text(length: int) -> str:
+    """
+    Returns random text made of letters and spaces.
+
+    :param length: The length of the text.
+    :type length: int
+    :return: The random text.
+    :rtype: str
+    """
+    return "".join(random.choice(string.ascii_letters + " ") for _ in range(length))
+
+
+def make_triages(error_count: int) -> Dict[str, str]:
+    """
+    Returns synthetic triage entries.
+
+    :param error_count: The number of triage entries.
+    :type error_count: int
+    :return: A dictionary of error resolutions.
+    :rtype: Dict[str, str]
+    """
+    return {f"[ERROR] {random_text(20)}": f"Resolution {i}" for i in range(error_count)}
+
+
+def make_logs(line_count: int) -> List[str]:
+    """
+    Returns synthetic log lines that do not contain any known error.
+
+    :param line_count: The number of log lines.
+    :type line_count: int
+    :return: The log lines.
+    :rtype: List[str]
+    """
+    return [f"12:00:00 [INFO] {random_text(80)}" for _ in range(line_count)]
+
+
+def nested_loop(logs: List[str], triages: Dict[str, str]) -> Optional[Tuple[str, str]]:
+    """
+    Looks for the first error by checking every triage key against every line.
+
+    :param logs: The log lines to search for errors.
+    :type logs: List[str]
+    :param triages: A dictionary of error resolutions.
+    :type triages: Dict[str, str]
+    :return: The matching line and its resolution, or None if no known error is found.
+    :rtype: Optional[Tuple[str, str]]
+    """
+    for line in logs:
+        for error, resolution in triages.items():
+            if error in line:
+                return line.strip(), resolution
+    return None
+
+
+def benchmark(error_count: int, line_count: int) -> None:
+    """
+    Prints the time taken by the nested loop and the compiled matcher.
+
+    :param error_count: The number of triage entries.
+    :type error_count: int
+    :param line_count: The number of log lines.
+    :type line_count: int
+    """
+    triages: Dict[str, str] = make_triages(error_count)
+    logs: List[str] = make_logs(line_count)
+
+    start_time: float = time.perf_counter()
+    expected: Optional[Tuple[str, str]] = nested_loop(logs, triages)
+    nested_time: float = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    matcher: TriageMatcher = TriageMatcher(triages)
+    compile_time: float = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    result: Optional[Tuple[str, str]] = matcher.find_error(logs)
+    matcher_time: float = time.perf_counter() - start_time
+    assert result == expected
+
+    print(
+        f"{error_count:>6} errors {line_count:>8} lines | "
+        f"nested loop {nested_time:8.3f}s | "
+        f"matcher {matcher_time:8.3f}s (+{compile_time:.3f}s compile)"
+    )
+
+
+if __name__ == "__main__":
+    parser: ArgumentParser = ArgumentParser(
+        description="Compare the triage matcher with the nested loop"
+    )
+    parser.add_argument(
+        "-e",
+        "--errors",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000, 3000],
+        help="Numbers of triage entries",
+    )
+    parser.add_argument(
+        "-l", "--lines", type=int, default=20000, help="Number of log lines"
+    )
+    args = parser.parse_args()
+    random.seed(0)
+    for errors in args.errors:
+        benchmark(errors, args.lines)
@@ -0,0 +1,141 @@
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from src.atomic_file import get_cache_file
+
+SRC: Path = Path(__file__).parent.parent / "src"
+
+
+def python(args: List[str], cwd: str) -> Tuple[float, str]:
+    """
+    Runs the interpreter with the sources on its path.
+
+    :param args: The arguments of the interpreter.
+    :type args: List[str]
+    :param cwd: The working directory.
+    :type cwd: str
+    :return: The wall time in seconds and the standard error of the run.
+    :rtype: Tuple[float, str]
+    """
+    env: Dict[str, str] = {**os.environ, "PYTHONPATH": str(SRC)}
+    start_time: float = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable] + args,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    return time.perf_counter() - start_time, process.stderr
+
+
+def parse_importtime(output: str) -> Dict[str, int]:
+    """
+    Returns the cumulative import time of every module from the output of
+    python -X importtime.
+
+    :param output: The standard error of the run.
+    :type output: str
+    :return: The cumulative import time in microseconds per module.
+    :rtype: Dict[str, int]
+    """
+    times: Dict[str, int] = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def benchmark_imports(module: str, runs: int, top: int, cwd: str) -> None:
+    """
+    Prints the import time of a module and of its slowest dependencies.
+
+    :param module: The module to import.
+    :type module: str
+    :param runs: The number of runs, the median is printed.
+    :type runs: int
+    :param top: The number of slowest dependencies printed.
+    :type top: int
+    :param cwd: The working directory.
+    :type cwd: str
+    """
+    samples: List[Dict[str, int]] = [
+        parse_importtime(python(["-X", "importtime", "-c", f"import {module}"], cwd)[1])
+        for _ in range(runs)
+    ]
+    medians: Dict[str, float] = {
+        name: statistics.median(sample.get(name, 0) for sample in samples)
+        for name in samples[0]
+    }
+    print(f"import {module}: {medians[module] / 1000:.1f}ms")
+    slowest: List[str] = sorted(medians, key=medians.__getitem__, reverse=True)
+    for name in [name for name in slowest if name != module][:top]:
+        print(f"  {name:<40} {medians[name] / 1000:8.1f}ms")
+
+
+def benchmark_runs(runs: int, cwd: str) -> None:
+    """
+    Prints the wall time of the interpreter alone, and of runs of a configuration with
+    a single true command, with a cold then a warm configuration cache.
+
+    :param runs: The number of warm runs, the median is printed.
+    :type runs: int
+    :param cwd: The working directory.
+    :type cwd: str
+    """
+    config: Path = Path(cwd) / "startup.yaml"
+    config.write_text(
+        "commands:\n"
+        f"- name: startup_benchmark\n  id: startup_benchmark_{os.getpid()}\n"
+        '  values: ["true"]\n'
+    )
+    script: str = str(SRC / "wait_elegantly.py")
+    history: List[str] = ["--history", "text", "--display", "status"]
+    bare: float = statistics.median(python(["-c", "pass"], cwd)[0] for _ in range(runs))
+    cold: float = python([script, str(config)] + history, cwd)[0]
+    warm: float = statistics.median(
+        python([script, str(config)] + history, cwd)[0] for _ in range(runs)
+    )
+    print(f"python -c pass: {bare * 1000:.1f}ms")
+    print(f"wait_elegantly.py, cold config cache: {cold * 1000:.1f}ms")
+    print(f"wait_elegantly.py, warm config cache: {warm * 1000:.1f}ms")
+    for path in (SRC.parent / "build/log").glob(f"startup_benchmark_{os.getpid()}_*"):
+        path.unlink()
+    (SRC.parent / f"build/history/startup_benchmark_{os.getpid()}.txt").unlink()
+    get_cache_file(str(config), SRC.parent / "build/cache/config").unlink()
+
+
+if __name__ == "__main__":
+    parser: ArgumentParser = ArgumentParser(
+        description="Measure the startup time of wait_elegantly.py"
+    )
+    parser.add_argument(
+        "-m",
+        "--modules",
+        type=str,
+        nargs="+",
+        default=["wait_elegantly", "client"],
+        help="Modules whose import time is measured",
+    )
+    parser.add_argument(
+        "-n", "--runs", type=int, default=10, help="Number of runs of every case"
+    )
+    parser.add_argument(
+        "--top", type=int, default=10, help="Number of slowest imports printed"
+    )
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for module in args.modules:
+            benchmark_imports(module, args.runs, args.top, temp_dir)
+        benchmark_runs(args.runs, temp_dir)
@@ -0,0 +1,428 @@
+import contextlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from src.analyze_log import iter_logs, look_for_error
+from src.command import Command, RunOptions, get_log_file_path
+from src.history import SqliteHistory, get_history_times
+from src.scheduler import Scheduler
+
+LINE_POOL_SIZE = 1000
+MEGABYTE = 1024 * 1024
+REGRESSION_THRESHOLD = 1.2
+
+Result = Dict[str, Any]
+
+
+def random_text(length: int) -> str:
+    """
+    Returns random text made of letters and spaces.
+
+    :param length: The length of the text.
+    :type length: int
+    :return: The random text.
+    :rtype: str
+    """
+    return "".join(random.choice(string.ascii_letters + " ") for _ in range(length))
+
+
+def make_log(path: Path, size: int) -> None:
+    """
+    Writes a synthetic log file that does not contain any known error.
+
+    The lines are drawn from a small pool so that logs of several gigabytes are
+    written at disk speed.
+
+    :param path: The path of the log file.
+    :type path: Path
+    :param size: The size of the log file in bytes.
+    :type size: int
+    """
+    pool: List[str] = [
+        f"12:00:00 [INFO] {random_text(80)}\n" for _ in range(LINE_POOL_SIZE)
+    ]
+    chunk: str = "".join(pool)
+    written: int = 0
+    with open(path, "w") as f:
+        while written < size:
+            f.write(chunk)
+            written += len(chunk)
+
+
+def make_triages(error_count: int) -> Dict[str, str]:
+    """
+    Returns synthetic triage entries.
+
+    :param error_count: The number of triage entries.
+    :type error_count: int
+    :return: A dictionary of error resolutions.
+    :rtype: Dict[str, str]
+    """
+    return {f"[ERROR] {random_text(20)}": f"Resolution {i}" for i in range(error_count)}
+
+
+def make_text_history(path: Path, entries: int) -> None:
+    """
+    Writes a text history file.
+
+    :param path: The path of the history file.
+    :type path: Path
+    :param entries: The number of runs in the history.
+    :type entries: int
+    """
+    with open(path, "w") as f:
+        f.writelines(f"{random.randint(1, 600)}\n" for _ in range(entries))
+
+
+def make_sqlite_history(path: Path, cmd_id: str, entries: int) -> SqliteHistory:
+    """
+    Returns a sqlite history holding the given number of runs of a command.
+
+    :param path: The path of the database.
+    :type path: Path
+    :param cmd_id: The id of the command.
+    :type cmd_id: str
+    :param entries: The number of runs in the history.
+    :type entries: int
+    :return: The history.
+    :rtype: SqliteHistory
+    """
+    history: SqliteHistory = SqliteHistory(path, path.parent / "none")
+    with sqlite3.connect(path) as connection:
+        connection.executemany(
+            "INSERT INTO runs (command, timestamp, duration, exit_code, host, log) "
+            "VALUES (?, ?, ?, 0, 'host', '')",
+            ((cmd_id, i, random.randint(1, 600)) for i in range(entries)),
+        )
+    return history
+
+
+@contextlib.contextmanager
+def quiet() -> Iterator[None]:
+    """
+    Discards everything written to stdout and stderr, including by the progress bars.
+
+    :return: A context where the output is discarded.
+    :rtype: Iterator[None]
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved: List[int] = [os.dup(1), os.dup(2)]
+    null: int = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(null, 1)
+        os.dup2(null, 2)
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        for fd in saved + [null]:
+            os.close(fd)
+
+
+def measure(
+    name: str, params: Dict[str, Any], func: Callable[[], Any], memory: bool
+) -> Result:
+    """
+    Runs a benchmark case and returns its result.
+
+    The peak memory is measured in a second run under tracemalloc, so that tracing
+    does not slow down the timed run.
+
+    :param name: The name of the benchmark.
+    :type name: str
+    :param params: The parameters of the case.
+    :type params: Dict[str, Any]
+    :param func: The function to measure.
+    :type func: Callable[[], Any]
+    :param memory: Whether to measure the peak memory.
+    :type memory: bool
+    :return: The result of the case.
+    :rtype: Result
+    """
+    start_time: float = time.perf_counter()
+    func()
+    result: Result = {
+        "name": name,
+        "params": params,
+        "seconds": time.perf_counter() - start_time,
+    }
+    if memory:
+        tracemalloc.start()
+        func()
+        result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    print(f"{name} {params}: {result['seconds']:.3f}s", file=sys.stderr)
+    return result
+
+
+def bench_triage(
+    directory: Path, log_sizes: List[int], triage_sizes: List[int], memory: bool
+) -> List[Result]:
+    """
+    Measures the throughput of look_for_error on streamed logs without known errors.
+
+    :param directory: The directory of the synthetic files.
+    :type directory: Path
+    :param log_sizes: The sizes of the logs in megabytes.
+    :type log_sizes: List[int]
+    :param triage_sizes: The numbers of triage entries.
+    :type triage_sizes: List[int]
+    :param memory: Whether to measure the peak memory.
+    :type memory: bool
+    :return: The results.
+    :rtype: List[Result]
+    """
+    results: List[Result] = []
+    for log_size in log_sizes:
+        log: Path = directory / f"{log_size}.log"
+        make_log(log, log_size * MEGABYTE)
+        for triage_size in triage_sizes:
+            triages: Dict[str, str] = make_triages(triage_size)
+            result: Result = measure(
+                "look_for_error",
+                {"log_mb": log_size, "triage_keys": triage_size},
+                lambda: look_for_error(iter_logs(str(log)), triages),
+                memory,
+            )
+            result["mb_per_second"] = log_size / result["seconds"]
+            results.append(result)
+        log.unlink()
+    return results
+
+
+def bench_history(directory: Path, entries: int, memory: bool) -> List[Result]:
+    """
+    Measures the time taken to load the history of a command.
+
+    :param directory: The directory of the synthetic files.
+    :type directory: Path
+    :param entries: The number of runs in the history.
+    :type entries: int
+    :param memory: Whether to measure the peak memory.
+    :type memory: bool
+    :return: The results.
+    :rtype: List[Result]
+    """
+    text: Path = directory / "build.txt"
+    make_text_history(text, entries)
+    history: SqliteHistory = make_sqlite_history(
+        directory / "history.db", "build", entries
+    )
+    params: Dict[str, Any] = {"entries": entries}
+    return [
+        measure(
+            "get_history_times",
+            params,
+            lambda: get_history_times(text),
+            memory,
+        ),
+        measure(
+            "get_history_times_window",
+            params,
+            lambda: get_history_times(text, 100),
+            memory,
+        ),
+        measure(
+            "sqlite_history_times",
+            params,
+            lambda: history.times("build"),
+            memory,
+        ),
+        measure(
+            "sqlite_history_estimator",
+            params,
+            lambda: history.estimator("build"),
+            memory,
+        ),
+    ]
+
+
+def bench_runner(
+    directory: Path, command_count: int, values: List[str], memory: bool
+) -> List[Result]:
+    """
+    Measures the scheduling overhead of Command.run on commands doing nothing.
+
+    The commands are run twice: without history, then with the history and the
+    progress bar of the first run.
+
+    :param directory: The directory of the synthetic files.
+    :type directory: Path
+    :param command_count: The number of commands.
+    :type command_count: int
+    :param values: The command line of every command.
+    :type values: List[str]
+    :param memory: Whether to measure the peak memory.
+    :type memory: bool
+    :return: The results.
+    :rtype: List[Result]
+    """
+    prefix: str = f"benchmark_{os.getpid()}"
+    commands: List[Command] = [
+        Command({"name": f"{prefix}_{i}", "id": f"{prefix}_{i}", "values": values})
+        for i in range(command_count)
+    ]
+    scheduler: Scheduler = Scheduler(commands)
+    options: RunOptions = RunOptions(
+        history=SqliteHistory(directory / "runner.db", directory / "none")
+    )
+    params: Dict[str, Any] = {"commands": command_count, "values": values}
+    results: List[Result] = []
+    for name in ("command_run_first", "command_run_with_history"):
+        with quiet():
+            result: Result = measure(
+                name, params, lambda: scheduler.run(options), False
+            )
+        print(f"{name} {params}: {result['seconds']:.3f}s", file=sys.stderr)
+        results.append(result)
+    if memory:
+        tracemalloc.start()
+        with quiet():
+            scheduler.run(options)
+        results[-1]["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    for result in results:
+        result["ms_per_command"] = result["seconds"] * 1000 / command_count
+    for log in get_log_file_path(prefix).parent.glob(f"{prefix}_*"):
+        log.unlink()
+    return results
+
+
+def get_commit() -> Optional[str]:
+    """
+    Returns the current git commit, if any.
+
+    :return: The hash of the commit, or None outside of a git repository.
+    :rtype: Optional[str]
+    """
+    try:
+        commit: str = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        return commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> bool:
+    """
+    Prints the ratio of every result to the same case of a baseline.
+
+    :param baseline: The results of a previous run of the suite.
+    :type baseline: Dict[str, Any]
+    :param current: The results of this run of the suite.
+    :type current: Dict[str, Any]
+    :return: Whether any case got slower than the regression threshold.
+    :rtype: bool
+    """
+    previous: Dict[str, Result] = {
+        json.dumps([result["name"], result["params"]]): result
+        for result in baseline["results"]
+    }
+    regression: bool = False
+    for result in current["results"]:
+        before: Optional[Result] = previous.get(
+            json.dumps([result["name"], result["params"]])
+        )
+        if before is None:
+            continue
+        ratio: float = result["seconds"] / max(before["seconds"], 1e-9)
+        slower: bool = ratio > REGRESSION_THRESHOLD
+        regression = regression or slower
+        print(
+            f"{result['name']} {result['params']}: {ratio:.2f}x"
+            f"{' REGRESSION' if slower else ''}",
+            file=sys.stderr,
+        )
+    return regression
+
+
+if __name__ == "__main__":
+    parser: ArgumentParser = ArgumentParser(
+        description="Benchmark the runner, triage and history hot paths"
+    )
+    parser.add_argument(
+        "--log-sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100],
+        help="Sizes of the synthetic logs in MB, up to 2000",
+    )
+    parser.add_argument(
+        "--triage-sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000, 10000],
+        help="Numbers of triage entries",
+    )
+    parser.add_argument(
+        "--history-entries",
+        type=int,
+        default=1000000,
+        help="Number of runs in the synthetic history",
+    )
+    parser.add_argument(
+        "--commands", type=int, default=200, help="Number of commands to run"
+    )
+    parser.add_argument(
+        "--command",
+        type=str,
+        nargs="+",
+        default=["true"],
+        help="Command line of every command, e.g. sleep 0",
+    )
+    parser.add_argument(
+        "--no-memory", action="store_true", help="Do not measure the peak memory"
+    )
+    parser.add_argument(
+        "-o", "--output", type=str, help="Path of the JSON results, stdout by default"
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        help="Path of the JSON results of a previous run to compare with",
+    )
+    args = parser.parse_args()
+    random.seed(0)
+    memory: bool = not args.no_memory
+
+    results: List[Result] = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory: Path = Path(temp_dir)
+        results += bench_triage(directory, args.log_sizes, args.triage_sizes, memory)
+        results += bench_history(directory, args.history_entries, memory)
+        results += bench_runner(directory, args.commands, args.command, memory)
+
+    report: Dict[str, Any] = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare, "r") as f:
+            if compare(json.load(f), report):
+                sys.exit(1)
@@ -0,0 +1,139 @@
+import os
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Callable, Tuple
+
+from src.log_pump import PUMP_CHUNK_SIZE, LogPump
+from src.output_tee import OutputTee
+
+MEGABYTE = 1024 * 1024
+LINE = "12:00:00 [INFO] Compiling src/module.c with some flags and a long path name"
+
+
+def start_output(size: int) -> Tuple["subprocess.Popen[bytes]", int]:
+    """
+    Starts a command writing lines of output to a pipe.
+
+    :param size: The number of bytes of output.
+    :type size: int
+    :return: The process and the read end of the pipe.
+    :rtype: Tuple[subprocess.Popen[bytes], int]
+    """
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen(
+        ["sh", "-c", f"yes '{LINE}' | head -c {size}"], stdout=write_fd
+    )
+    os.close(write_fd)
+    return process, read_fd
+
+
+def python_tee(fd: int, log: Path, console: int) -> None:
+    """
+    Copies the output to the console with a read and write loop, and to the log with
+    the pump of the commands.
+
+    :param fd: The read end of the pipe.
+    :type fd: int
+    :param log: The path to the log file.
+    :type log: Path
+    :param console: The file descriptor of the console.
+    :type console: int
+    """
+    read_fd, write_fd = os.pipe()
+
+    def copy() -> None:
+        while chunk := os.read(fd, PUMP_CHUNK_SIZE):
+            os.write(write_fd, chunk)
+            os.write(console, chunk)
+        os.close(write_fd)
+        os.close(fd)
+
+    thread: threading.Thread = threading.Thread(target=copy, daemon=True)
+    thread.start()
+    log_pump(read_fd, log)
+    thread.join()
+
+
+def log_pump(fd: int, log: Path) -> None:
+    """
+    Copies the output to the log with the pump of the commands.
+
+    :param fd: The read end of the pipe.
+    :type fd: int
+    :param log: The path to the log file.
+    :type log: Path
+    """
+    pump: LogPump = LogPump(fd, open(log, "wb"))
+    pump.start()
+    pump.wait(3600)
+    pump.close()
+
+
+def output_tee(fd: int, log: Path, console: int) -> None:
+    """
+    Copies the output to the console with the tee of the live output, and to the log
+    with the pump of the commands.
+
+    :param fd: The read end of the pipe.
+    :type fd: int
+    :param log: The path to the log file.
+    :type log: Path
+    :param console: The file descriptor of the console.
+    :type console: int
+    """
+    log_pump(OutputTee(fd, console).start(), log)
+
+
+def measure(name: str, size: int, copy: Callable[[int], None]) -> None:
+    """
+    Prints the throughput of a copy of the output and the CPU time it used.
+
+    :param name: The name of the case.
+    :type name: str
+    :param size: The number of bytes of output.
+    :type size: int
+    :param copy: The copy, given the read end of the pipe.
+    :type copy: Callable[[int], None]
+    """
+    process, fd = start_output(size)
+    usage: resource.struct_rusage = resource.getrusage(resource.RUSAGE_SELF)
+    start_time: float = time.perf_counter()
+    copy(fd)
+    seconds: float = time.perf_counter() - start_time
+    process.wait()
+    end: resource.struct_rusage = resource.getrusage(resource.RUSAGE_SELF)
+    cpu: float = end.ru_utime + end.ru_stime - usage.ru_utime - usage.ru_stime
+    print(
+        f"{name:<28} {size / MEGABYTE / seconds:8.0f} MB/s {seconds:7.2f}s "
+        f"{cpu:7.2f}s CPU"
+    )
+
+
+if __name__ == "__main__":
+    parser: ArgumentParser = ArgumentParser(
+        description="Compare the live output with a tee written in Python"
+    )
+    parser.add_argument(
+        "-s", "--size", type=int, default=1024, help="Size of the output in MB"
+    )
+    parser.add_argument(
+        "--console",
+        type=str,
+        default=os.devnull,
+        help="Where the output is shown, /dev/null by default",
+    )
+    args = parser.parse_args()
+    size: int = args.size * MEGABYTE
+    console: int = os.open(args.console, os.O_WRONLY)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        log: Path = Path(temp_dir) / "log.txt"
+        print(f"{'':<28} {'throughput':>13} {'time':>8} {'this process':>16}")
+        measure("log only", size, lambda fd: log_pump(fd, log))
+        measure("python tee", size, lambda fd: python_tee(fd, log, console))
+        measure("live output", size, lambda fd: output_tee(fd, log, console))
+    os.close(console)
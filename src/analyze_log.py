@@ -1,20 +1,31 @@
 import json
 import logging
+import mmap
 import os
-from argparse import ArgumentParser
-from typing import Tuple, List, Dict
+from argparse import ArgumentParser, Namespace
+from typing import Tuple, List, Dict, Iterable, Iterator, Optional
+
+from log_store import NONE, get_compression, iter_log_lines
+from matcher import TriageMatcher
+from triage_cache import load_matcher
 
 logger = logging.getLogger(__name__)
 
 
-def analyze_log_file(log_file_path: str, triage_file_path: str) -> Tuple[str, str]:
+def analyze_log_file(
+    log_file_path: str, triage_file_path: str, reverse: bool = False
+) -> Tuple[str, str]:
     """
     Analyzes a log file and returns the first error found and its resolution.
 
+    The log file is streamed and the scan stops at the first known error.
+
     :param log_file_path: The path to the log file to analyze.
     :type log_file_path: str
     :param triage_file_path: The path to the triage file containing error resolutions.
     :type triage_file_path: str
+    :param reverse: Whether to scan the log from its end and return the last error found instead.
+    :type reverse: bool
     :return: A tuple containing the first error found and its resolution.
     :rtype: Tuple[str, str]
     """
@@ -22,35 +33,146 @@ def analyze_log_file(log_file_path: str, triage_file_path: str) -> Tuple[str, st
     check_valid_file(log_file_path)
     logger.debug(f"Given triage file path: {triage_file_path}")
     check_valid_file(triage_file_path)
-    logs: List[str] = load_logs(log_file_path)
-    triages: Dict[str, str] = load_triages(triage_file_path)
-    analysis: Tuple[str, str] = look_for_error(logs, triages)
+    logs: Iterator[str] = iter_logs(log_file_path, reverse)
+    matcher: TriageMatcher = load_matcher(triage_file_path)
+    analysis: Tuple[str, str] = report_analysis(matcher.find_error(logs))
     return analysis
 
 
-def look_for_error(logs: List[str], triages: Dict[str, str]) -> Tuple[str, str]:
+def analyze_log_tail(
+    tail: List[str], log_file_path: str, triage_file_path: str, reverse: bool = False
+) -> Tuple[str, str]:
+    """
+    Analyzes the last lines of a log kept in memory, and the whole log file only if no
+    known error is found in them.
+
+    :param tail: The last lines of the log.
+    :type tail: List[str]
+    :param log_file_path: The path to the log file to analyze.
+    :type log_file_path: str
+    :param triage_file_path: The path to the triage file containing error resolutions.
+    :type triage_file_path: str
+    :param reverse: Whether to look for the last known error instead of the first one.
+    :type reverse: bool
+    :return: A tuple containing the error found and its resolution.
+    :rtype: Tuple[str, str]
+    """
+    logger.debug(f"Given triage file path: {triage_file_path}")
+    check_valid_file(triage_file_path)
+    matcher: TriageMatcher = load_matcher(triage_file_path)
+    analysis: Optional[Tuple[str, str]] = matcher.find_error(
+        reversed(tail) if reverse else tail
+    )
+    if analysis:
+        report_error(analysis)
+        return analysis
+    logger.debug("No known error in the last lines, analyzing the whole log")
+    return analyze_log_file(log_file_path, triage_file_path, reverse)
+
+
+def look_for_error(logs: Iterable[str], triages: Dict[str, str]) -> Tuple[str, str]:
     """
     Looks for an error in the given logs and returns the first error found and its resolution.
 
-    :param logs: A list of log lines to search for errors.
-    :type logs: List[str]
+    :param logs: The log lines to search for errors.
+    :type logs: Iterable[str]
     :param triages: A dictionary of error resolutions where the key is the error and the value is the resolution.
     :type triages: Dict[str, str]
     :return: A tuple containing the first error found and its resolution.
     :rtype: Tuple[str, str]
     """
-    for line in logs:
-        for error, resolution in triages.items():
-            if error in line:
-                logger.info("------------------------------------------------")
-                logger.info(f"ERROR FOUND:   {line.strip()}")
-                logger.info(f"RESOLUTION:    {resolution}")
-                logger.info("------------------------------------------------")
-                return line.strip(), resolution
+    return report_analysis(find_error(logs, triages))
+
+
+def find_error(
+    logs: Iterable[str], triages: Dict[str, str]
+) -> Optional[Tuple[str, str]]:
+    """
+    Returns the first log line containing a known error together with its resolution.
+
+    :param logs: The log lines to search for errors.
+    :type logs: Iterable[str]
+    :param triages: A dictionary of error resolutions where the key is the error and the value is the resolution.
+    :type triages: Dict[str, str]
+    :return: The matching line and its resolution, or None if no known error is found.
+    :rtype: Optional[Tuple[str, str]]
+    """
+    analysis: Optional[Tuple[str, str]] = TriageMatcher(triages).find_error(logs)
+    return analysis
+
+
+def report_analysis(analysis: Optional[Tuple[str, str]]) -> Tuple[str, str]:
+    """
+    Logs the result of a log analysis.
+
+    :param analysis: The line containing the error and its resolution, or None if no known error was found.
+    :type analysis: Optional[Tuple[str, str]]
+    :return: A tuple containing the error found and its resolution, empty if no known error was found.
+    :rtype: Tuple[str, str]
+    """
+    if analysis:
+        report_error(analysis)
+        return analysis
     logger.debug("Unknown Error")
     return "", ""
 
 
+def report_error(analysis: Tuple[str, str]) -> None:
+    """
+    Logs a found error and its resolution.
+
+    :param analysis: The line containing the error and its resolution.
+    :type analysis: Tuple[str, str]
+    """
+    line, resolution = analysis
+    logger.info("------------------------------------------------")
+    logger.info(f"ERROR FOUND:   {line}")
+    logger.info(f"RESOLUTION:    {resolution}")
+    logger.info("------------------------------------------------")
+
+
+class StreamingTriage:
+    def __init__(self, triage_file_path: str):
+        """
+        Initializes a StreamingTriage object that triages a log while it is written.
+
+        :param triage_file_path: The path to the triage file containing error resolutions.
+        :type triage_file_path: str
+        """
+        logger.debug(f"Given triage file path: {triage_file_path}")
+        check_valid_file(triage_file_path)
+        self.matcher: TriageMatcher = load_matcher(triage_file_path)
+        self.analysis: Optional[Tuple[str, str]] = None
+
+    def feed(self, lines: Iterable[str]) -> bool:
+        """
+        Looks for a known error in the new lines of the log.
+
+        The resolution is reported as soon as a known error is found.
+
+        :param lines: The lines written since the previous call.
+        :type lines: Iterable[str]
+        :return: Whether a known error was found so far.
+        :rtype: bool
+        """
+        if self.analysis is None:
+            self.analysis = self.matcher.find_error(lines)
+            if self.analysis:
+                report_error(self.analysis)
+        return self.analysis is not None
+
+    def finish(self) -> Tuple[str, str]:
+        """
+        Returns the first error found in the whole log and its resolution.
+
+        :return: A tuple containing the first error found and its resolution.
+        :rtype: Tuple[str, str]
+        """
+        if self.analysis:
+            return self.analysis
+        return report_analysis(None)
+
+
 def check_valid_file(given_file_path: str) -> None:
     """
     Checks if the given file path is valid and raises an exception if it is not.
@@ -74,9 +196,57 @@ def load_logs(log_file_path: str) -> List[str]:
     :return: A list of log lines.
     :rtype: List[str]
     """
-    with open(log_file_path, "r") as f:
-        lines: List[str] = [line.rstrip() for line in f]
-        return lines
+    lines: List[str] = list(iter_logs(log_file_path))
+    return lines
+
+
+def iter_logs(log_file_path: str, reverse: bool = False) -> Iterator[str]:
+    """
+    Yields the lines of a log file one at a time, decompressing gzip and zstd logs as a
+    stream.
+
+    :param log_file_path: The path to the log file to read.
+    :type log_file_path: str
+    :param reverse: Whether to yield the lines from the end of the file, compressed logs being decompressed in memory first.
+    :type reverse: bool
+    :return: An iterator over the log lines.
+    :rtype: Iterator[str]
+    """
+    if get_compression(log_file_path) != NONE:
+        if reverse:
+            yield from reversed(list(iter_log_lines(log_file_path)))
+        else:
+            yield from iter_log_lines(log_file_path)
+    elif reverse:
+        yield from iter_logs_reversed(log_file_path)
+    else:
+        with open(log_file_path, "r", errors="replace") as f:
+            for line in f:
+                yield line.rstrip()
+
+
+def iter_logs_reversed(log_file_path: str) -> Iterator[str]:
+    """
+    Yields the lines of a log file from the last one to the first one.
+
+    The file is memory-mapped so only the lines actually read are paged in.
+
+    :param log_file_path: The path to the log file to read.
+    :type log_file_path: str
+    :return: An iterator over the log lines in reverse order.
+    :rtype: Iterator[str]
+    """
+    with open(log_file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            end: int = len(data)
+            if data[end - 1] == ord("\n"):
+                end -= 1
+            while end >= 0:
+                start: int = data.rfind(b"\n", 0, end) + 1
+                yield data[start:end].decode(errors="replace").rstrip()
+                end = start - 1
 
 
 def load_triages(triage_file_path: str) -> Dict[str, str]:
@@ -105,14 +275,67 @@ def args_parser() -> ArgumentParser:
     :rtype: ArgumentParser
     """
     arg_parser: ArgumentParser = ArgumentParser(description="Analyze log file")
-    arg_parser.add_argument("path", type=str, help="Path to a log file")
+    arg_parser.add_argument(
+        "path",
+        type=str,
+        help="Path to a log file, or a directory or glob of logs to analyze in batch",
+    )
     arg_parser.add_argument("triage_file_path", type=str, help="a path to another file")
     arg_parser.add_argument(
         "-v", "--verbose", action="store_true", help="Set the log level to DEBUG"
     )
+    arg_parser.add_argument(
+        "-r",
+        "--reverse",
+        action="store_true",
+        help="Scan the log from its end, reporting the last known error",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of processes analyzing a batch of logs, the number of CPUs by default",
+    )
+    arg_parser.add_argument(
+        "--failed",
+        choices=["sqlite"],
+        help="Only analyze the logs of the runs recorded as failed in this history",
+    )
+    arg_parser.add_argument(
+        "--top",
+        type=int,
+        default=0,
+        help="Number of errors shown per command and per day, 0 for all of them",
+    )
+    arg_parser.add_argument(
+        "--json", type=str, metavar="PATH", help="Also write the batch report as JSON"
+    )
     return arg_parser
 
 
+def analyze_batch(args: Namespace) -> None:
+    """
+    Analyzes a directory or a glob of logs and prints the counts of the known errors.
+
+    :param args: The parsed command line arguments.
+    :type args: Namespace
+    :raises ValueError: If no log is found.
+    """
+    from batch_analysis import BatchReport, analyze_logs, filter_failed_logs
+    from batch_analysis import find_logs, print_batch_report, save_batch_report
+    from history import open_history
+
+    paths: List[str] = find_logs(args.path)
+    if args.failed:
+        paths = filter_failed_logs(paths, open_history(args.failed))
+    logger.info(f"Analyzing {len(paths)} logs")
+    report: BatchReport = analyze_logs(paths, args.triage_file_path, args.jobs)
+    print_batch_report(report, args.top)
+    if args.json:
+        save_batch_report(report, args.json)
+
+
 if __name__ == "__main__":
     parser: ArgumentParser = args_parser()
     args = parser.parse_args()
@@ -126,4 +349,7 @@ if __name__ == "__main__":
     )
     log_file: str = args.path
     triage_file: str = args.triage_file_path
-    analyze_log_file(log_file, triage_file)
+    if os.path.isfile(log_file):
+        analyze_log_file(log_file, triage_file, args.reverse)
+    else:
+        analyze_batch(args)
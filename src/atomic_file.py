@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomically(path: Path, data: bytes) -> None:
+    """
+    Writes a file through a temporary file renamed over it, so that concurrent readers
+    never see a partial file and an interrupted write never loses the previous one.
+
+    :param path: The path to the file, its directory being created if needed.
+    :type path: Path
+    :param data: The content of the file.
+    :type data: bytes
+    :raises OSError: If the file could not be written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def get_cache_file(path: str, directory: Path) -> Path:
+    """
+    Returns the cache file of a source file.
+
+    :param path: The absolute path to the source file.
+    :type path: str
+    :param directory: The directory of the cache.
+    :type directory: Path
+    :return: The path to the cache file.
+    :rtype: Path
+    """
+    name: str = hashlib.sha256(path.encode()).hexdigest()[:32]
+    return directory / f"{name}.pickle"
+
+
+def read_cache(cache_file: Path, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Returns a pickled cache entry if it matches the given key.
+
+    :param cache_file: The path to the cache file.
+    :type cache_file: Path
+    :param key: The values the entry must have, e.g. the version of the cache and the modification time and content hash of the source file.
+    :type key: Dict[str, Any]
+    :return: The cache entry, or None if there is no valid entry.
+    :rtype: Optional[Dict[str, Any]]
+    """
+    try:
+        with open(cache_file, "rb") as f:
+            entry: Dict[str, Any] = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable cache {cache_file}: {e}")
+        return None
+    if any(entry.get(name) != value for name, value in key.items()):
+        logger.debug(f"Cache is outdated: {cache_file}")
+        return None
+    return entry
+
+
+def write_cache(cache_file: Path, entry: Dict[str, Any]) -> None:
+    """
+    Pickles a cache entry atomically, a cache that cannot be written being skipped.
+
+    :param cache_file: The path to the cache file.
+    :type cache_file: Path
+    :param entry: The cache entry to write.
+    :type entry: Dict[str, Any]
+    """
+    try:
+        write_atomically(
+            cache_file, pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        )
+        logger.debug(f"Saved cache: {cache_file}")
+    except OSError as e:
+        logger.debug(f"Could not write cache {cache_file}: {e}")
@@ -0,0 +1,316 @@
+import functools
+import glob
+import json
+import logging
+import mmap
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Set, TextIO, Tuple
+
+from analyze_log import check_valid_file, iter_logs
+from history import History
+from log_store import LOG_NAME, NONE, get_compression
+from matcher import NESTED_LOOP_MAX_ERRORS, NO_MATCH, TriageMatcher
+from triage_cache import load_matcher
+
+CHUNKS_PER_JOB = 8
+HISTORY_LIMIT = 1_000_000
+UNKNOWN_COMMAND = "-"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LogHits:
+    """
+    The known errors found in one log.
+
+    :param path: The path to the log file.
+    :param command_id: The id of the command that wrote the log, - if the log is not named after a command.
+    :param day: The day the command ran, as YYYY-MM-DD.
+    :param hits: The number of lines containing each known error.
+    :param error: Why the log could not be read, empty if it was.
+    """
+
+    path: str
+    command_id: str
+    day: str
+    hits: Dict[str, int] = field(default_factory=dict)
+    error: str = ""
+
+
+@dataclass
+class BatchReport:
+    """
+    The known errors found in a batch of logs.
+
+    :param logs: The number of logs analyzed.
+    :param hits: The number of lines containing each known error.
+    :param logs_per_error: The number of logs containing each known error.
+    :param per_command: The number of logs of each command containing each known error.
+    :param per_day: The number of logs of each day containing each known error.
+    :param unknown: The logs without any known error.
+    :param unreadable: The logs that could not be read, with the reason.
+    """
+
+    logs: int = 0
+    hits: Dict[str, int] = field(default_factory=Counter)
+    logs_per_error: Dict[str, int] = field(default_factory=Counter)
+    per_command: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    per_day: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    unknown: List[str] = field(default_factory=list)
+    unreadable: Dict[str, str] = field(default_factory=dict)
+
+    def add(self, log: LogHits) -> None:
+        """
+        Adds the known errors found in a log to the counts.
+
+        :param log: The known errors found in the log.
+        :type log: LogHits
+        """
+        self.logs += 1
+        if log.error:
+            self.unreadable[log.path] = log.error
+            return
+        if not log.hits:
+            self.unknown.append(log.path)
+            return
+        for error, count in log.hits.items():
+            self.hits[error] += count
+            self.logs_per_error[error] += 1
+            for counts, key in (
+                (self.per_command, log.command_id),
+                (self.per_day, log.day),
+            ):
+                counts.setdefault(key, Counter())[error] += 1
+
+
+def analyze_logs(paths: List[str], triage_file_path: str, jobs: int = 0) -> BatchReport:
+    """
+    Looks for every known error in a batch of logs, scanning them in parallel processes.
+
+    The logs are split in chunks so that each process loads the triage matcher once and
+    scans many logs with it, which pays off from a few hundred logs on.
+
+    :param paths: The paths to the log files.
+    :type paths: List[str]
+    :param triage_file_path: The path to the triage file containing error resolutions.
+    :type triage_file_path: str
+    :param jobs: The number of processes, the number of CPUs by default, 1 to scan in this process.
+    :type jobs: int
+    :return: The known errors found in the logs.
+    :rtype: BatchReport
+    """
+    check_valid_file(triage_file_path)
+    load_matcher(triage_file_path)
+    jobs = min(jobs or os.cpu_count() or 1, len(paths)) or 1
+    scan = functools.partial(find_log_hits, triage_file_path=triage_file_path)
+    report: BatchReport = BatchReport()
+    start_time: float = time.time()
+    if jobs == 1:
+        for path in paths:
+            report.add(scan(path))
+    else:
+        chunksize: int = max(1, len(paths) // (jobs * CHUNKS_PER_JOB))
+        with ProcessPoolExecutor(jobs) as executor:
+            for log in executor.map(scan, paths, chunksize=chunksize):
+                report.add(log)
+    logger.debug(
+        f"Analyzed {len(paths)} logs in {time.time() - start_time:.1f}s "
+        f"with {jobs} processes"
+    )
+    return report
+
+
+def find_log_hits(log_file_path: str, triage_file_path: str) -> LogHits:
+    """
+    Counts the lines of a log containing each known error.
+
+    :param log_file_path: The path to the log file.
+    :type log_file_path: str
+    :param triage_file_path: The path to the triage file containing error resolutions.
+    :type triage_file_path: str
+    :return: The known errors found in the log.
+    :rtype: LogHits
+    """
+    matcher: TriageMatcher = load_matcher(triage_file_path)
+    command_id, day = get_log_origin(log_file_path)
+    log: LogHits = LogHits(log_file_path, command_id, day)
+    hits: Counter[str] = Counter()
+    try:
+        if not may_contain_errors(log_file_path, matcher):
+            return log
+        for line in iter_logs(log_file_path):
+            index: int = matcher.match(line)
+            if index != NO_MATCH:
+                hits[matcher.errors[index]] += 1
+    except (OSError, EOFError, ValueError) as e:
+        log.error = str(e) or type(e).__name__
+    log.hits = dict(hits)
+    return log
+
+
+def may_contain_errors(log_file_path: str, matcher: TriageMatcher) -> bool:
+    """
+    Returns whether a log may contain a known error, searching the whole file at once
+    for a handful of errors, which is much faster than matching it line by line. Most
+    logs contain no known error at all.
+
+    :param log_file_path: The path to the log file.
+    :type log_file_path: str
+    :param matcher: The matcher of the known errors.
+    :type matcher: TriageMatcher
+    :return: False if the log is known not to contain any of the errors.
+    :rtype: bool
+    """
+    if len(matcher.errors) > NESTED_LOOP_MAX_ERRORS:
+        return True
+    if get_compression(log_file_path) != NONE:
+        return True
+    with open(log_file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return any(data.find(error.encode()) != -1 for error in matcher.errors)
+
+
+def get_log_origin(log_file_path: str) -> Tuple[str, str]:
+    """
+    Returns the command and the day of a log, from its name when it was written by
+    wait_elegantly.py, else from its modification time.
+
+    :param log_file_path: The path to the log file.
+    :type log_file_path: str
+    :return: The id of the command and the day as YYYY-MM-DD.
+    :rtype: Tuple[str, str]
+    """
+    match: Optional[re.Match[str]] = LOG_NAME.fullmatch(os.path.basename(log_file_path))
+    if match:
+        day, month, year = match.group("day").split("-")
+        return match.group("id"), f"{year}-{month}-{day}"
+    try:
+        mtime: float = os.path.getmtime(log_file_path)
+    except OSError:
+        return UNKNOWN_COMMAND, ""
+    return UNKNOWN_COMMAND, time.strftime("%Y-%m-%d", time.localtime(mtime))
+
+
+def find_logs(pattern: str) -> List[str]:
+    """
+    Returns the logs of a directory, or the files matching a glob.
+
+    :param pattern: A directory, in which the logs written by wait_elegantly.py are taken, or a glob that may use ** to match any number of directories.
+    :type pattern: str
+    :return: The paths to the log files, sorted.
+    :rtype: List[str]
+    :raises ValueError: If no log is found.
+    """
+    if os.path.isdir(pattern):
+        paths: List[str] = [
+            entry.path
+            for entry in os.scandir(pattern)
+            if LOG_NAME.fullmatch(entry.name) and entry.is_file()
+        ]
+    else:
+        paths = [
+            path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)
+        ]
+    if not paths:
+        raise ValueError(f"No log found in {pattern}")
+    return sorted(paths)
+
+
+def filter_failed_logs(paths: List[str], history: History) -> List[str]:
+    """
+    Returns the logs of the runs recorded as failed in the history.
+
+    :param paths: The paths to the log files.
+    :type paths: List[str]
+    :param history: The history of the runs.
+    :type history: History
+    :return: The paths to the logs of failed runs.
+    :rtype: List[str]
+    """
+    commands: Set[str] = {get_log_origin(path)[0] for path in paths}
+    failed: Set[str] = {
+        os.path.abspath(record.log)
+        for command_id in commands
+        for record in history.records(command_id, HISTORY_LIMIT)
+        if record.exit_code != 0 and record.log
+    }
+    return [path for path in paths if os.path.abspath(path) in failed]
+
+
+def format_batch_report(report: BatchReport, top: int = 0) -> List[str]:
+    """
+    Returns the known errors of a batch report, most frequent first, then per command
+    and per day, followed by the logs to look at by hand.
+
+    :param report: The known errors found in the logs.
+    :type report: BatchReport
+    :param top: The number of errors shown per command and per day, 0 for all of them.
+    :type top: int
+    :return: The lines of the report.
+    :rtype: List[str]
+    """
+    lines: List[str] = [
+        f"{report.logs} logs, {report.logs - len(report.unknown) - len(report.unreadable)}"
+        f" with known errors, {len(report.unknown)} without",
+        "",
+        f"{'logs':>7} {'hits':>7}  error",
+    ]
+    for error, count in Counter(report.logs_per_error).most_common():
+        lines.append(f"{count:>7} {report.hits[error]:>7}  {error}")
+    for title, groups in (
+        ("Per command", report.per_command),
+        ("Per day", report.per_day),
+    ):
+        lines += ["", title]
+        for key in sorted(groups):
+            lines.append(f"  {key}")
+            for error, count in Counter(groups[key]).most_common(top or None):
+                lines.append(f"  {count:>7}  {error}")
+    if report.unknown:
+        lines += ["", "Unknown errors"]
+        lines += [f"  {path}" for path in report.unknown]
+    if report.unreadable:
+        lines += ["", "Unreadable logs"]
+        lines += [f"  {path}: {error}" for path, error in report.unreadable.items()]
+    return lines
+
+
+def print_batch_report(
+    report: BatchReport, top: int = 0, stream: Optional[TextIO] = None
+) -> None:
+    """
+    Prints a batch report.
+
+    :param report: The known errors found in the logs.
+    :type report: BatchReport
+    :param top: The number of errors shown per command and per day, 0 for all of them.
+    :type top: int
+    :param stream: The stream to print to, stdout by default.
+    :type stream: Optional[TextIO]
+    """
+    stream = stream or sys.stdout
+    stream.write("".join(f"{line}\n" for line in format_batch_report(report, top)))
+
+
+def save_batch_report(report: BatchReport, path: str) -> None:
+    """
+    Writes a batch report as JSON.
+
+    :param report: The known errors found in the logs.
+    :type report: BatchReport
+    :param path: The path to the JSON file.
+    :type path: str
+    """
+    data: Dict[str, Any] = asdict(report)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    logger.info(f"Report written to {path}")
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from atomic_file import write_atomically
+from command import Command
+
+CHECKPOINT_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+root: Path = Path(__file__).parent.parent
+
+
+class Checkpoint:
+    def __init__(
+        self,
+        config_file_path: str,
+        resume: bool = False,
+        directory: Optional[Path] = None,
+    ):
+        """
+        Initializes a Checkpoint object recording the commands of a configuration that
+        completed, so that a failed or interrupted run can be resumed from the commands
+        that did not.
+
+        The checkpoint of a configuration is stored in build/checkpoint, and is only read
+        when the run starts.
+
+        :param config_file_path: The path to the configuration file in YAML format.
+        :type config_file_path: str
+        :param resume: Whether to skip the commands completed by the previous run, else it is forgotten.
+        :type resume: bool
+        :param directory: The directory of the checkpoints, build/checkpoint by default.
+        :type directory: Optional[Path]
+        """
+        self.config: str = os.path.abspath(config_file_path)
+        self.resume: bool = resume
+        directory = directory or root / Path("build/checkpoint")
+        name: str = hashlib.sha256(self.config.encode()).hexdigest()[:32]
+        self.file: Path = directory / f"{name}.json"
+        self.state: Dict[str, Any] = {}
+
+    def start(self, commands: List[Command]) -> List[Command]:
+        """
+        Starts a run, returning the commands to skip when resuming.
+
+        A command is only skipped if it completed in a previous run of the same
+        configuration, its command line did not change since, and the commands it
+        depends on are skipped too. The other changes of the configuration do not
+        invalidate the checkpoint.
+
+        :param commands: The commands of the configuration.
+        :type commands: List[Command]
+        :return: The commands completed by the previous runs, empty when not resuming.
+        :rtype: List[Command]
+        """
+        previous: Dict[str, Any] = self.read() if self.resume else {}
+        completed: Dict[str, Any] = previous.get("completed", {})
+        skipped: List[Command] = [
+            command
+            for command in commands
+            if command.id in completed
+            and completed[command.id]["argv"] == get_argv_hash(command)
+        ]
+        while True:
+            ids: Set[str] = {command.id for command in skipped}
+            kept: List[Command] = [
+                command
+                for command in skipped
+                if all(dependency in ids for dependency in command.depends_on)
+            ]
+            if len(kept) == len(skipped):
+                break
+            skipped = kept
+        self.state = {
+            "version": CHECKPOINT_VERSION,
+            "config": self.config,
+            "started": time.time(),
+            "completed": {command.id: completed[command.id] for command in skipped},
+        }
+        self.write()
+        return skipped
+
+    def complete(self, command: Command) -> None:
+        """
+        Records a command that completed.
+
+        :param command: The command.
+        :type command: Command
+        """
+        self.state["completed"][command.id] = {
+            "argv": get_argv_hash(command),
+            "finished": time.time(),
+        }
+        self.write()
+
+    def clear(self) -> None:
+        """
+        Forgets the checkpoint once all the commands completed.
+        """
+        try:
+            self.file.unlink()
+        except FileNotFoundError:
+            pass
+
+    def read(self) -> Dict[str, Any]:
+        """
+        Returns the checkpoint of the previous run.
+
+        :return: The checkpoint, empty if there is none or it is unreadable.
+        :rtype: Dict[str, Any]
+        """
+        try:
+            with open(self.file, "r") as f:
+                state: Dict[str, Any] = json.load(f)
+        except FileNotFoundError:
+            logger.info("No previous run to resume, running it all")
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.file}: {e}")
+            return {}
+        if state.get("version") != CHECKPOINT_VERSION:
+            return {}
+        return state
+
+    def write(self) -> None:
+        """
+        Writes the checkpoint atomically so that an interrupted write never loses it.
+        """
+        try:
+            write_atomically(self.file, json.dumps(self.state, indent=2).encode())
+        except OSError as e:
+            logger.warning(f"Could not write checkpoint {self.file}: {e}")
+
+
+def get_argv_hash(command: Command) -> str:
+    """
+    Returns the hash of the command line of a command.
+
+    :param command: The command.
+    :type command: Command
+    :return: The hex digest of the command line.
+    :rtype: str
+    """
+    return hashlib.sha256(json.dumps(command.values).encode()).hexdigest()
@@ -0,0 +1,75 @@
+import json
+import os
+import shutil
+import socket
+import sys
+from typing import Any, Dict, List, Optional, TextIO
+
+SOCKET_ENV = "WAIT_ELEGANTLY_SOCKET"
+
+root: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_socket_path() -> str:
+    """
+    Returns the path to the socket of the daemon.
+
+    :return: The path given by WAIT_ELEGANTLY_SOCKET, build/wait_elegantly.sock by default.
+    :rtype: str
+    """
+    return os.environ.get(SOCKET_ENV) or os.path.join(
+        root, "build", "wait_elegantly.sock"
+    )
+
+
+def run_client(
+    args: List[str], socket_path: str, stream: Optional[TextIO] = None
+) -> int:
+    """
+    Asks the daemon to run a configuration and writes its output as it comes.
+
+    Only the standard library is imported, so that starting the client takes a few
+    milliseconds. Stopping the client stops the run.
+
+    :param args: The command line arguments of wait_elegantly.py.
+    :type args: List[str]
+    :param socket_path: The path to the socket of the daemon.
+    :type socket_path: str
+    :param stream: The stream to write the output to, stdout by default.
+    :type stream: Optional[TextIO]
+    :return: The exit code of the run.
+    :rtype: int
+    :raises OSError: If the daemon is not running.
+    """
+    stream = stream or sys.stdout
+    request: Dict[str, Any] = {
+        "args": args,
+        "cwd": os.getcwd(),
+        "env": dict(os.environ),
+        "tty": stream.isatty(),
+        "columns": shutil.get_terminal_size().columns,
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as messages:
+            for line in messages:
+                message: Dict[str, Any] = json.loads(line)
+                if "exit" in message:
+                    code: int = message["exit"]
+                    return code
+                stream.write(message["out"])
+                stream.flush()
+    return 1
+
+
+if __name__ == "__main__":
+    path: str = get_socket_path()
+    try:
+        sys.exit(run_client(sys.argv[1:], path))
+    except (FileNotFoundError, ConnectionRefusedError):
+        # No daemon, run in this process instead
+        script: str = os.path.join(os.path.dirname(__file__), "wait_elegantly.py")
+        os.execv(sys.executable, [sys.executable, script] + sys.argv[1:])
+    except KeyboardInterrupt:
+        sys.exit(130)
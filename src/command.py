@@ -1,24 +1,145 @@
 import logging
+import os
+import signal
+import socket
+import sys
+import threading
 import time
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 from subprocess import Popen
-from typing import Any
+from typing import TYPE_CHECKING, Any, Callable, Optional, Sequence, Tuple
 from typing import List, Dict
 
-from analyze_log import analyze_log_file
-from progress import Progress
+from estimator import ESTIMATORS, MEAN, Estimator
+from exit_waiter import ExitWaiter
+from history import HISTORY_WINDOW, History, HistoryRecord, SqliteHistory
+from log_pump import LogPump
+from log_store import NONE, get_suffix, open_log_writer, prune_logs
+from milestones import MilestoneIndex, MilestoneTracker, load_milestones
+from progress import CACHED, FAILED, RETRYING, RUNNING, STARTED, SUCCEEDED
+from progress import Progress, ProgressEvent, get_fraction
+from resources import ResourceUsage
+from tracing import Tracer, span
+from watchdog import Watchdog
+
+if TYPE_CHECKING:
+    import asyncio
+
+    from analyze_log import StreamingTriage
+    from checkpoint import Checkpoint
+    from fingerprint import ResultCache
 
 COMMANDS_KEY = "commands"
 COMMAND_NAME = "name"
 COMMAND_ID = "id"
 COMMAND_VALUES = "values"
+COMMAND_DEPENDS_ON = "depends_on"
+COMMAND_FAIL_FAST_ON_TRIAGE = "fail_fast_on_triage"
+COMMAND_ESTIMATOR = "estimator"
+COMMAND_PROGRESS = "progress"
+COMMAND_INPUTS = "inputs"
+COMMAND_OUTPUTS = "outputs"
+COMMAND_TIMEOUT = "timeout"
+COMMAND_TIMEOUT_FACTOR = "timeout_factor"
+COMMAND_STALL_TIMEOUT = "stall_timeout"
+COMMAND_RETRIES = "retries"
+COMMAND_RETRY_DELAY = "retry_delay"
+
+PROGRESS_TIME = "time"
+PROGRESS_OUTPUT = "output"
+
+PROGRESS_INTERVAL = 1.0
+EXCERPT_LINES = 50
+TIMEOUT_MIN_RUNS = 5
+TIMEOUT_MIN = 60.0
+RETRY_DELAY = 10.0
+RETRY_MAX_DELAY = 600.0
 
 logger = logging.getLogger(__name__)
 
 root: Path = Path(__file__).parent.parent
 
 
+@dataclass
+class RunOptions:
+    """
+    Options shared by all the commands of a run.
+
+    :param triage_file: The path to the triage file containing error resolutions.
+    :param granular: Whether to use a granular progress bar.
+    :param live_triage: Whether to triage the log while the command is still running.
+    :param reverse_triage: Whether to triage failed logs from their end.
+    :param history: The history storing the runs of the commands.
+    :param history_window: The number of previous runs used to estimate the time of a command.
+    :param on_progress: The callback receiving the progress of the commands, drawn as progress bars if not given.
+    :param cache: Whether to skip the commands whose declared inputs did not change since their last successful run.
+    :param compression: The compression of the logs, one of none, gzip and zstd.
+    :param keep_logs: The number of logs kept per command, 0 for no limit.
+    :param max_log_bytes: The maximum total size of the logs, 0 for no limit.
+    :param timeout_factor: The multiple of the p95 duration after which a command is stopped, 0 for no limit.
+    :param slots: The semaphore bounding the number of commands run on the event loop at the same time, shared with other runs.
+    :param tracer: The tracer recording the phases of the runs, None when tracing is disabled.
+    :param checkpoint: The checkpoint recording the completed commands, to resume a failed run.
+    :param live_output: Whether to show the output of the commands on stdout while they run.
+    :param interrupted: Set when the run is interrupted, so that no command is started or retried.
+    :param cwd: The working directory of the commands, the current one if empty.
+    :param env: The environment of the commands, the current one if not given.
+    :param config: The absolute path to the configuration file of the commands, keying the caches of their results.
+    """
+
+    triage_file: str = ""
+    granular: bool = False
+    live_triage: bool = False
+    reverse_triage: bool = False
+    history: History = field(default_factory=SqliteHistory)
+    history_window: int = HISTORY_WINDOW
+    on_progress: Optional[Callable[[ProgressEvent], None]] = None
+    cache: bool = True
+    compression: str = NONE
+    keep_logs: int = 0
+    max_log_bytes: int = 0
+    timeout_factor: float = 0
+    slots: Optional["asyncio.Semaphore"] = None
+    tracer: Optional[Tracer] = None
+    checkpoint: Optional["Checkpoint"] = None
+    live_output: bool = False
+    interrupted: threading.Event = field(default_factory=threading.Event)
+    cwd: str = ""
+    env: Optional[Dict[str, str]] = None
+    config: str = ""
+
+
+@dataclass
+class CommandRun:
+    """
+    The state of one run of a command.
+
+    :param log: The path to the log file of the run.
+    :param estimator: The statistics of the previous runs.
+    :param live_triage: The triage of the log while it is written, if enabled.
+    :param milestones: The milestone index of the command, if its progress follows the output.
+    :param tracker: The tracker of the output of the run, if its progress follows the output.
+    :param start_time: The time the run started at.
+    :param cache: The cache recording the inputs and outputs of the run, if the command declares them.
+    :param tail: The last lines of the output, kept in memory.
+    :param attempt: The number of previous attempts of this run.
+    :param watchdog: The watchdog stopping the command if it times out or stalls.
+    """
+
+    log: Path
+    estimator: Estimator
+    live_triage: Optional["StreamingTriage"] = None
+    milestones: Optional[MilestoneIndex] = None
+    tracker: Optional[MilestoneTracker] = None
+    start_time: float = 0
+    cache: Optional["ResultCache"] = None
+    tail: List[str] = field(default_factory=list)
+    attempt: int = 0
+    watchdog: Optional[Watchdog] = None
+
+
 class Command:
     def __init__(self, command: Dict[str, Any]):
         """
@@ -30,69 +151,616 @@ class Command:
         self.name: str = get_cmd_name(command)
         self.id: str = get_cmd_id(command)
         self.values: List[str] = command[COMMAND_VALUES]
+        self.depends_on: List[str] = get_cmd_depends_on(command)
+        self.fail_fast_on_triage: bool = get_cmd_flag(
+            command, COMMAND_FAIL_FAST_ON_TRIAGE
+        )
+        self.estimator: str = get_cmd_estimator(command)
+        self.progress: str = get_cmd_progress(command)
+        self.inputs: List[str] = get_cmd_list(command, COMMAND_INPUTS)
+        self.outputs: List[str] = get_cmd_list(command, COMMAND_OUTPUTS)
+        self.timeout: float = get_cmd_number(command, COMMAND_TIMEOUT)
+        self.timeout_factor: float = get_cmd_number(command, COMMAND_TIMEOUT_FACTOR)
+        self.stall_timeout: float = get_cmd_number(command, COMMAND_STALL_TIMEOUT)
+        self.retries: int = get_cmd_retries(command)
+        self.retry_delay: float = get_cmd_number(
+            command, COMMAND_RETRY_DELAY, RETRY_DELAY
+        )
+        # Set for the instances of a matrix: the id of the matrix and its parallelism
+        self.matrix: str = ""
+        self.max_parallel: int = 1
+        # The waiter of the process while the command runs, to stop it on interruption
+        self.waiter: Optional[ExitWaiter] = None
+
+    def run(self, options: RunOptions) -> bool:
+        """
+        Runs the command and reports progress, unless its inputs did not change since its
+        last successful run. A failed command is run again up to its number of retries,
+        waiting longer before every attempt.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :return: Whether the command was skipped because it is up to date.
+        :rtype: bool
+        :raises RuntimeError: If the last attempt of the command fails.
+        """
+        for attempt in range(self.retries):
+            try:
+                with span(options.tracer, f"run {self.name}", self.id, attempt=attempt):
+                    return self.run_attempt(options, attempt)
+            except RuntimeError as e:
+                delay: float = self.retry_wait(e, attempt)
+                if options.interrupted.wait(delay):
+                    raise
+        with span(options.tracer, f"run {self.name}", self.id, attempt=self.retries):
+            return self.run_attempt(options, self.retries)
+
+    def run_attempt(self, options: RunOptions, attempt: int) -> bool:
+        """
+        Runs the command once and reports progress, unless its inputs did not change
+        since its last successful run.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :param attempt: The number of previous attempts.
+        :type attempt: int
+        :return: Whether the command was skipped because it is up to date.
+        :rtype: bool
+        :raises RuntimeError: If the command fails or the run was interrupted.
+        """
+        if options.interrupted.is_set():
+            raise RuntimeError(f"Command '{self.name}' not started, run interrupted")
+        cache: Optional["ResultCache"] = self.result_cache(options)
+        if cache and self.up_to_date(options, cache):
+            return True
+        run: CommandRun = self.start_run(options)
+        run.cache = cache
+        run.attempt = attempt
+        expected_time: int = run.estimator.expected(self.estimator)
+        with span(options.tracer, "spawn", self.id):
+            process, output = self.start_process(run, options)
+        progress: Optional[Progress] = None
+        monitors: List[Callable[[], None]] = []
+        if options.on_progress:
+            self.report_progress(options, run, STARTED, expected_time)
+            monitors.append(
+                lambda: self.report_progress(options, run, RUNNING, expected_time)
+            )
+        else:
+            progress = Progress(
+                [], options.granular, run.estimator, self.estimator, run.tracker
+            )
+        waiter: ExitWaiter = ExitWaiter(process)
+        self.waiter = waiter
+        if options.interrupted.is_set():
+            waiter.signal(signal.SIGKILL, True)
+        watchdog: Watchdog = self.start_watchdog(options, run, waiter, output)
+        output_monitor: Callable[[bool], None] = self.output_monitor(output, run)
+        monitored: bool = bool(run.live_triage or run.tracker)
+        if monitored:
+            monitors.insert(0, lambda: output_monitor(False))
+        monitors.insert(0, watchdog.check)
+        with span(options.tracer, "execution", self.id, pid=process.pid):
+            try:
+                update_progress(process, progress, monitors=monitors, waiter=waiter)
+            except BaseException:
+                waiter.signal(signal.SIGKILL, True)
+                output.close()
+                raise
+            finally:
+                self.waiter = None
+            total_time = round(time.time() - run.start_time)
+            output.wait()
+            if monitored:
+                output_monitor(True)
+            run.tail = output.tail_lines()
+            output.close()
+        if progress:
+            progress.finish()
+        self.finish_run(
+            options, run, process.returncode, total_time, waiter.usage, expected_time
+        )
+        return False
+
+    async def run_async(
+        self, options: RunOptions, interval: float = PROGRESS_INTERVAL
+    ) -> bool:
+        """
+        Runs the command on the running event loop and reports its progress to the
+        callback of the options instead of stdout, retrying it like run.
+
+        The output of the command and its exit are watched by the event loop, so that
+        many commands can run at the same time without a thread each. The command is
+        killed if the task is cancelled.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :param interval: The number of seconds between two progress reports.
+        :type interval: float
+        :return: Whether the command was skipped because it is up to date.
+        :rtype: bool
+        :raises RuntimeError: If the last attempt of the command fails.
+        """
+        import asyncio
+
+        for attempt in range(self.retries):
+            try:
+                return await self.run_slot_async(options, attempt, interval)
+            except RuntimeError as e:
+                delay: float = self.retry_wait(e, attempt)
+                await asyncio.sleep(delay)
+        return await self.run_slot_async(options, self.retries, interval)
+
+    async def run_slot_async(
+        self, options: RunOptions, attempt: int, interval: float
+    ) -> bool:
+        """
+        Runs the command once on the running event loop, after waiting for one of the
+        slots of the options if they are bounded.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :param attempt: The number of previous attempts.
+        :type attempt: int
+        :param interval: The number of seconds between two progress reports.
+        :type interval: float
+        :return: Whether the command was skipped because it is up to date.
+        :rtype: bool
+        :raises RuntimeError: If the command fails.
+        """
+        if options.slots:
+            with span(options.tracer, "queued", self.id):
+                await options.slots.acquire()
+        try:
+            with span(options.tracer, f"run {self.name}", self.id, attempt=attempt):
+                return await self.run_attempt_async(options, attempt, interval)
+        finally:
+            if options.slots:
+                options.slots.release()
+
+    async def run_attempt_async(
+        self, options: RunOptions, attempt: int, interval: float
+    ) -> bool:
+        """
+        Runs the command once on the running event loop.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :param attempt: The number of previous attempts.
+        :type attempt: int
+        :param interval: The number of seconds between two progress reports.
+        :type interval: float
+        :return: Whether the command was skipped because it is up to date.
+        :rtype: bool
+        :raises RuntimeError: If the command fails.
+        """
+        import asyncio
+
+        cache: Optional["ResultCache"] = self.result_cache(options)
+        if cache and await asyncio.to_thread(self.up_to_date, options, cache):
+            return True
+        run: CommandRun = await asyncio.to_thread(self.start_run, options)
+        run.cache = cache
+        run.attempt = attempt
+        expected_time: int = run.estimator.expected(self.estimator)
+        with span(options.tracer, "spawn", self.id):
+            process, output = self.start_process(run, options, attach=True)
+        waiter: ExitWaiter = ExitWaiter(process)
+        watchdog: Watchdog = self.start_watchdog(options, run, waiter, output)
+        output_monitor: Callable[[bool], None] = self.output_monitor(output, run)
+        monitored: bool = bool(run.live_triage or run.tracker)
+        self.report_progress(options, run, STARTED, expected_time)
+        with span(options.tracer, "execution", self.id, pid=process.pid):
+            try:
+                while not await waiter.wait_async(interval):
+                    watchdog.check()
+                    if monitored:
+                        output_monitor(False)
+                    self.report_progress(options, run, RUNNING, expected_time)
+            except asyncio.CancelledError:
+                logger.info(f"Stopping command '{self.name}' on cancellation")
+                waiter.signal(signal.SIGKILL, True)
+                while not await waiter.wait_async(interval):
+                    pass
+                output.close()
+                raise
+            total_time: int = round(time.time() - run.start_time)
+            await output.wait_async()
+            if monitored:
+                output_monitor(True)
+            run.tail = output.tail_lines()
+            output.close()
+        await asyncio.to_thread(
+            self.finish_run,
+            options,
+            run,
+            process.returncode,
+            total_time,
+            waiter.usage,
+            expected_time,
+        )
+        return False
+
+    def retry_wait(self, error: RuntimeError, attempt: int) -> float:
+        """
+        Reports a failed attempt and returns how long to wait before the next one.
+
+        :param error: The failure of the attempt.
+        :type error: RuntimeError
+        :param attempt: The number of previous attempts.
+        :type attempt: int
+        :return: The number of seconds to wait, doubling after every attempt.
+        :rtype: float
+        """
+        delay: float = min(self.retry_delay * 2**attempt, RETRY_MAX_DELAY)
+        logger.warning(
+            f"{error} Retrying in {delay:g}s, attempt {attempt + 2} of {self.retries + 1}"
+        )
+        return delay
 
-    def run(self, triage_file: str, granular: bool) -> None:
+    def get_timeout(self, options: RunOptions, estimator: Estimator) -> float:
         """
-        Runs the command and reports progress.
+        Returns the number of seconds after which the command is stopped.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :param estimator: The statistics of the previous runs.
+        :type estimator: Estimator
+        :return: The explicit timeout of the command if any, else a multiple of its p95 duration once it ran a few times, 0 for no limit.
+        :rtype: float
+        """
+        if self.timeout:
+            return self.timeout
+        factor: float = self.timeout_factor or options.timeout_factor
+        if not factor or estimator.count < TIMEOUT_MIN_RUNS:
+            return 0
+        timeout: float = max(factor * estimator.percentile(0.95), TIMEOUT_MIN)
+        return timeout
+
+    def start_watchdog(
+        self,
+        options: RunOptions,
+        run: "CommandRun",
+        waiter: ExitWaiter,
+        output: LogPump,
+    ) -> Watchdog:
+        """
+        Returns the watchdog of a run of the command.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :param run: The state of the run.
+        :type run: CommandRun
+        :param waiter: The waiter of the process running the command.
+        :type waiter: ExitWaiter
+        :param output: The pump copying the output of the command.
+        :type output: LogPump
+        :return: The watchdog, also stored in the run.
+        :rtype: Watchdog
+        """
+        timeout: float = self.get_timeout(options, run.estimator)
+        if timeout:
+            logger.debug(f"Command '{self.name}' times out after {timeout:g}s")
+        run.watchdog = Watchdog(self.name, waiter, output, timeout, self.stall_timeout)
+        return run.watchdog
 
-        :param triage_file: The path to the triage file containing error resolutions.
-        :type triage_file: str
-        :param granular: Whether to use a granular progress bar.
-        :type granular: bool
+    def result_cache(self, options: RunOptions) -> Optional["ResultCache"]:
         """
-        history_file: Path = root / Path(f"build/history/{self.id}.txt")
-        history_times: List[int] = get_history_times(history_file)
+        Returns the cache of the results of the command, if it declares its inputs.
 
-        log_file_path: Path = get_log_file_path(self.id)
-        logger.info(f"Running command '{self.name}' with log:\n{log_file_path}")
+        :param options: The options of the run.
+        :type options: RunOptions
+        :return: The cache, None if the command has no declared inputs or caching is disabled.
+        :rtype: Optional[ResultCache]
+        """
+        if not self.inputs or not options.cache:
+            return None
+        from fingerprint import ResultCache
+
+        return ResultCache(
+            self.id,
+            self.values,
+            self.inputs,
+            self.outputs,
+            cwd=options.cwd,
+            env=options.env,
+            config=options.config,
+        )
+
+    def up_to_date(self, options: RunOptions, cache: "ResultCache") -> bool:
+        """
+        Returns whether the command can be skipped, reporting it if so.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :param cache: The cache of the results of the command.
+        :type cache: ResultCache
+        :return: Whether the inputs and outputs did not change since the last successful run.
+        :rtype: bool
+        """
+        with span(options.tracer, "cache check", self.id):
+            hit: bool = cache.hit()
+        if not hit:
+            return False
+        logger.info(f"Command '{self.name}' UP TO DATE, skipped")
+        if options.on_progress:
+            options.on_progress(ProgressEvent(self.id, self.name, CACHED, 0, -1, 1.0))
+        return True
+
+    def start_run(self, options: RunOptions) -> "CommandRun":
+        """
+        Prepares a run of the command: its estimated time, its log file and the
+        monitoring of its output.
 
-        start_time = time.time()
-        process: Popen[Any] = self.run_command(log_file_path)
-        progress: Progress = Progress(history_times, granular)
-        update_progress(process, progress)
-        total_time = round(time.time() - start_time)
-        progress.finish()
+        :param options: The options of the run.
+        :type options: RunOptions
+        :return: The state of the run, started now.
+        :rtype: CommandRun
+        """
+        with span(options.tracer, "history load", self.id):
+            estimator: Estimator = options.history.estimator(
+                self.id, options.history_window
+            )
+        run: CommandRun = CommandRun(
+            get_log_file_path(self.id, options.compression), estimator
+        )
+        logger.info(f"Running command '{self.name}' with log:\n{run.log}")
+
+        if options.triage_file and (options.live_triage or self.fail_fast_on_triage):
+            from analyze_log import StreamingTriage
+
+            with span(options.tracer, "triage load", self.id):
+                run.live_triage = StreamingTriage(options.triage_file)
+        if self.progress == PROGRESS_OUTPUT:
+            with span(options.tracer, "milestones load", self.id):
+                run.milestones = load_milestones(self.id, options.history)
+            run.tracker = run.milestones.tracker()
+        run.start_time = time.time()
+        return run
+
+    def finish_run(
+        self,
+        options: RunOptions,
+        run: "CommandRun",
+        returncode: int,
+        total_time: int,
+        usage: Optional[ResourceUsage],
+        expected_time: int,
+    ) -> None:
+        """
+        Records a finished run in the history and reports its result, also to the
+        progress callback of the options.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :param run: The state of the run.
+        :type run: CommandRun
+        :param returncode: The exit code of the command.
+        :type returncode: int
+        :param total_time: The duration of the run in seconds.
+        :type total_time: int
+        :param usage: The resources used by the command, if known.
+        :type usage: Optional[ResourceUsage]
+        :param expected_time: The expected duration in seconds, -1 if unknown.
+        :type expected_time: int
+        :raises RuntimeError: If the command failed.
+        """
+        record: HistoryRecord = HistoryRecord(
+            time.time(),
+            total_time,
+            returncode,
+            socket.gethostname(),
+            str(run.log),
+            usage,
+        )
+        with span(options.tracer, "history write", self.id):
+            options.history.add(self.id, record)
+        with span(options.tracer, "log prune", self.id):
+            prune_logs(
+                run.log.parent,
+                self.id,
+                options.keep_logs,
+                options.max_log_bytes,
+                run.log,
+            )
 
-        if process.returncode != 0:
-            if triage_file:
-                analyze_log_file(str(log_file_path), triage_file)
-            raise RuntimeError(f"Command '{self.id}' FAILED")
+        if returncode != 0:
+            report_excerpt(run.tail[-EXCERPT_LINES:])
+            with span(options.tracer, "triage", self.id):
+                if run.live_triage:
+                    run.live_triage.finish()
+                elif options.triage_file:
+                    from analyze_log import analyze_log_tail
+
+                    analyze_log_tail(
+                        run.tail,
+                        str(run.log),
+                        options.triage_file,
+                        options.reverse_triage,
+                    )
+            final: bool = run.attempt >= self.retries
+            self.report_progress(
+                options, run, FAILED if final else RETRYING, expected_time
+            )
+            reason: str = ""
+            if run.watchdog and run.watchdog.reason:
+                reason = f", {run.watchdog.reason}"
+            raise RuntimeError(
+                f"Command '{self.id}' FAILED in {total_time}s{reason}."
+                f"{get_usage_result(usage)}"
+            )
         else:
-            result: str = get_time_diff_result(total_time, progress.expected_time())
+            result: str = get_time_diff_result(total_time, expected_time)
+            if run.estimator.count:
+                result = f"{result.rstrip()} Usually {run.estimator.band()}."
+            result = f"{result.rstrip()}{get_usage_result(usage)}"
             logger.info(f"Command '{self.name}' SUCCESSFUL {result}")
-            logger.debug(f"Time saved in: {history_file}")
-            add_history_time(history_file, total_time)
+            if run.milestones and run.tracker:
+                run.milestones.update(run.tracker)
+                run.milestones.save()
+            if run.cache:
+                run.cache.save()
+            self.report_progress(options, run, SUCCEEDED, expected_time)
 
             logger.debug("----- COMMAND FINISHED -----")
 
-    def run_command(self, log: Path) -> Popen[Any]:
+    def output_monitor(
+        self, output: LogPump, run: "CommandRun"
+    ) -> Callable[[bool], None]:
+        """
+        Returns a monitor passing the new log lines of the running command to the live
+        triage and to the milestone tracker.
+
+        :param output: The pump writing the command's log.
+        :type output: LogPump
+        :param run: The state of the run.
+        :type run: CommandRun
+        :return: A function to call periodically while the command runs, and once with True after it exited.
+        :rtype: Callable[[bool], None]
         """
-        Runs the command and returns the process object.
 
-        :param log: The path to the log file.
-        :type log: Path
-        :return: The process object representing the running command.
-        :rtype: subprocess.Popen
+        def monitor(final: bool) -> None:
+            if self.feed_output(run, output.read_lines(final)) and run.watchdog:
+                run.watchdog.stop("known error found")
+
+        return monitor
+
+    def feed_output(self, run: "CommandRun", lines: List[str]) -> bool:
+        """
+        Passes new lines of the output to the live triage and to the milestone tracker.
+
+        :param run: The state of the run.
+        :type run: CommandRun
+        :param lines: The lines written since the previous call.
+        :type lines: List[str]
+        :return: Whether the command should be stopped on a known error.
+        :rtype: bool
+        """
+        if run.tracker:
+            run.tracker.feed(lines)
+        if run.live_triage and run.live_triage.feed(lines):
+            return self.fail_fast_on_triage
+        return False
+
+    def report_progress(
+        self, options: RunOptions, run: "CommandRun", state: str, expected_time: int
+    ) -> None:
+        """
+        Reports the progress of the command to the callback of the options, if any.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :param run: The state of the run.
+        :type run: CommandRun
+        :param state: One of started, running, succeeded and failed.
+        :type state: str
+        :param expected_time: The expected duration in seconds, -1 if unknown.
+        :type expected_time: int
+        """
+        if options.on_progress is None:
+            return
+        elapsed: float = time.time() - run.start_time
+        fraction: Optional[float] = get_fraction(elapsed, expected_time, run.tracker)
+        if state == SUCCEEDED:
+            fraction = 1.0
+        options.on_progress(
+            ProgressEvent(self.id, self.name, state, elapsed, expected_time, fraction)
+        )
+
+    def start_process(
+        self, run: "CommandRun", options: RunOptions, attach: bool = False
+    ) -> Tuple[Popen[Any], LogPump]:
+        """
+        Starts the command in its own process group, in the working directory and
+        environment of the options, its output going through a pipe to a pump writing its
+        log and keeping its last lines in memory. With live output, the output is also
+        shown on stdout, copied by the kernel where possible.
+
+        :param run: The state of the run.
+        :type run: CommandRun
+        :param options: The options of the run.
+        :type options: RunOptions
+        :param attach: Whether to pump the output on the running event loop instead of a thread.
+        :type attach: bool
+        :return: The process running the command and the pump of its output.
+        :rtype: Tuple[Popen[Any], LogPump]
         """
-        with open(log, "w") as file:
-            cmd_process = Popen(
-                self.values, stdout=file, stderr=file, universal_newlines=True
+        read_fd, write_fd = os.pipe()
+        try:
+            process: Popen[Any] = Popen(
+                self.values,
+                stdout=write_fd,
+                stderr=write_fd,
+                start_new_session=True,
+                cwd=options.cwd or None,
+                env=options.env,
             )
-            return cmd_process
+        except BaseException:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        if options.live_output:
+            from output_tee import OutputTee
+
+            read_fd = OutputTee(read_fd, sys.stdout.fileno()).start()
+        pump: LogPump = LogPump(
+            read_fd,
+            open_log_writer(str(run.log)),
+            bool(run.live_triage or run.tracker),
+        )
+        if attach:
+            pump.attach()
+        else:
+            pump.start()
+        return process, pump
 
 
-def update_progress(cmd_process: Popen[Any], cmd_progress: Progress) -> None:
+def update_progress(
+    cmd_process: Popen[Any],
+    cmd_progress: Optional[Progress],
+    interval: float = PROGRESS_INTERVAL,
+    monitors: Sequence[Callable[[], None]] = (),
+    waiter: Optional[ExitWaiter] = None,
+) -> None:
     """
-    Updates the progress of the running command.
+    Updates the progress of the running command until it exits.
+
+    The progress is updated on its own timer while the exit of the process is detected
+    as soon as it happens. The monitors are called on every progress update.
 
     :param cmd_process: The process object representing the running command.
     :type cmd_process: subprocess.Popen
-    :param cmd_progress: The Progress object representing the progress of the command.
-    :type cmd_progress: Progress
+    :param cmd_progress: The Progress object representing the progress of the command, if drawn.
+    :type cmd_progress: Optional[Progress]
+    :param interval: The number of seconds between two progress updates.
+    :type interval: float
+    :param monitors: Functions to call periodically while the command runs.
+    :type monitors: Sequence[Callable[[], None]]
+    :param waiter: The waiter of the process, created if not given.
+    :type waiter: Optional[ExitWaiter]
     """
-    while cmd_process.poll() is None:
-        time.sleep(1)
-        cmd_progress.update()
+    waiter = waiter or ExitWaiter(cmd_process)
+    next_update: float = time.monotonic() + interval
+    while not waiter.wait(next_update - time.monotonic()):
+        if time.monotonic() >= next_update:
+            for monitor in monitors:
+                monitor()
+            if cmd_progress:
+                cmd_progress.update()
+            next_update += interval
+
+
+def report_excerpt(lines: List[str]) -> None:
+    """
+    Logs the last lines of the output of a failed command.
+
+    :param lines: The last lines of the output.
+    :type lines: List[str]
+    """
+    if lines:
+        excerpt: str = "\n".join(f"    {line}" for line in lines)
+        logger.info(f"Last {len(lines)} lines of the output:\n{excerpt}")
 
 
 def get_cmd_name(command: Dict[str, Any]) -> str:
@@ -131,6 +799,132 @@ def get_cmd_id(command: Dict[str, Any]) -> str:
     return cmd_id
 
 
+def get_cmd_depends_on(command: Dict[str, Any]) -> List[str]:
+    """
+    Returns the ids of the commands the command depends on.
+
+    :param command: A dictionary optionally containing the command's dependencies.
+    :type command: Dict[str, Any]
+    :return: The ids of the commands that must succeed before this command runs.
+    :rtype: List[str]
+    :raises ValueError: If the dependencies are not given as a list of ids.
+    """
+    depends_on: Any = command.get(COMMAND_DEPENDS_ON, [])
+    if isinstance(depends_on, str):
+        depends_on = [depends_on]
+    if not isinstance(depends_on, list) or not all(
+        isinstance(dependency, str) for dependency in depends_on
+    ):
+        raise ValueError("Dependencies must be a list of command ids")
+    return depends_on
+
+
+def get_cmd_list(command: Dict[str, Any], key: str) -> List[str]:
+    """
+    Returns an optional list of strings setting of the command.
+
+    :param command: A dictionary optionally containing the setting.
+    :type command: Dict[str, Any]
+    :param key: The key of the setting.
+    :type key: str
+    :return: The value of the setting, empty if it is not set.
+    :rtype: List[str]
+    :raises ValueError: If the setting is not a string or a list of strings.
+    """
+    value: Any = command.get(key, [])
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"{key} must be a list of strings")
+    return value
+
+
+def get_cmd_flag(command: Dict[str, Any], key: str) -> bool:
+    """
+    Returns an optional boolean setting of the command.
+
+    :param command: A dictionary optionally containing the setting.
+    :type command: Dict[str, Any]
+    :param key: The key of the setting.
+    :type key: str
+    :return: The value of the setting, False if it is not set.
+    :rtype: bool
+    :raises ValueError: If the setting is not a boolean.
+    """
+    value: Any = command.get(key, False)
+    if not isinstance(value, bool):
+        raise ValueError(f"{key} must be true or false")
+    return value
+
+
+def get_cmd_number(command: Dict[str, Any], key: str, default: float = 0) -> float:
+    """
+    Returns an optional number of seconds setting of the command.
+
+    :param command: A dictionary optionally containing the setting.
+    :type command: Dict[str, Any]
+    :param key: The key of the setting.
+    :type key: str
+    :param default: The value of the setting if it is not set.
+    :type default: float
+    :return: The value of the setting.
+    :rtype: float
+    :raises ValueError: If the setting is not a positive number.
+    """
+    value: Any = command.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError(f"{key} must be a positive number")
+    return float(value)
+
+
+def get_cmd_retries(command: Dict[str, Any]) -> int:
+    """
+    Returns the number of times the command is run again after failing.
+
+    :param command: A dictionary optionally containing the command's retries.
+    :type command: Dict[str, Any]
+    :return: The number of retries, 0 by default.
+    :rtype: int
+    :raises ValueError: If the number of retries is not a positive integer.
+    """
+    retries: Any = command.get(COMMAND_RETRIES, 0)
+    if isinstance(retries, bool) or not isinstance(retries, int) or retries < 0:
+        raise ValueError(f"{COMMAND_RETRIES} must be a positive integer")
+    return retries
+
+
+def get_cmd_estimator(command: Dict[str, Any]) -> str:
+    """
+    Returns the statistic used to estimate the time of the command.
+
+    :param command: A dictionary optionally containing the command's estimator.
+    :type command: Dict[str, Any]
+    :return: One of mean, ewma, median and p90, mean by default.
+    :rtype: str
+    :raises ValueError: If the estimator is unknown.
+    """
+    estimator: Any = command.get(COMMAND_ESTIMATOR, MEAN)
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"Estimator must be one of {', '.join(ESTIMATORS)}")
+    return str(estimator)
+
+
+def get_cmd_progress(command: Dict[str, Any]) -> str:
+    """
+    Returns how the progress of the command is measured.
+
+    :param command: A dictionary optionally containing the command's progress mode.
+    :type command: Dict[str, Any]
+    :return: Either time or output, time by default.
+    :rtype: str
+    :raises ValueError: If the progress mode is unknown.
+    """
+    progress: Any = command.get(COMMAND_PROGRESS, PROGRESS_TIME)
+    if progress not in (PROGRESS_TIME, PROGRESS_OUTPUT):
+        raise ValueError(f"Progress must be {PROGRESS_TIME} or {PROGRESS_OUTPUT}")
+    return str(progress)
+
+
 def get_time_diff_result(total_time: int, expected_time: int) -> str:
     """
     Returns a string representation of the difference between the total time and expected time.
@@ -154,62 +948,34 @@ def get_time_diff_result(total_time: int, expected_time: int) -> str:
     return f"{time_taken}. {difference_time}"
 
 
-def get_log_file_path(command_id: str) -> Path:
+def get_usage_result(usage: Optional[ResourceUsage]) -> str:
+    """
+    Returns a string representation of the resources used by the command.
+
+    :param usage: The resources used by the command, if known.
+    :type usage: Optional[ResourceUsage]
+    :return: The summary of the resource usage preceded by a space, empty if unknown.
+    :rtype: str
+    """
+    if usage is None:
+        return ""
+    return f" {usage.summary()}."
+
+
+def get_log_file_path(command_id: str, compression: str = NONE) -> Path:
     """
     Returns the path to the log file for the given command id.
 
     :param command_id: The id of the command.
     :type command_id: str
+    :param compression: The compression of the log, one of none, gzip and zstd.
+    :type compression: str
     :return: The path to the log file for the given command id.
     :rtype: Path
     """
     log_dir: Path = root / Path("build/log")
     log_dir.mkdir(parents=True, exist_ok=True)
     formatted_timestamp: str = datetime.now().strftime("%H-%M-%S_%d-%m-%Y")
-    log_file_name: str = f"{command_id}_{formatted_timestamp}.txt"
+    log_file_name: str = f"{command_id}_{formatted_timestamp}{get_suffix(compression)}"
     log_file_path: Path = log_dir / log_file_name
     return log_file_path
-
-
-def get_history(path: Path) -> Path:
-    """
-    Returns a Path object representing the history file at the given path.
-
-    :param path: The path to the history file.
-    :type path: Path
-    :return: A Path object representing the history file at the given path.
-    :rtype: Path
-    """
-    history = Path(path)
-    history.parent.mkdir(parents=True, exist_ok=True)
-    history.touch()
-    return history
-
-
-def get_history_times(path: Path) -> List[int]:
-    """
-    Returns a list of integers representing the history times stored in the history file at the given path.
-
-    :param path: The path to the history file.
-    :type path: Path
-    :return: A list of integers representing the history times stored in the history file at the given path.
-    :rtype: List[int]
-    """
-    history: Path = get_history(path)
-    with open(history, "r") as f:
-        numbers: List[int] = [int(line.strip()) for line in f]
-        return numbers
-
-
-def add_history_time(path: Path, total_time: int) -> None:
-    """
-    Adds the given total time to the history file at the given path.
-
-    :param path: The path to the history file.
-    :type path: Path
-    :param total_time: The total time to add to the history file.
-    :type total_time: int
-    """
-    history: Path = get_history(path)
-    with history.open("a") as f:
-        f.write(f"{total_time}\n")
@@ -0,0 +1,59 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from atomic_file import get_cache_file, read_cache, write_cache
+from scheduler import Scheduler, load_scheduler
+
+CACHE_VERSION = 2
+
+logger = logging.getLogger(__name__)
+
+root: Path = Path(__file__).parent.parent
+
+
+def load_config_scheduler(
+    config_file_path: str, cache_dir: Optional[Path] = None
+) -> Scheduler:
+    """
+    Returns the scheduler of the validated commands of a configuration file, reusing
+    the on-disk cache when the configuration did not change since it was parsed.
+
+    The cache entry holds the parsed configuration, keyed by the path of the
+    configuration file and validated against its modification time and the hash of its
+    content, so that yaml is only imported when the configuration changed. A new
+    scheduler is built from it on each load.
+
+    :param config_file_path: The path to the configuration file in YAML format.
+    :type config_file_path: str
+    :param cache_dir: The directory of the cache, build/cache/config by default.
+    :type cache_dir: Optional[Path]
+    :return: The scheduler of the commands of the configuration.
+    :rtype: Scheduler
+    :raises ValueError: If the configuration is invalid.
+    """
+    path: str = os.path.abspath(config_file_path)
+    cache_file: Path = get_cache_file(path, cache_dir or root / "build/cache/config")
+    with open(path, "rb") as f:
+        mtime_ns: int = os.fstat(f.fileno()).st_mtime_ns
+        content: bytes = f.read()
+    key: Dict[str, Any] = {
+        "version": CACHE_VERSION,
+        "path": path,
+        "mtime_ns": mtime_ns,
+        "content_hash": hashlib.sha256(content).hexdigest(),
+    }
+
+    entry: Optional[Dict[str, Any]] = read_cache(cache_file, key)
+    if entry:
+        logger.debug(f"Loaded parsed configuration from cache: {cache_file}")
+        return load_scheduler(entry["data"])
+
+    import yaml
+
+    data: Dict[str, Any] = yaml.safe_load(content)
+    loaded: Scheduler = load_scheduler(data)
+    write_cache(cache_file, {**key, "data": data})
+    return loaded
@@ -0,0 +1,429 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from argparse import ArgumentParser, Namespace
+from datetime import timedelta
+from typing import IO, Any, Dict, NoReturn, Optional, TextIO, Tuple, cast
+
+from checkpoint import Checkpoint
+from client import get_socket_path
+from command import RunOptions
+from history import History, open_history
+from renderer import AUTO, STATUS, Renderer, RendererHandler
+from report import print_report
+from scheduler import load_scheduler
+from tracing import Tracer, span
+from wait_elegantly import LOG_DATE_FORMAT, LOG_FORMAT, PIPELINE, args_parser
+from wait_elegantly import get_run_options
+from wait_elegantly import load_config
+
+logger = logging.getLogger(__name__)
+
+# The handler writing the log records of the run served in the current context
+client_handler: contextvars.ContextVar[
+    Optional[logging.Handler]
+] = contextvars.ContextVar("client_handler", default=None)
+
+
+class Daemon:
+    def __init__(
+        self,
+        socket_path: str,
+        max_parallel: int,
+        history: Optional[History] = None,
+    ):
+        """
+        Initializes a Daemon object running configurations on behalf of clients
+        connecting to a Unix socket.
+
+        The configurations, the histories and the compiled triage files stay loaded
+        between runs, and all the runs share one event loop and one limit of commands
+        running at the same time on the host.
+
+        :param socket_path: The path to the socket to listen on.
+        :type socket_path: str
+        :param max_parallel: The maximum number of commands running at the same time, across all clients.
+        :type max_parallel: int
+        :param history: The history of all the runs, opened from the arguments of every run if not given.
+        :type history: Optional[History]
+        :raises ValueError: If max_parallel is less than 1.
+        """
+        if max_parallel < 1:
+            raise ValueError("max_parallel must be at least 1")
+        self.socket_path: str = socket_path
+        self.max_parallel: int = max_parallel
+        self.history: Optional[History] = history
+        self.histories: Dict[str, History] = {}
+        self.configs: Dict[str, Tuple[int, int, Dict[str, Any]]] = {}
+        self.slots: Optional[asyncio.Semaphore] = None
+
+    async def serve(self, started: Optional[asyncio.Event] = None) -> None:
+        """
+        Serves the clients until cancelled.
+
+        :param started: An event set once the socket is listening.
+        :type started: Optional[asyncio.Event]
+        :raises ValueError: If another daemon listens on the socket.
+        """
+        check_socket(self.socket_path)
+        self.slots = asyncio.Semaphore(self.max_parallel)
+        server: asyncio.AbstractServer = await asyncio.start_unix_server(
+            self.handle, self.socket_path
+        )
+        os.chmod(self.socket_path, 0o600)
+        logger.info(
+            f"Listening on {self.socket_path}, "
+            f"running at most {self.max_parallel} commands at a time"
+        )
+        if started:
+            started.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            os.unlink(self.socket_path)
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Serves a client: reads its request, runs it while forwarding its output and
+        sends its exit code. The run is stopped if the client disconnects.
+
+        :param reader: The stream of the client.
+        :type reader: asyncio.StreamReader
+        :param writer: The stream to the client.
+        :type writer: asyncio.StreamWriter
+        """
+        try:
+            request: Dict[str, Any] = json.loads(await reader.readline())
+        except ValueError:
+            logger.warning("Ignoring an invalid request")
+            writer.close()
+            return
+        stream: ClientStream = ClientStream(writer, bool(request.get("tty")))
+        run: asyncio.Task[int] = asyncio.create_task(self.run(request, stream))
+        hangup: asyncio.Task[bytes] = asyncio.create_task(reader.read())
+        await asyncio.wait({run, hangup}, return_when=asyncio.FIRST_COMPLETED)
+        if not run.done():
+            logger.info("Client disconnected, stopping its run")
+            run.cancel()
+            await asyncio.wait({run})
+        else:
+            hangup.cancel()
+            stream.send({"exit": run.result()})
+        try:
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def run(self, request: Dict[str, Any], stream: "ClientStream") -> int:
+        """
+        Runs a configuration as wait_elegantly.py would with the same arguments.
+
+        :param request: The arguments of the run, the working directory and terminal of the client.
+        :type request: Dict[str, Any]
+        :param stream: The stream to the client.
+        :type stream: ClientStream
+        :return: The exit code of the run.
+        :rtype: int
+        """
+        parser: RequestParser = cast(RequestParser, args_parser(RequestParser))
+        parser.prog = "wait_elegantly.py"
+        try:
+            args: Namespace = parser.parse_args(request.get("args", []))
+        except SystemExit as e:
+            stream.write(parser.output)
+            return int(e.code or 0)
+        cwd: str = request.get("cwd", ".")
+        env: Optional[Dict[str, str]] = request.get("env")
+        renderer: Renderer = Renderer(
+            cast(TextIO, stream),
+            AUTO if args.display in (None, "bars") else args.display,
+            args.fps,
+            args.status_interval,
+            columns=request.get("columns", 0),
+        )
+        handler: logging.Handler = logging.StreamHandler(cast(TextIO, stream))
+        if renderer.display != STATUS:
+            handler = RendererHandler(renderer)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+        handler.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+        token: contextvars.Token[Optional[logging.Handler]] = client_handler.set(
+            handler
+        )
+        tracer: Optional[Tracer] = None
+        try:
+            options: RunOptions = self.run_options(args, cwd, env)
+            tracer = renderer.tracer = options.tracer
+            if args.profile:
+                logger.warning(
+                    "--profile is ignored by the daemon, run wait_elegantly.py to profile"
+                )
+            if args.live_output:
+                logger.warning(
+                    "--live-output is ignored by the daemon, the logs are in build/log"
+                )
+            if args.watch:
+                logger.warning(
+                    "--watch is ignored by the daemon, run wait_elegantly.py to watch"
+                )
+            with span(tracer, "config load", PIPELINE):
+                data: Dict[str, Any] = self.load_config(os.path.join(cwd, args.config))
+            if args.report:
+                await asyncio.to_thread(
+                    print_report,
+                    load_scheduler(data).commands,
+                    options.history,
+                    options.history_window,
+                    cast(TextIO, stream),
+                )
+                return 0
+            options.on_progress = renderer.update
+            start_time: float = time.time()
+            with span(tracer, "pipeline", PIPELINE):
+                await load_scheduler(data).run_async(options)
+            total_time = str(timedelta(seconds=round(time.time() - start_time)))
+            logger.info(f"Total time: {total_time}")
+            return 0
+        except Exception as e:
+            logger.error(str(e))
+            return 1
+        finally:
+            renderer.close()
+            if tracer:
+                try:
+                    tracer.save(os.path.join(cwd, args.trace))
+                except OSError as e:
+                    logger.error(f"Could not write the trace: {e}")
+            client_handler.reset(token)
+
+    def run_options(
+        self, args: Namespace, cwd: str, env: Optional[Dict[str, str]] = None
+    ) -> RunOptions:
+        """
+        Returns the options of a run, sharing the histories and the limit of commands
+        running at the same time with the other runs.
+
+        :param args: The parsed arguments of the run.
+        :type args: Namespace
+        :param cwd: The working directory of the client, where the commands run.
+        :type cwd: str
+        :param env: The environment of the client, given to the commands, the one of the daemon if not given.
+        :type env: Optional[Dict[str, str]]
+        :return: The options of the run.
+        :rtype: RunOptions
+        """
+        history: Optional[History] = self.history or self.histories.get(args.history)
+        if history is None:
+            history = self.histories[args.history] = open_history(args.history)
+        options: RunOptions = get_run_options(args, history)
+        if options.triage_file:
+            options.triage_file = os.path.join(cwd, options.triage_file)
+        options.checkpoint = Checkpoint(os.path.join(cwd, args.config), args.resume)
+        options.config = os.path.abspath(os.path.join(cwd, args.config))
+        options.live_output = False
+        options.cwd = cwd
+        options.env = env
+        options.slots = self.slots
+        return options
+
+    def load_config(self, config: str) -> Dict[str, Any]:
+        """
+        Returns a configuration, parsed again only if its file changed.
+
+        :param config: The path to the configuration file in YAML format.
+        :type config: str
+        :return: The parsed configuration.
+        :rtype: Dict[str, Any]
+        """
+        stat: os.stat_result = os.stat(config)
+        loaded: Optional[Tuple[int, int, Dict[str, Any]]] = self.configs.get(config)
+        if loaded and loaded[:2] == (stat.st_mtime_ns, stat.st_size):
+            return loaded[2]
+        data: Dict[str, Any] = load_config(config)
+        self.configs[config] = (stat.st_mtime_ns, stat.st_size, data)
+        return data
+
+
+class ClientStream:
+    def __init__(self, writer: asyncio.StreamWriter, tty: bool):
+        """
+        Initializes a ClientStream object forwarding the text written to it to a client,
+        from the event loop or from any thread.
+
+        :param writer: The stream to the client.
+        :type writer: asyncio.StreamWriter
+        :param tty: Whether the output of the client is a terminal.
+        :type tty: bool
+        """
+        self.writer: asyncio.StreamWriter = writer
+        self.tty: bool = tty
+        self.loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        self.thread: int = threading.get_ident()
+
+    def write(self, text: str) -> int:
+        """
+        Sends text to the client.
+
+        :param text: The text.
+        :type text: str
+        :return: The number of characters written.
+        :rtype: int
+        """
+        if text:
+            self.send({"out": text})
+        return len(text)
+
+    def send(self, message: Dict[str, Any]) -> None:
+        """
+        Sends a message to the client, unless it disconnected.
+
+        :param message: The message.
+        :type message: Dict[str, Any]
+        """
+        data: bytes = json.dumps(message).encode() + b"\n"
+        if threading.get_ident() == self.thread:
+            if not self.writer.is_closing():
+                self.writer.write(data)
+        else:
+            self.loop.call_soon_threadsafe(self.send, message)
+
+    def flush(self) -> None:
+        """
+        Does nothing, the text is sent as soon as it is written.
+        """
+
+    def isatty(self) -> bool:
+        """
+        Returns whether the output of the client is a terminal.
+
+        :return: Whether the output of the client is a terminal.
+        :rtype: bool
+        """
+        return self.tty
+
+
+class RequestParser(ArgumentParser):
+    """
+    A parser collecting its help and errors instead of printing them, so that they are
+    sent to the client.
+    """
+
+    output: str = ""
+
+    def print_help(self, file: Optional[IO[str]] = None) -> None:
+        self.output += self.format_help()
+
+    def exit(self, status: int = 0, message: Optional[str] = None) -> NoReturn:
+        self.output += message or ""
+        raise SystemExit(status)
+
+    def error(self, message: str) -> NoReturn:
+        self.exit(2, f"{self.format_usage()}{self.prog}: error: {message}\n")
+
+
+class ClientLogHandler(logging.Handler):
+    def __init__(self, fallback: logging.Handler):
+        """
+        Initializes a ClientLogHandler object sending the log records of every run to
+        its client, and the other records to a fallback handler.
+
+        :param fallback: The handler of the log records of the daemon itself.
+        :type fallback: logging.Handler
+        """
+        super().__init__()
+        self.fallback: logging.Handler = fallback
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        Writes a log record.
+
+        :param record: The log record.
+        :type record: logging.LogRecord
+        """
+        handler: logging.Handler = client_handler.get() or self.fallback
+        if record.levelno >= handler.level:
+            handler.handle(record)
+
+
+def check_socket(socket_path: str) -> None:
+    """
+    Removes the socket left by a daemon that did not stop cleanly.
+
+    :param socket_path: The path to the socket.
+    :type socket_path: str
+    :raises ValueError: If another daemon listens on the socket.
+    """
+    if not os.path.exists(socket_path):
+        os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except ConnectionRefusedError:
+            os.unlink(socket_path)
+            return
+    raise ValueError(f"A daemon is already listening on {socket_path}")
+
+
+async def run_daemon(daemon: Daemon) -> None:
+    """
+    Serves the clients until the daemon is interrupted or terminated.
+
+    :param daemon: The daemon.
+    :type daemon: Daemon
+    """
+    task: Optional[asyncio.Task[Any]] = asyncio.current_task()
+    if task:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    await daemon.serve()
+
+
+def args_parser_daemon() -> ArgumentParser:
+    """
+    Parses command line arguments.
+
+    :return: An ArgumentParser object containing parsed command line arguments.
+    :rtype: ArgumentParser
+    """
+    arg_parser: ArgumentParser = ArgumentParser(
+        description="Serve wait_elegantly runs over a Unix socket"
+    )
+    arg_parser.add_argument(
+        "--socket",
+        type=str,
+        default=get_socket_path(),
+        help="Path to the socket, WAIT_ELEGANTLY_SOCKET or build/wait_elegantly.sock",
+    )
+    arg_parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Maximum number of commands running at the same time across all clients",
+    )
+    arg_parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Set the log level to DEBUG"
+    )
+    return arg_parser
+
+
+if __name__ == "__main__":
+    parser: ArgumentParser = args_parser_daemon()
+    args = parser.parse_args()
+    fallback: logging.Handler = logging.StreamHandler()
+    fallback.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+    fallback.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    logging.basicConfig(level=logging.DEBUG, handlers=[ClientLogHandler(fallback)])
+    try:
+        asyncio.run(run_daemon(Daemon(args.socket, args.max_parallel)))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
@@ -0,0 +1,297 @@
+import logging
+from bisect import insort
+from typing import Any, Dict, List, Optional
+
+MEAN = "mean"
+EWMA = "ewma"
+MEDIAN = "median"
+P90 = "p90"
+ESTIMATORS = (MEAN, EWMA, MEDIAN, P90)
+
+EWMA_ALPHA = 0.3
+OUTLIER_MIN_SAMPLES = 5
+OUTLIER_SPREAD = 3.0
+OUTLIER_STREAK = 3
+QUANTILES = (0.5, 0.9, 0.95)
+
+logger = logging.getLogger(__name__)
+
+
+class P2Quantile:
+    def __init__(self, quantile: float, state: Optional[Dict[str, Any]] = None):
+        """
+        Initializes a P2Quantile object estimating a quantile of a stream of values in
+        constant memory with the P-square algorithm of Jain and Chlamtac.
+
+        :param quantile: The quantile to estimate, between 0 and 1.
+        :type quantile: float
+        :param state: The state of a previous estimation to continue.
+        :type state: Optional[Dict[str, Any]]
+        """
+        self.quantile: float = quantile
+        self.heights: List[float] = []
+        self.positions: List[float] = [1, 2, 3, 4, 5]
+        self.desired: List[float] = [
+            1,
+            1 + 2 * quantile,
+            1 + 4 * quantile,
+            3 + 2 * quantile,
+            5,
+        ]
+        self.increments: List[float] = [
+            0,
+            quantile / 2,
+            quantile,
+            (1 + quantile) / 2,
+            1,
+        ]
+        if state:
+            self.heights = list(state["heights"])
+            self.positions = list(state["positions"])
+            self.desired = list(state["desired"])
+
+    def add(self, value: float) -> None:
+        """
+        Adds a value to the estimation.
+
+        :param value: The new value.
+        :type value: float
+        """
+        heights: List[float] = self.heights
+        if len(heights) < 5:
+            insort(heights, value)
+            return
+
+        cell: int
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+        for i in range(cell + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        positions: List[float] = self.positions
+        for i in range(1, 4):
+            offset: float = self.desired[i] - positions[i]
+            if (offset >= 1 and positions[i + 1] - positions[i] > 1) or (
+                offset <= -1 and positions[i - 1] - positions[i] < -1
+            ):
+                step: int = 1 if offset > 0 else -1
+                height: float = self.parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self.linear(i, step)
+                heights[i] = height
+                positions[i] += step
+
+    def parabolic(self, i: int, step: int) -> float:
+        """
+        Returns the piecewise-parabolic prediction of a marker height.
+
+        :param i: The index of the marker.
+        :type i: int
+        :param step: The direction the marker moves in, 1 or -1.
+        :type step: int
+        :return: The new height of the marker.
+        :rtype: float
+        """
+        q: List[float] = self.heights
+        n: List[float] = self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def linear(self, i: int, step: int) -> float:
+        """
+        Returns the linear prediction of a marker height.
+
+        :param i: The index of the marker.
+        :type i: int
+        :param step: The direction the marker moves in, 1 or -1.
+        :type step: int
+        :return: The new height of the marker.
+        :rtype: float
+        """
+        q: List[float] = self.heights
+        n: List[float] = self.positions
+        return q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+
+    def value(self) -> float:
+        """
+        Returns the estimated quantile.
+
+        :return: The estimated quantile, 0 if no value was added.
+        :rtype: float
+        """
+        if not self.heights:
+            return 0
+        if len(self.heights) < 5:
+            return self.heights[round(self.quantile * (len(self.heights) - 1))]
+        return self.heights[2]
+
+    def state(self) -> Dict[str, Any]:
+        """
+        Returns the state of the estimation, to be stored as JSON.
+
+        :return: The state of the estimation.
+        :rtype: Dict[str, Any]
+        """
+        return {
+            "heights": self.heights,
+            "positions": self.positions,
+            "desired": self.desired,
+        }
+
+
+class Estimator:
+    def __init__(self, state: Optional[Dict[str, Any]] = None):
+        """
+        Initializes an Estimator object keeping statistics of the durations of a command
+        that are updated in constant time for every new run.
+
+        Durations far above the usual spread are rejected as outliers, unless several
+        of them come in a row, which means the command became slower.
+
+        :param state: The state of a previous estimator to continue.
+        :type state: Optional[Dict[str, Any]]
+        """
+        state = state or {}
+        self.count: int = state.get("count", 0)
+        self.mean: float = state.get("mean", 0.0)
+        self.ewma: float = state.get("ewma", 0.0)
+        self.min_time: int = state.get("min_time", -1)
+        self.max_time: int = state.get("max_time", -1)
+        self.rejected: int = state.get("rejected", 0)
+        self.streak: int = state.get("streak", 0)
+        quantiles: Dict[str, Any] = state.get("quantiles", {})
+        self.quantiles: Dict[float, P2Quantile] = {
+            quantile: P2Quantile(quantile, quantiles.get(str(quantile)))
+            for quantile in QUANTILES
+        }
+
+    @classmethod
+    def from_times(cls, times: List[int]) -> "Estimator":
+        """
+        Returns an Estimator fed with the given durations.
+
+        :param times: The durations of the previous runs, oldest first.
+        :type times: List[int]
+        :return: The estimator.
+        :rtype: Estimator
+        """
+        estimator: Estimator = cls()
+        for duration in times:
+            estimator.add(duration)
+        return estimator
+
+    def add(self, duration: int) -> bool:
+        """
+        Adds the duration of a successful run.
+
+        :param duration: The duration of the run in seconds.
+        :type duration: int
+        :return: Whether the duration was used, False if it was rejected as an outlier.
+        :rtype: bool
+        """
+        if self.is_outlier(duration):
+            self.streak += 1
+            if self.streak < OUTLIER_STREAK:
+                self.rejected += 1
+                logger.debug(f"Ignoring outlier duration {duration}s")
+                return False
+        self.streak = 0
+        self.count += 1
+        self.mean += (duration - self.mean) / self.count
+        self.ewma = (
+            duration
+            if self.count == 1
+            else EWMA_ALPHA * duration + (1 - EWMA_ALPHA) * self.ewma
+        )
+        self.min_time = duration if self.min_time < 0 else min(self.min_time, duration)
+        self.max_time = max(self.max_time, duration)
+        for quantile in self.quantiles.values():
+            quantile.add(duration)
+        return True
+
+    def is_outlier(self, duration: int) -> bool:
+        """
+        Returns whether a duration is far above the usual durations.
+
+        :param duration: The duration of a run in seconds.
+        :type duration: int
+        :return: Whether the duration is an outlier.
+        :rtype: bool
+        """
+        if self.count < OUTLIER_MIN_SAMPLES:
+            return False
+        median: float = self.percentile(0.5)
+        spread: float = max(self.percentile(0.9) - median, median * 0.1, 1)
+        return duration > median + OUTLIER_SPREAD * spread
+
+    def percentile(self, quantile: float) -> float:
+        """
+        Returns an estimated quantile of the durations.
+
+        :param quantile: One of the tracked quantiles.
+        :type quantile: float
+        :return: The estimated quantile in seconds.
+        :rtype: float
+        """
+        return self.quantiles[quantile].value()
+
+    def expected(self, kind: str = MEAN) -> int:
+        """
+        Returns the expected duration of the next run.
+
+        :param kind: The statistic to use, one of mean, ewma, median and p90.
+        :type kind: str
+        :return: The expected duration in seconds, -1 if there is no previous run.
+        :rtype: int
+        """
+        if not self.count:
+            return -1
+        values: Dict[str, float] = {
+            MEAN: self.mean,
+            EWMA: self.ewma,
+            MEDIAN: self.percentile(0.5),
+            P90: self.percentile(0.9),
+        }
+        return round(values[kind])
+
+    def band(self) -> str:
+        """
+        Returns the range between the median and the 90th percentile of the durations.
+
+        :return: The p50-p90 range, empty if there is no previous run.
+        :rtype: str
+        """
+        if not self.count:
+            return ""
+        return f"p50-p90: {round(self.percentile(0.5))}s-{round(self.percentile(0.9))}s"
+
+    def state(self) -> Dict[str, Any]:
+        """
+        Returns the state of the estimator, to be stored as JSON.
+
+        :return: The state of the estimator.
+        :rtype: Dict[str, Any]
+        """
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "ewma": self.ewma,
+            "min_time": self.min_time,
+            "max_time": self.max_time,
+            "rejected": self.rejected,
+            "streak": self.streak,
+            "quantiles": {
+                str(quantile): estimation.state()
+                for quantile, estimation in self.quantiles.items()
+            },
+        }
@@ -0,0 +1,170 @@
+import logging
+import os
+import selectors
+import signal
+import threading
+from subprocess import Popen
+from typing import Any, Optional
+
+from resources import ResourceUsage
+
+logger = logging.getLogger(__name__)
+
+
+class ExitWaiter:
+    def __init__(self, process: Popen[Any]):
+        """
+        Initializes an ExitWaiter object that wakes up as soon as the process exits.
+
+        A pidfd is watched with a selector where the platform supports it, otherwise a
+        thread blocks on the process and signals its exit. The process is reaped with
+        os.wait4 to collect its resource usage.
+
+        The process group is only signalled while the process is not reaped, as its id
+        may be reused afterwards. Once a signal was sent to the group, the processes
+        left in it are killed when the process exits, before it is reaped.
+
+        :param process: The process to wait for.
+        :type process: subprocess.Popen
+        """
+        self.process: Popen[Any] = process
+        self.exited: threading.Event = threading.Event()
+        self.lock: threading.Lock = threading.Lock()
+        self.usage: Optional[ResourceUsage] = None
+        self.selector: Optional[selectors.BaseSelector] = None
+        self.pidfd: int = -1
+        self.pgid: int = -1
+        self.group_signalled: bool = False
+
+        if process.returncode is not None:
+            self.exited.set()
+            return
+        try:
+            self.pgid = os.getpgid(process.pid)
+        except ProcessLookupError:
+            pass
+        try:
+            self.pidfd = os.pidfd_open(process.pid)
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.pidfd, selectors.EVENT_READ)
+            logger.debug(f"Waiting for process {process.pid} with a pidfd")
+        except (AttributeError, OSError):
+            self.close()
+            logger.debug(f"Waiting for process {process.pid} with a thread")
+            threading.Thread(target=self.wait_blocking, daemon=True).start()
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waits until the process exits or the timeout expires.
+
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :return: Whether the process exited and was reaped.
+        :rtype: bool
+        """
+        if self.exited.is_set():
+            return True
+        if self.selector:
+            if self.selector.select(max(0.0, timeout)):
+                self.reap()
+                self.close()
+            return self.exited.is_set()
+        return self.exited.wait(max(0.0, timeout))
+
+    async def wait_async(self, timeout: float) -> bool:
+        """
+        Waits on the running event loop until the process exits or the timeout expires.
+
+        The pidfd is watched by the event loop itself, so no thread is used where
+        pidfds are supported.
+
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :return: Whether the process exited and was reaped.
+        :rtype: bool
+        """
+        import asyncio
+
+        if self.exited.is_set():
+            return True
+        if self.pidfd < 0:
+            exited: bool = await asyncio.to_thread(self.exited.wait, max(0.0, timeout))
+            return exited
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        readable: asyncio.Event = asyncio.Event()
+        loop.add_reader(self.pidfd, readable.set)
+        try:
+            await asyncio.wait_for(readable.wait(), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            loop.remove_reader(self.pidfd)
+        if readable.is_set():
+            self.reap()
+            self.close()
+        return self.exited.is_set()
+
+    def wait_blocking(self) -> None:
+        """
+        Blocks until the process exits, used when pidfds are not available.
+        """
+        try:
+            os.waitid(os.P_PID, self.process.pid, os.WEXITED | os.WNOWAIT)
+        except (AttributeError, ChildProcessError):
+            pass
+        self.reap()
+
+    def reap(self) -> None:
+        """
+        Reaps the exited process, recording its exit code and resource usage.
+        """
+        with self.lock:
+            if self.group_signalled and self.process.returncode is None:
+                try:
+                    os.killpg(self.pgid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            try:
+                _, status, rusage = os.wait4(self.process.pid, 0)
+                self.process.returncode = os.waitstatus_to_exitcode(status)
+                self.usage = ResourceUsage.from_rusage(rusage)
+            except ChildProcessError:
+                logger.debug(f"Process {self.process.pid} was already reaped")
+                self.process.wait()
+            self.exited.set()
+
+    def signal(self, sig: int, group: bool = False) -> None:
+        """
+        Sends a signal to the process unless it was already reaped.
+
+        A signal to the whole process group is only sent if the process was started in
+        its own process group, and also reaches the processes it left behind when it
+        already exited but is not reaped yet.
+
+        :param sig: The signal to send.
+        :type sig: int
+        :param group: Whether to send the signal to the whole process group of the process.
+        :type group: bool
+        """
+        with self.lock:
+            if self.exited.is_set():
+                return
+            try:
+                if group and self.pgid == self.process.pid:
+                    self.group_signalled = True
+                    os.killpg(self.pgid, sig)
+                else:
+                    os.kill(self.process.pid, sig)
+            except ProcessLookupError:
+                logger.debug(f"Process {self.process.pid} already exited")
+
+    def close(self) -> None:
+        """
+        Releases the selector and the pidfd.
+        """
+        if self.selector:
+            self.selector.close()
+            self.selector = None
+        if self.pidfd >= 0:
+            os.close(self.pidfd)
+            self.pidfd = -1
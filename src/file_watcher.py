@@ -0,0 +1,396 @@
+import logging
+import os
+import re
+import select
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Dict, List, Set, Tuple
+
+DEBOUNCE = 0.3
+DEBOUNCE_MAX = 5.0
+POLL_INTERVAL = 1.0
+WAIT_INTERVAL = 0.5
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+INOTIFY_EVENT = struct.Struct("iIII")
+INOTIFY_READ_SIZE = 64 * 1024
+
+GLOB_TOKENS = re.compile(r"(\*\*/|\*\*|\*|\?|\[!?\]?[^\]]*\])")
+GLOB_TRANSLATIONS = {"**/": "(?:.*/)?", "**": ".*", "*": "[^/]*", "?": "[^/]"}
+GLOB_MAGIC = re.compile(r"[*?[]")
+
+logger = logging.getLogger(__name__)
+
+
+class FileWatcher(ABC):
+    def __init__(self, patterns: List[str], ignored: List[str]):
+        """
+        Initializes a FileWatcher object waiting for the files matching globs to change.
+
+        :param patterns: The globs of the watched files, the environment variables prefixed with $ being left out.
+        :type patterns: List[str]
+        :param ignored: The globs of the files whose changes are ignored, e.g. the outputs of the commands.
+        :type ignored: List[str]
+        """
+        from fingerprint import ENV_PREFIX
+
+        self.globs: List[str] = [
+            os.path.normpath(pattern)
+            for pattern in patterns
+            if not pattern.startswith(ENV_PREFIX)
+        ]
+        self.ignored: List[str] = [os.path.normpath(pattern) for pattern in ignored]
+        self.closed: bool = False
+
+    def wait(self, debounce: float = DEBOUNCE) -> Set[str]:
+        """
+        Waits for changes to the watched files, until none changed for the debounce delay
+        so that a burst of changes, e.g. saving many files, is returned at once.
+
+        :param debounce: The number of seconds without any change ending the burst.
+        :type debounce: float
+        :return: The paths of the files that changed, empty if the watcher was closed.
+        :rtype: Set[str]
+        """
+        changed: Set[str] = set()
+        first: float = 0
+        deadline: float = 0
+        while not self.closed:
+            timeout: float = WAIT_INTERVAL
+            if changed:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    return changed
+            paths: Set[str] = {
+                path for path in self.poll(timeout) if self.is_watched(path)
+            }
+            if paths:
+                now: float = time.monotonic()
+                first = first if changed else now
+                deadline = min(now + debounce, first + DEBOUNCE_MAX)
+                changed |= paths
+        return set()
+
+    @abstractmethod
+    def poll(self, timeout: float) -> Set[str]:
+        """
+        Returns the paths that changed, waiting for at most the given time.
+
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :return: The paths that changed, including the ones that are not watched.
+        :rtype: Set[str]
+        """
+
+    def is_watched(self, path: str) -> bool:
+        """
+        Returns whether a path matches the watched globs and none of the ignored ones.
+
+        :param path: The normalized path.
+        :type path: str
+        :return: Whether changes to the path are reported.
+        :rtype: bool
+        """
+        return any(matches(path, pattern) for pattern in self.globs) and not any(
+            matches(path, pattern) for pattern in self.ignored
+        )
+
+    def close(self) -> None:
+        """
+        Stops waiting for changes, wait returning in less than WAIT_INTERVAL seconds.
+        """
+        self.closed = True
+
+
+class InotifyWatcher(FileWatcher):
+    def __init__(self, patterns: List[str], ignored: List[str]):
+        """
+        Initializes an InotifyWatcher object told about the changes by the kernel with
+        inotify(7), called through ctypes.
+
+        The directories of the globs are watched, and all their subdirectories when a
+        glob spans several directories, except hidden ones as glob does.
+
+        :param patterns: The globs of the watched files.
+        :type patterns: List[str]
+        :param ignored: The globs of the files whose changes are ignored.
+        :type ignored: List[str]
+        :raises OSError: If inotify is not available.
+        """
+        import ctypes
+
+        super().__init__(patterns, ignored)
+        self.libc: Any = ctypes.CDLL(None, use_errno=True)
+        self.get_errno = ctypes.get_errno
+        self.fd: int = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(self.get_errno(), "inotify_init1 failed")
+        self.lock: threading.Lock = threading.Lock()
+        self.directories: Dict[int, str] = {}
+        self.recursive: Set[int] = set()
+        for directory, recursive in sorted(set(map(get_watch_root, self.globs))):
+            self.add_watch(directory, recursive)
+
+    def add_watch(self, directory: str, recursive: bool) -> None:
+        """
+        Watches a directory, and its subdirectories if recursive.
+
+        :param directory: The directory.
+        :type directory: str
+        :param recursive: Whether to watch its subdirectories, including the ones created later.
+        :type recursive: bool
+        """
+        wd: int = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(directory), INOTIFY_MASK
+        )
+        if wd < 0:
+            logger.warning(
+                f"Could not watch {directory}: {os.strerror(self.get_errno())}"
+            )
+            return
+        self.directories[wd] = directory
+        if not recursive:
+            return
+        self.recursive.add(wd)
+        try:
+            entries: List[os.DirEntry[str]] = list(os.scandir(directory))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and not entry.name.startswith("."):
+                self.add_watch(os.path.join(directory, entry.name), True)
+
+    def poll(self, timeout: float) -> Set[str]:
+        """
+        Returns the paths that changed, waiting for at most the given time.
+
+        When the kernel dropped events, all the files matching the globs are considered
+        changed.
+
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :return: The paths that changed, including the ones that are not watched.
+        :rtype: Set[str]
+        """
+        with self.lock:
+            if self.closed:
+                return set()
+            if not select.select([self.fd], [], [], max(0.0, timeout))[0]:
+                return set()
+            try:
+                data: bytes = os.read(self.fd, INOTIFY_READ_SIZE)
+            except BlockingIOError:
+                return set()
+        paths: Set[str] = set()
+        offset: int = 0
+        while offset < len(data):
+            wd, mask, _, size = INOTIFY_EVENT.unpack_from(data, offset)
+            start: int = offset + INOTIFY_EVENT.size
+            offset = start + size
+            name: bytes = data[start:offset].rstrip(b"\0")
+            if mask & IN_Q_OVERFLOW:
+                logger.debug("Too many changes at once, considering all files changed")
+                from fingerprint import expand
+
+                paths.update(expand(self.globs))
+                continue
+            if wd not in self.directories:
+                continue
+            if mask & IN_IGNORED:
+                del self.directories[wd]
+                self.recursive.discard(wd)
+                continue
+            path: str = os.path.normpath(
+                os.path.join(self.directories[wd], os.fsdecode(name))
+            )
+            if not mask & IN_ISDIR:
+                paths.add(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO) and wd in self.recursive:
+                self.add_watch(path, True)
+                paths.update(list_files(path))
+        return paths
+
+    def close(self) -> None:
+        """
+        Stops waiting for changes and closes the inotify file descriptor.
+        """
+        super().close()
+        with self.lock:
+            if self.fd >= 0:
+                os.close(self.fd)
+                self.fd = -1
+
+
+class PollingWatcher(FileWatcher):
+    def __init__(
+        self, patterns: List[str], ignored: List[str], interval: float = POLL_INTERVAL
+    ):
+        """
+        Initializes a PollingWatcher object finding the changes by comparing the
+        modification time and size of the files matching the globs every interval.
+
+        :param patterns: The globs of the watched files.
+        :type patterns: List[str]
+        :param ignored: The globs of the files whose changes are ignored.
+        :type ignored: List[str]
+        :param interval: The number of seconds between two scans of the files.
+        :type interval: float
+        """
+        super().__init__(patterns, ignored)
+        self.interval: float = interval
+        self.files: Dict[str, Tuple[int, int]] = self.scan()
+        self.last_scan: float = time.monotonic()
+
+    def poll(self, timeout: float) -> Set[str]:
+        """
+        Returns the paths that changed, scanning the files if the interval elapsed.
+
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :return: The paths that changed.
+        :rtype: Set[str]
+        """
+        time.sleep(
+            max(0.0, min(timeout, self.last_scan + self.interval - time.monotonic()))
+        )
+        if time.monotonic() < self.last_scan + self.interval:
+            return set()
+        files: Dict[str, Tuple[int, int]] = self.scan()
+        self.last_scan = time.monotonic()
+        changed: Set[str] = {
+            path
+            for path in files.keys() | self.files.keys()
+            if files.get(path) != self.files.get(path)
+        }
+        self.files = files
+        return changed
+
+    def scan(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Returns the modification time and size of the files matching the globs.
+
+        :return: The modification time in ns and the size of every file.
+        :rtype: Dict[str, Tuple[int, int]]
+        """
+        from fingerprint import expand
+
+        files: Dict[str, Tuple[int, int]] = {}
+        for path in expand(self.globs):
+            try:
+                stat: os.stat_result = os.stat(path)
+            except OSError:
+                continue
+            files[os.path.normpath(path)] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+
+def open_watcher(patterns: List[str], ignored: List[str]) -> FileWatcher:
+    """
+    Returns a watcher of the files matching globs, using inotify where available and
+    polling otherwise.
+
+    :param patterns: The globs of the watched files, the environment variables prefixed with $ being left out.
+    :type patterns: List[str]
+    :param ignored: The globs of the files whose changes are ignored.
+    :type ignored: List[str]
+    :return: The watcher.
+    :rtype: FileWatcher
+    """
+    try:
+        watcher: FileWatcher = InotifyWatcher(patterns, ignored)
+        logger.debug("Watching the inputs with inotify")
+    except (AttributeError, OSError) as e:
+        logger.debug(f"inotify is not available ({e}), polling the inputs instead")
+        watcher = PollingWatcher(patterns, ignored)
+    return watcher
+
+
+def get_watch_root(pattern: str) -> Tuple[str, bool]:
+    """
+    Returns the directory to watch for the files matching a glob.
+
+    :param pattern: The normalized glob.
+    :type pattern: str
+    :return: The closest existing directory containing all the matching files, and whether its subdirectories have to be watched too.
+    :rtype: Tuple[str, bool]
+    """
+    parts: List[str] = pattern.split("/")
+    fixed: int = 0
+    while fixed < len(parts) and not GLOB_MAGIC.search(parts[fixed]):
+        fixed += 1
+    recursive: bool = len(parts) - fixed > 1
+    directory: str = "/".join(parts[: min(fixed, len(parts) - 1)])
+    if pattern.startswith("/") and not directory:
+        directory = "/"
+    directory = directory or "."
+    while not os.path.isdir(directory):
+        directory, recursive = os.path.dirname(directory) or ".", True
+    return directory, recursive
+
+
+def list_files(directory: str) -> List[str]:
+    """
+    Returns the files in a directory and its subdirectories.
+
+    :param directory: The directory.
+    :type directory: str
+    :return: The normalized paths of the files.
+    :rtype: List[str]
+    """
+    return [
+        os.path.normpath(os.path.join(parent, name))
+        for parent, _, names in os.walk(directory)
+        for name in names
+    ]
+
+
+def matches(path: str, pattern: str) -> bool:
+    """
+    Returns whether a path matches a glob, ** matching any number of directories.
+
+    :param path: The normalized path.
+    :type path: str
+    :param pattern: The normalized glob.
+    :type pattern: str
+    :return: Whether the path matches.
+    :rtype: bool
+    """
+    return compile_glob(pattern).fullmatch(path) is not None
+
+
+@lru_cache(maxsize=None)
+def compile_glob(pattern: str) -> "re.Pattern[str]":
+    """
+    Translates a glob to a regular expression, * and ? not matching /.
+
+    :param pattern: The glob.
+    :type pattern: str
+    :return: The regular expression.
+    :rtype: re.Pattern[str]
+    """
+    regex: str = ""
+    for i, token in enumerate(GLOB_TOKENS.split(pattern)):
+        if i % 2 == 0:
+            regex += re.escape(token)
+        elif token in GLOB_TRANSLATIONS:
+            regex += GLOB_TRANSLATIONS[token]
+        else:
+            characters: str = token[1:-1].replace("\\", "\\\\")
+            if characters.startswith("!"):
+                characters = "^" + characters[1:]
+            regex += f"[{characters}]"
+    return re.compile(regex)
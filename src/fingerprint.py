@@ -0,0 +1,214 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from atomic_file import write_atomically
+
+FINGERPRINT_VERSION = 1
+ENV_PREFIX = "$"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# The modification time in ns, the size and the hash of the content of a file
+FileState = List[Any]
+
+logger = logging.getLogger(__name__)
+
+root: Path = Path(__file__).parent.parent
+
+
+class ResultCache:
+    def __init__(
+        self,
+        cmd_id: str,
+        values: List[str],
+        inputs: List[str],
+        outputs: List[str],
+        cache_dir: Optional[Path] = None,
+        cwd: str = "",
+        env: Optional[Dict[str, str]] = None,
+        config: str = "",
+    ):
+        """
+        Initializes a ResultCache object telling whether a command can be skipped because
+        nothing it depends on changed since its last successful run.
+
+        The fingerprint of a run covers the command line, the environment variables
+        declared as inputs ($NAME) and the content of the files matching the input
+        globs, except the declared outputs. Files whose modification time and size did
+        not change are not hashed again. The state is stored per configuration file and
+        working directory, so that commands with the same id do not share it.
+
+        :param cmd_id: The id of the command.
+        :type cmd_id: str
+        :param values: The command line.
+        :type values: List[str]
+        :param inputs: The globs of the input files and the names of the input environment variables, prefixed with $.
+        :type inputs: List[str]
+        :param outputs: The globs of the files written by the command.
+        :type outputs: List[str]
+        :param cache_dir: The directory of the cache, build/cache/fingerprint by default.
+        :type cache_dir: Optional[Path]
+        :param cwd: The directory the relative globs are relative to, the current one if empty.
+        :type cwd: str
+        :param env: The environment of the command, the current one if not given.
+        :type env: Optional[Dict[str, str]]
+        :param config: The absolute path to the configuration file of the command.
+        :type config: str
+        """
+        directory: Path = cache_dir or root / Path("build/cache/fingerprint")
+        origin: str = f"{config}\0{os.path.abspath(cwd or os.curdir)}"
+        name: str = hashlib.sha256(origin.encode()).hexdigest()[:16]
+        self.path: Path = directory / f"{cmd_id}_{name}.json"
+        self.values: List[str] = values
+        self.inputs: List[str] = [
+            entry if entry.startswith(ENV_PREFIX) else os.path.join(cwd, entry)
+            for entry in inputs
+        ]
+        self.outputs: List[str] = [os.path.join(cwd, pattern) for pattern in outputs]
+        self.env: Dict[str, str] = dict(os.environ) if env is None else env
+        self.state: Dict[str, Any] = read_state(self.path)
+        self.files: Dict[str, FileState] = {}
+        self.current: str = ""
+
+    def fingerprint(self) -> str:
+        """
+        Returns the fingerprint of the command and its inputs as they are now.
+
+        :return: The hex digest of the fingerprint.
+        :rtype: str
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([FINGERPRINT_VERSION, self.values]).encode())
+        patterns: List[str] = []
+        for entry in self.inputs:
+            if entry.startswith(ENV_PREFIX):
+                value: Optional[str] = self.env.get(entry.removeprefix(ENV_PREFIX))
+                digest.update(json.dumps([entry, value]).encode())
+            else:
+                patterns.append(entry)
+        outputs: Set[str] = set(expand(self.outputs))
+        paths: List[str] = [path for path in expand(patterns) if path not in outputs]
+        self.files = hash_files(paths, self.state.get("files", {}))
+        for path, state in sorted(self.files.items()):
+            digest.update(json.dumps([path, state[2]]).encode())
+        self.current = digest.hexdigest()
+        return self.current
+
+    def hit(self) -> bool:
+        """
+        Returns whether the last successful run had the same fingerprint and its outputs
+        are still the ones it wrote.
+
+        :return: Whether the command can be skipped.
+        :rtype: bool
+        """
+        if self.fingerprint() != self.state.get("fingerprint"):
+            return False
+        outputs: Dict[str, FileState] = self.state.get("outputs", {})
+        current: Dict[str, FileState] = hash_files(expand(self.outputs), outputs)
+        if {path: state[2] for path, state in current.items()} != {
+            path: state[2] for path, state in outputs.items()
+        }:
+            logger.debug(f"Outputs changed since the last run: {self.path.stem}")
+            return False
+        return True
+
+    def save(self) -> None:
+        """
+        Records a successful run with the fingerprint computed before it started and the
+        outputs it wrote.
+        """
+        if not self.current:
+            self.fingerprint()
+        previous: Dict[str, FileState] = self.state.get("outputs", {})
+        self.state = {
+            "fingerprint": self.current,
+            "files": self.files,
+            "outputs": hash_files(expand(self.outputs), previous),
+        }
+        write_atomically(self.path, json.dumps(self.state).encode())
+
+
+def read_state(path: Path) -> Dict[str, Any]:
+    """
+    Returns the state of the last successful run of a command.
+
+    :param path: The path to the cache file of the command.
+    :type path: Path
+    :return: The state, empty if there is no valid cache file.
+    :rtype: Dict[str, Any]
+    """
+    try:
+        with open(path, "r") as f:
+            state: Dict[str, Any] = json.load(f)
+        return state
+    except (OSError, ValueError):
+        return {}
+
+
+def expand(patterns: List[str]) -> List[str]:
+    """
+    Returns the files matching globs, ** matching any number of directories.
+
+    :param patterns: The globs.
+    :type patterns: List[str]
+    :return: The sorted paths of the matching files.
+    :rtype: List[str]
+    """
+    paths: Set[str] = set()
+    for pattern in patterns:
+        paths.update(
+            path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)
+        )
+    return sorted(paths)
+
+
+def hash_files(paths: List[str], known: Dict[str, FileState]) -> Dict[str, FileState]:
+    """
+    Returns the state of files, hashing in parallel the files whose modification time
+    or size changed.
+
+    :param paths: The paths of the files.
+    :type paths: List[str]
+    :param known: The previous states of the files.
+    :type known: Dict[str, FileState]
+    :return: The modification time, size and hash of every file.
+    :rtype: Dict[str, FileState]
+    """
+    states: Dict[str, FileState] = {}
+    changed: List[str] = []
+    for path in paths:
+        stat: os.stat_result = os.stat(path)
+        previous: Optional[FileState] = known.get(path)
+        if previous and previous[:2] == [stat.st_mtime_ns, stat.st_size]:
+            states[path] = previous
+        else:
+            states[path] = [stat.st_mtime_ns, stat.st_size, ""]
+            changed.append(path)
+    if changed:
+        with ThreadPoolExecutor() as pool:
+            for path, content_hash in zip(changed, pool.map(hash_file, changed)):
+                states[path][2] = content_hash
+        logger.debug(f"Hashed {len(changed)} of {len(paths)} files")
+    return states
+
+
+def hash_file(path: str) -> str:
+    """
+    Returns the hash of the content of a file.
+
+    :param path: The path of the file.
+    :type path: str
+    :return: The hex digest of the content.
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
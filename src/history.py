@@ -0,0 +1,490 @@
+import json
+import logging
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from estimator import Estimator
+from resources import ResourceUsage
+
+HISTORY_WINDOW = 100
+SQLITE_TIMEOUT = 30.0
+USAGE_COLUMNS = (
+    "user_cpu",
+    "sys_cpu",
+    "max_rss",
+    "in_blocks",
+    "out_blocks",
+    "voluntary_switches",
+    "involuntary_switches",
+)
+
+logger = logging.getLogger(__name__)
+
+root: Path = Path(__file__).parent.parent
+
+
+@dataclass
+class HistoryRecord:
+    """
+    A finished run of a command.
+
+    :param timestamp: The time the run finished, in seconds since the epoch.
+    :param duration: The duration of the run in seconds.
+    :param exit_code: The exit code of the command.
+    :param host: The name of the host the command ran on.
+    :param log: The path to the log file of the run.
+    :param usage: The resources used by the run, if known.
+    """
+
+    timestamp: float
+    duration: int
+    exit_code: int = 0
+    host: str = ""
+    log: str = ""
+    usage: Optional[ResourceUsage] = None
+
+
+class History(ABC):
+    """
+    Stores the runs of the commands.
+    """
+
+    def times(self, cmd_id: str, window: int = HISTORY_WINDOW) -> List[int]:
+        """
+        Returns the durations of the last successful runs of a command, oldest first.
+
+        :param cmd_id: The id of the command.
+        :type cmd_id: str
+        :param window: The maximum number of runs to return.
+        :type window: int
+        :return: The durations of the runs in seconds.
+        :rtype: List[int]
+        """
+        return [record.duration for record in self.records(cmd_id, window, True)]
+
+    @abstractmethod
+    def records(
+        self, cmd_id: str, window: int = HISTORY_WINDOW, successful: bool = False
+    ) -> List[HistoryRecord]:
+        """
+        Returns the last runs of a command, oldest first.
+
+        :param cmd_id: The id of the command.
+        :type cmd_id: str
+        :param window: The maximum number of runs to return.
+        :type window: int
+        :param successful: Whether to only return the successful runs.
+        :type successful: bool
+        :return: The runs of the command.
+        :rtype: List[HistoryRecord]
+        """
+
+    def estimator(self, cmd_id: str, window: int = HISTORY_WINDOW) -> Estimator:
+        """
+        Returns the duration statistics of a command.
+
+        :param cmd_id: The id of the command.
+        :type cmd_id: str
+        :param window: The number of previous runs to compute the statistics from when they are not stored.
+        :type window: int
+        :return: The estimator of the duration of the command.
+        :rtype: Estimator
+        """
+        return Estimator.from_times(self.times(cmd_id, window))
+
+    @abstractmethod
+    def add(self, cmd_id: str, record: HistoryRecord) -> None:
+        """
+        Adds a run of a command.
+
+        :param cmd_id: The id of the command.
+        :type cmd_id: str
+        :param record: The run to add.
+        :type record: HistoryRecord
+        """
+
+
+class TextHistory(History):
+    def __init__(self, directory: Optional[Path] = None):
+        """
+        Initializes a TextHistory object storing the durations of the successful runs
+        of each command in build/history/<id>.txt, one per line.
+
+        :param directory: The directory of the history files, build/history by default.
+        :type directory: Optional[Path]
+        """
+        self.directory: Path = directory or root / Path("build/history")
+
+    def records(
+        self, cmd_id: str, window: int = HISTORY_WINDOW, successful: bool = False
+    ) -> List[HistoryRecord]:
+        times: List[int] = get_history_times(self.directory / f"{cmd_id}.txt", window)
+        return [HistoryRecord(0, duration) for duration in times]
+
+    def add(self, cmd_id: str, record: HistoryRecord) -> None:
+        if record.exit_code == 0:
+            add_history_time(self.directory / f"{cmd_id}.txt", record.duration)
+
+
+class SqliteHistory(History):
+    def __init__(
+        self, path: Optional[Path] = None, text_directory: Optional[Path] = None
+    ):
+        """
+        Initializes a SqliteHistory object storing the runs in a SQLite database in WAL
+        mode, so that concurrent runs can read and write it safely.
+
+        The text history files of a command are imported the first time it is used.
+
+        :param path: The path to the database, build/history/history.db by default.
+        :type path: Optional[Path]
+        :param text_directory: The directory of the text history files to import, build/history by default.
+        :type text_directory: Optional[Path]
+        """
+        self.path: Path = path or root / Path("build/history/history.db")
+        self.text_directory: Path = text_directory or self.path.parent
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.connect(autocommit=True) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "id INTEGER PRIMARY KEY, command TEXT NOT NULL, timestamp REAL NOT NULL, "
+                "duration INTEGER NOT NULL, exit_code INTEGER NOT NULL, "
+                "host TEXT NOT NULL, log TEXT NOT NULL)"
+            )
+            columns: List[str] = [
+                row[1] for row in connection.execute("PRAGMA table_info(runs)")
+            ]
+            for column in USAGE_COLUMNS:
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE runs ADD COLUMN {column} REAL")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS runs_command ON runs (command, id)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS runs_exit_code ON runs (command, exit_code, id)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS imported (command TEXT PRIMARY KEY)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS estimates "
+                "(command TEXT PRIMARY KEY, state TEXT NOT NULL)"
+            )
+            connection.execute("COMMIT")
+        self.imported: Set[str] = set()
+
+    @contextmanager
+    def connect(self, autocommit: bool = False) -> Iterator[sqlite3.Connection]:
+        """
+        Opens a connection to the database, committing on success and closing it on exit.
+
+        :param autocommit: Whether transactions are managed by the caller.
+        :type autocommit: bool
+        :return: A connection to the database.
+        :rtype: Iterator[sqlite3.Connection]
+        """
+        connection: sqlite3.Connection = sqlite3.connect(
+            self.path, timeout=SQLITE_TIMEOUT
+        )
+        if autocommit:
+            connection.isolation_level = None
+        try:
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def records(
+        self, cmd_id: str, window: int = HISTORY_WINDOW, successful: bool = False
+    ) -> List[HistoryRecord]:
+        self.import_text(cmd_id)
+        with self.connect() as connection:
+            return select_records(connection, cmd_id, window, successful)
+
+    def estimator(self, cmd_id: str, window: int = HISTORY_WINDOW) -> Estimator:
+        """
+        Returns the duration statistics of the last successful runs of a command.
+
+        The statistics are stored with the window and the last run they cover, and
+        updated with every successful run, so that loading them does not read the runs
+        unless the window changed.
+
+        :param cmd_id: The id of the command.
+        :type cmd_id: str
+        :param window: The number of previous runs to compute the statistics from.
+        :type window: int
+        :return: The estimator of the duration of the command.
+        :rtype: Estimator
+        """
+        self.import_text(cmd_id)
+        with self.connect() as connection:
+            state: Optional[Dict[str, Any]] = select_estimate(connection, cmd_id)
+            if (
+                state is not None
+                and state.get("window") == window
+                and state.get("last_id") == select_last_id(connection, cmd_id)
+            ):
+                return Estimator(state["estimator"])
+            return update_estimate(connection, cmd_id, window)
+
+    def add(self, cmd_id: str, record: HistoryRecord) -> None:
+        """
+        Adds a run of a command and updates its duration statistics in the same
+        transaction.
+
+        :param cmd_id: The id of the command.
+        :type cmd_id: str
+        :param record: The run to add.
+        :type record: HistoryRecord
+        """
+        self.import_text(cmd_id)
+        with self.connect(autocommit=True) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT INTO runs (command, timestamp, duration, exit_code, host, log, "
+                f"{', '.join(USAGE_COLUMNS)}) VALUES ({', '.join('?' * 13)})",
+                (
+                    cmd_id,
+                    record.timestamp,
+                    record.duration,
+                    record.exit_code,
+                    record.host,
+                    record.log,
+                    *get_usage_values(record.usage),
+                ),
+            )
+            if record.exit_code == 0:
+                state: Optional[Dict[str, Any]] = select_estimate(connection, cmd_id)
+                window: int = (state or {}).get("window", HISTORY_WINDOW)
+                update_estimate(connection, cmd_id, window)
+            connection.execute("COMMIT")
+
+    def import_text(self, cmd_id: str) -> None:
+        """
+        Imports the text history file of a command, once.
+
+        :param cmd_id: The id of the command.
+        :type cmd_id: str
+        """
+        if cmd_id in self.imported:
+            return
+        self.imported.add(cmd_id)
+        text_file: Path = self.text_directory / f"{cmd_id}.txt"
+        with self.connect(autocommit=True) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            inserted: int = connection.execute(
+                "INSERT OR IGNORE INTO imported (command) VALUES (?)", (cmd_id,)
+            ).rowcount
+            if inserted and text_file.is_file():
+                timestamp: float = text_file.stat().st_mtime
+                times: List[int] = get_history_times(text_file)
+                connection.executemany(
+                    "INSERT INTO runs (command, timestamp, duration, exit_code, host, log) "
+                    "VALUES (?, ?, ?, 0, '', '')",
+                    [(cmd_id, timestamp, duration) for duration in times],
+                )
+                logger.debug(f"Imported {len(times)} runs from {text_file}")
+            connection.execute("COMMIT")
+
+
+def select_records(
+    connection: sqlite3.Connection, cmd_id: str, window: int, successful: bool
+) -> List[HistoryRecord]:
+    """
+    Returns the last runs of a command stored in the database, oldest first.
+
+    :param connection: A connection to the database.
+    :type connection: sqlite3.Connection
+    :param cmd_id: The id of the command.
+    :type cmd_id: str
+    :param window: The maximum number of runs to return.
+    :type window: int
+    :param successful: Whether to only return the successful runs.
+    :type successful: bool
+    :return: The runs of the command.
+    :rtype: List[HistoryRecord]
+    """
+    condition: str = "command = ? AND exit_code = 0" if successful else "command = ?"
+    query: str = (
+        f"SELECT timestamp, duration, exit_code, host, log, {', '.join(USAGE_COLUMNS)} "
+        f"FROM runs WHERE {condition} ORDER BY id DESC LIMIT ?"
+    )
+    rows: List[Tuple[Any, ...]] = connection.execute(query, (cmd_id, window)).fetchall()
+    return [
+        HistoryRecord(row[0], row[1], row[2], row[3], row[4], get_usage(row[5:]))
+        for row in reversed(rows)
+    ]
+
+
+def get_usage_values(usage: Optional[ResourceUsage]) -> Tuple[Any, ...]:
+    """
+    Returns the values of the resource usage columns of a run.
+
+    :param usage: The resources used by the run, if known.
+    :type usage: Optional[ResourceUsage]
+    :return: The values of the usage columns, None if unknown.
+    :rtype: Tuple[Any, ...]
+    """
+    if usage is None:
+        return (None,) * len(USAGE_COLUMNS)
+    return tuple(getattr(usage, column) for column in USAGE_COLUMNS)
+
+
+def get_usage(values: Tuple[Any, ...]) -> Optional[ResourceUsage]:
+    """
+    Returns the resource usage stored in the usage columns of a run.
+
+    :param values: The values of the usage columns.
+    :type values: Tuple[Any, ...]
+    :return: The resources used by the run, or None if they were not recorded.
+    :rtype: Optional[ResourceUsage]
+    """
+    if values[0] is None:
+        return None
+    user_cpu, sys_cpu, *counters = values
+    return ResourceUsage(user_cpu, sys_cpu, *(int(value) for value in counters))
+
+
+def select_estimate(
+    connection: sqlite3.Connection, cmd_id: str
+) -> Optional[Dict[str, Any]]:
+    """
+    Returns the stored duration statistics of a command.
+
+    :param connection: A connection to the database.
+    :type connection: sqlite3.Connection
+    :param cmd_id: The id of the command.
+    :type cmd_id: str
+    :return: The state of the estimator, or None if it is not stored yet.
+    :rtype: Optional[Dict[str, Any]]
+    """
+    row: Optional[Tuple[str]] = connection.execute(
+        "SELECT state FROM estimates WHERE command = ?", (cmd_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    state: Dict[str, Any] = json.loads(row[0])
+    return state
+
+
+def select_last_id(connection: sqlite3.Connection, cmd_id: str) -> Optional[int]:
+    """
+    Returns the id of the last successful run of a command stored in the database.
+
+    :param connection: A connection to the database.
+    :type connection: sqlite3.Connection
+    :param cmd_id: The id of the command.
+    :type cmd_id: str
+    :return: The id of the run, None if the command never succeeded.
+    :rtype: Optional[int]
+    """
+    row: Tuple[Optional[int]] = connection.execute(
+        "SELECT MAX(id) FROM runs WHERE command = ? AND exit_code = 0", (cmd_id,)
+    ).fetchone()
+    return row[0]
+
+
+def update_estimate(
+    connection: sqlite3.Connection, cmd_id: str, window: int
+) -> Estimator:
+    """
+    Computes the duration statistics of the last successful runs of a command, and
+    stores them with the window and the last run they cover.
+
+    The runs leaving the window are forgotten, which the constant time updates of the
+    estimator cannot do, so it is fed again with the runs of the window.
+
+    :param connection: A connection to the database.
+    :type connection: sqlite3.Connection
+    :param cmd_id: The id of the command.
+    :type cmd_id: str
+    :param window: The number of previous runs to compute the statistics from.
+    :type window: int
+    :return: The estimator of the duration of the command.
+    :rtype: Estimator
+    """
+    runs: List[HistoryRecord] = select_records(connection, cmd_id, window, True)
+    estimator: Estimator = Estimator.from_times([run.duration for run in runs])
+    state: Dict[str, Any] = {
+        "window": window,
+        "last_id": select_last_id(connection, cmd_id),
+        "estimator": estimator.state(),
+    }
+    connection.execute(
+        "INSERT OR REPLACE INTO estimates (command, state) VALUES (?, ?)",
+        (cmd_id, json.dumps(state)),
+    )
+    return estimator
+
+
+def open_history(backend: str) -> History:
+    """
+    Returns the history stored with the given backend.
+
+    :param backend: The name of the backend, either 'sqlite' or 'text'.
+    :type backend: str
+    :return: The history.
+    :rtype: History
+    :raises ValueError: If the backend is unknown.
+    """
+    if backend == "sqlite":
+        return SqliteHistory()
+    if backend == "text":
+        return TextHistory()
+    raise ValueError(f"Unknown history backend '{backend}'")
+
+
+def get_history(path: Path) -> Path:
+    """
+    Returns a Path object representing the history file at the given path.
+
+    :param path: The path to the history file.
+    :type path: Path
+    :return: A Path object representing the history file at the given path.
+    :rtype: Path
+    """
+    history = Path(path)
+    history.parent.mkdir(parents=True, exist_ok=True)
+    history.touch()
+    return history
+
+
+def get_history_times(path: Path, window: Optional[int] = None) -> List[int]:
+    """
+    Returns a list of integers representing the history times stored in the history file at the given path.
+
+    :param path: The path to the history file.
+    :type path: Path
+    :param window: The maximum number of times to return, the most recent ones. All times by default.
+    :type window: Optional[int]
+    :return: A list of integers representing the history times stored in the history file at the given path.
+    :rtype: List[int]
+    """
+    history: Path = get_history(path)
+    with open(history, "r") as f:
+        numbers: Deque[int] = deque(
+            (int(line.strip()) for line in f if line.strip()), maxlen=window
+        )
+        return list(numbers)
+
+
+def add_history_time(path: Path, total_time: int) -> None:
+    """
+    Adds the given total time to the history file at the given path.
+
+    :param path: The path to the history file.
+    :type path: Path
+    :param total_time: The total time to add to the history file.
+    :type total_time: int
+    """
+    history: Path = get_history(path)
+    with history.open("a") as f:
+        f.write(f"{total_time}\n")
@@ -0,0 +1,248 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, BinaryIO, Deque, List, Optional, Tuple
+
+PUMP_CHUNK_SIZE = 64 * 1024
+DRAIN_TIMEOUT = 5.0
+TAIL_LINES = 1000
+TAIL_BYTES = 1024 * 1024
+MAX_LINE_BYTES = 64 * 1024
+
+if TYPE_CHECKING:
+    import asyncio
+
+logger = logging.getLogger(__name__)
+
+
+class LogPump:
+    def __init__(
+        self,
+        fd: int,
+        writer: BinaryIO,
+        collect: bool = False,
+        tail_lines: int = TAIL_LINES,
+        tail_bytes: int = TAIL_BYTES,
+    ):
+        """
+        Initializes a LogPump object copying the output of a command from a pipe to its
+        log, compressing it if needed.
+
+        The pump runs on a thread with start(), or on the running event loop with
+        attach(). The last lines copied are kept in memory so that a failure can be
+        reported without reading the log back, and the lines copied can be collected
+        for the monitors of the output. Lines longer than 64 KB are split.
+
+        :param fd: The read end of the pipe the command writes its output to.
+        :type fd: int
+        :param writer: The log file to write the output to, closed with the pump.
+        :type writer: BinaryIO
+        :param collect: Whether to keep the lines copied until read_lines is called.
+        :type collect: bool
+        :param tail_lines: The maximum number of last lines kept in memory.
+        :type tail_lines: int
+        :param tail_bytes: The maximum size of the last lines kept in memory.
+        :type tail_bytes: int
+        """
+        self.fd: int = fd
+        self.writer: BinaryIO = writer
+        self.collect: bool = collect
+        self.lock: threading.Lock = threading.Lock()
+        self.lines: List[bytes] = []
+        self.partial: bytes = b""
+        # Blocks of complete lines and their number of lines, split in lines on demand
+        self.tail: Deque[Tuple[bytes, int]] = deque()
+        self.tail_count: int = 0
+        self.tail_size: int = 0
+        self.tail_lines_max: int = tail_lines
+        self.tail_bytes: int = tail_bytes
+        self.last_output: float = time.monotonic()
+        self.eof: threading.Event = threading.Event()
+        self.loop: Optional["asyncio.AbstractEventLoop"] = None
+        self.drained: Optional["asyncio.Event"] = None
+
+    def start(self) -> None:
+        """
+        Copies the output on a thread until the end of the output.
+        """
+        threading.Thread(target=self.pump_blocking, daemon=True).start()
+
+    def pump_blocking(self) -> None:
+        """
+        Copies the output until the end of the output or until the pump is closed,
+        blocking on the pipe.
+        """
+        try:
+            while self.pump():
+                pass
+        finally:
+            os.close(self.fd)
+
+    def attach(self) -> None:
+        """
+        Copies the output on the running event loop whenever the pipe is readable.
+        """
+        import asyncio
+
+        self.loop = asyncio.get_running_loop()
+        self.drained = asyncio.Event()
+        os.set_blocking(self.fd, False)
+        self.loop.add_reader(self.fd, self.on_readable)
+
+    def on_readable(self) -> None:
+        """
+        Copies the output available in the pipe, called by the event loop.
+        """
+        try:
+            if self.pump():
+                return
+        except BlockingIOError:
+            return
+        if self.loop and self.drained:
+            self.loop.remove_reader(self.fd)
+            self.drained.set()
+
+    def pump(self) -> bool:
+        """
+        Copies one chunk of output.
+
+        :return: Whether the end of the output was not reached and the pump is not closed.
+        :rtype: bool
+        """
+        chunk: bytes = os.read(self.fd, PUMP_CHUNK_SIZE)
+        with self.lock:
+            if self.writer.closed:
+                return False
+            if not chunk:
+                self.eof.set()
+                return False
+            self.writer.write(chunk)
+            self.last_output = time.monotonic()
+            data: bytes = self.partial + chunk
+            end: int = data.rfind(b"\n") + 1
+            block: bytes = data[:end]
+            self.partial = data[end:]
+            if len(self.partial) > MAX_LINE_BYTES:
+                block += self.partial + b"\n"
+                self.partial = b""
+            if block:
+                self.keep_tail(block)
+                if self.collect:
+                    self.lines += block.split(b"\n")[:-1]
+        return True
+
+    def keep_tail(self, block: bytes) -> None:
+        """
+        Adds lines to the last lines kept in memory, dropping the oldest blocks of lines
+        once the newer ones are enough to fill the limits.
+
+        The lines are kept as the blocks they were read in, so that chatty commands do not
+        cost a Python operation per line.
+
+        :param block: The new complete lines, each followed by a line feed.
+        :type block: bytes
+        """
+        count: int = block.count(b"\n")
+        self.tail.append((block, count))
+        self.tail_count += count
+        self.tail_size += len(block) - count
+        while len(self.tail) > 1:
+            oldest, oldest_count = self.tail[0]
+            if (
+                self.tail_count - oldest_count < self.tail_lines_max
+                and self.tail_size - (len(oldest) - oldest_count) <= self.tail_bytes
+            ):
+                break
+            self.tail.popleft()
+            self.tail_count -= oldest_count
+            self.tail_size -= len(oldest) - oldest_count
+
+    def wait(self, timeout: float = DRAIN_TIMEOUT) -> bool:
+        """
+        Waits until the end of the output, which may come after the command exited when
+        it left processes writing to the pipe.
+
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :return: Whether the end of the output was reached.
+        :rtype: bool
+        """
+        if not self.eof.wait(timeout):
+            logger.debug("Output still open after the command exited, stop copying")
+            return False
+        return True
+
+    async def wait_async(self, timeout: float = DRAIN_TIMEOUT) -> bool:
+        """
+        Waits on the running event loop until the end of the output.
+
+        :param timeout: The maximum number of seconds to wait.
+        :type timeout: float
+        :return: Whether the end of the output was reached.
+        :rtype: bool
+        """
+        import asyncio
+
+        if self.drained is None:
+            waited: bool = await asyncio.to_thread(self.wait, timeout)
+            return waited
+        try:
+            await asyncio.wait_for(self.drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.debug("Output still open after the command exited, stop copying")
+            return False
+        return True
+
+    def read_lines(self, final: bool = False) -> List[str]:
+        """
+        Returns the complete lines copied since the previous call.
+
+        :param final: Whether the output is done and an unterminated last line should be returned too.
+        :type final: bool
+        :return: The new lines without line endings.
+        :rtype: List[str]
+        """
+        with self.lock:
+            lines: List[bytes] = self.lines
+            self.lines = []
+            if final and self.partial:
+                lines.append(self.partial)
+                self.partial = b""
+        return [line.decode(errors="replace").rstrip() for line in lines]
+
+    def tail_lines(self) -> List[str]:
+        """
+        Returns the last lines of the output kept in memory.
+
+        :return: The last lines, including an unterminated last line, without line endings.
+        :rtype: List[str]
+        """
+        with self.lock:
+            blocks: List[bytes] = [block for block, _ in self.tail]
+            partial: bytes = self.partial
+        lines: List[bytes] = b"".join(blocks).split(b"\n")[:-1]
+        start: int = max(0, len(lines) - self.tail_lines_max)
+        size: int = sum(len(line) for line in lines[start:])
+        while size > self.tail_bytes and start < len(lines) - 1:
+            size -= len(lines[start])
+            start += 1
+        lines = lines[start:]
+        if partial:
+            lines.append(partial)
+        return [line.decode(errors="replace").rstrip() for line in lines]
+
+    def close(self) -> None:
+        """
+        Stops copying and closes the log file. The pipe is closed by the thread copying
+        the output, or right away on the event loop.
+        """
+        with self.lock:
+            if self.writer.closed:
+                return
+            self.writer.close()
+        if self.loop and self.drained:
+            if not self.drained.is_set():
+                self.loop.remove_reader(self.fd)
+            os.close(self.fd)
@@ -0,0 +1,195 @@
+import gzip
+import io
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, List, Optional, Tuple, cast
+
+NONE = "none"
+GZIP = "gzip"
+ZSTD = "zstd"
+COMPRESSIONS = [NONE, GZIP, ZSTD]
+SUFFIXES = {NONE: ".txt", GZIP: ".txt.gz", ZSTD: ".txt.zst"}
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+LOG_NAME = re.compile(
+    r"(?P<id>[\w-]+)_\d\d-\d\d-\d\d_(?P<day>\d\d-\d\d-\d{4})\.txt(\.gz|\.zst)?"
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_suffix(compression: str) -> str:
+    """
+    Returns the suffix of the log files written with a compression.
+
+    :param compression: One of none, gzip and zstd.
+    :type compression: str
+    :return: The suffix of the log files.
+    :rtype: str
+    :raises ValueError: If the compression is unknown.
+    """
+    if compression not in SUFFIXES:
+        raise ValueError(f"Compression must be one of {', '.join(COMPRESSIONS)}")
+    return SUFFIXES[compression]
+
+
+def get_compression(log_file_path: str) -> str:
+    """
+    Returns the compression of a log file, from its name.
+
+    :param log_file_path: The path to the log file.
+    :type log_file_path: str
+    :return: One of none, gzip and zstd.
+    :rtype: str
+    """
+    if log_file_path.endswith(".gz"):
+        return GZIP
+    if log_file_path.endswith(".zst"):
+        return ZSTD
+    return NONE
+
+
+def open_log_writer(log_file_path: str) -> BinaryIO:
+    """
+    Opens a log file for writing, compressing the data written as it goes if the name of
+    the file ends with .gz or .zst.
+
+    :param log_file_path: The path to the log file.
+    :type log_file_path: str
+    :return: The file to write the output to.
+    :rtype: BinaryIO
+    :raises ValueError: If zstd is requested but the zstandard package is not installed.
+    """
+    compression: str = get_compression(log_file_path)
+    if compression == GZIP:
+        return cast(BinaryIO, gzip.open(log_file_path, "wb", compresslevel=GZIP_LEVEL))
+    if compression == ZSTD:
+        writer: BinaryIO = (
+            get_zstandard()
+            .ZstdCompressor(level=ZSTD_LEVEL)
+            .stream_writer(open(log_file_path, "wb"), closefd=True)
+        )
+        return writer
+    return open(log_file_path, "wb")
+
+
+def open_log_reader(log_file_path: str) -> BinaryIO:
+    """
+    Opens a log file for reading, decompressing it as a stream if needed.
+
+    :param log_file_path: The path to the log file.
+    :type log_file_path: str
+    :return: The file to read the output from.
+    :rtype: BinaryIO
+    :raises ValueError: If the file is compressed with zstd but the zstandard package is not installed.
+    """
+    compression: str = get_compression(log_file_path)
+    if compression == GZIP:
+        return cast(BinaryIO, gzip.open(log_file_path, "rb"))
+    if compression == ZSTD:
+        reader: BinaryIO = (
+            get_zstandard()
+            .ZstdDecompressor()
+            .stream_reader(open(log_file_path, "rb"), closefd=True)
+        )
+        return reader
+    return open(log_file_path, "rb")
+
+
+def iter_log_lines(log_file_path: str) -> Iterator[str]:
+    """
+    Yields the lines of a log file, compressed or not, one at a time.
+
+    :param log_file_path: The path to the log file to read.
+    :type log_file_path: str
+    :return: An iterator over the log lines.
+    :rtype: Iterator[str]
+    """
+    with open_log_reader(log_file_path) as f:
+        for line in io.TextIOWrapper(f, errors="replace"):
+            yield line.rstrip()
+
+
+def get_zstandard() -> Any:
+    """
+    Returns the zstandard module, which is an optional dependency.
+
+    :return: The zstandard module.
+    :rtype: module
+    :raises ValueError: If the zstandard package is not installed.
+    """
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError("zstd compression needs the zstandard package")
+    return zstandard
+
+
+def prune_logs(
+    log_dir: Path,
+    cmd_id: str,
+    keep: int = 0,
+    max_bytes: int = 0,
+    current: Optional[Path] = None,
+) -> None:
+    """
+    Deletes the oldest log files, keeping the last logs of a command and bounding the size
+    of the log directory.
+
+    :param log_dir: The directory of the log files.
+    :type log_dir: Path
+    :param cmd_id: The id of the command that just ran.
+    :type cmd_id: str
+    :param keep: The number of logs kept per command, 0 for no limit.
+    :type keep: int
+    :param max_bytes: The maximum total size of the log files, 0 for no limit.
+    :type max_bytes: int
+    :param current: The log of the run that just finished, never deleted.
+    :type current: Optional[Path]
+    """
+    if not keep and not max_bytes:
+        return
+    logs: List[Tuple[float, int, Path, str]] = []
+    for entry in os.scandir(log_dir):
+        match: Optional[re.Match[str]] = LOG_NAME.fullmatch(entry.name)
+        if match and entry.is_file():
+            stat: os.stat_result = entry.stat()
+            logs.append(
+                (stat.st_mtime, stat.st_size, Path(entry.path), match.group("id"))
+            )
+    logs.sort(reverse=True)
+
+    kept: List[Tuple[float, int, Path, str]] = []
+    count: int = 0
+    for log in logs:
+        if log[3] == cmd_id:
+            count += 1
+            if keep and count > keep and log[2] != current:
+                delete_log(log[2])
+                continue
+        kept.append(log)
+    total: int = sum(log[1] for log in kept)
+    for log in reversed(kept):
+        if not max_bytes or total <= max_bytes:
+            break
+        if log[2] != current:
+            delete_log(log[2])
+            total -= log[1]
+
+
+def delete_log(log_file_path: Path) -> None:
+    """
+    Deletes a log file, ignoring the files already deleted by a concurrent run.
+
+    :param log_file_path: The path to the log file.
+    :type log_file_path: Path
+    """
+    try:
+        log_file_path.unlink()
+        logger.debug(f"Deleted old log {log_file_path}")
+    except FileNotFoundError:
+        pass
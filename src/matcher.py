@@ -0,0 +1,136 @@
+import logging
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+NO_MATCH = -1
+NESTED_LOOP_MAX_ERRORS = 32
+
+
+class TriageMatcher:
+    def __init__(self, triages: Dict[str, str]):
+        """
+        Initializes a TriageMatcher object, compiling the triage errors into an
+        Aho-Corasick automaton so that each log line is scanned once whatever the
+        number of errors. A handful of errors is still checked one by one, which is
+        faster than walking the automaton in Python.
+
+        :param triages: A dictionary of error resolutions where the key is the error and the value is the resolution.
+        :type triages: Dict[str, str]
+        """
+        self.errors: List[str] = list(triages)
+        self.resolutions: List[str] = list(triages.values())
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.first: List[int] = [NO_MATCH]
+        for index, error in enumerate(self.errors):
+            self.add_error(index, error)
+        self.link()
+        logger.debug(
+            f"Compiled {len(self.errors)} triage errors into {len(self.goto)} states"
+        )
+
+    def add_error(self, index: int, error: str) -> None:
+        """
+        Adds an error to the trie of the automaton.
+
+        :param index: The position of the error in the triage file.
+        :type index: int
+        :param error: The error string.
+        :type error: str
+        """
+        state: int = 0
+        for char in error:
+            next_state: Optional[int] = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.first.append(NO_MATCH)
+            state = next_state
+        if self.first[state] == NO_MATCH:
+            self.first[state] = index
+
+    def link(self) -> None:
+        """
+        Computes the failure links of the automaton in breadth-first order, so that every
+        state knows the first error ending at it or at any of its suffixes.
+        """
+        queue: Deque[int] = deque(self.goto[0].values())
+        while queue:
+            state: int = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback: int = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                link: int = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = link if link != next_state else 0
+                self.first[next_state] = first_index(
+                    self.first[next_state], self.first[self.fail[next_state]]
+                )
+
+    def match(self, line: str) -> int:
+        """
+        Returns the position in the triage file of the first error contained in the line.
+
+        :param line: The log line to scan.
+        :type line: str
+        :return: The index of the first matching error, or -1 if no error matches.
+        :rtype: int
+        """
+        if len(self.errors) <= NESTED_LOOP_MAX_ERRORS:
+            for index, error in enumerate(self.errors):
+                if error in line:
+                    return index
+            return NO_MATCH
+        first: List[int] = self.first
+        goto: List[Dict[str, int]] = self.goto
+        fail: List[int] = self.fail
+        best: int = first[0]
+        state: int = 0
+        for char in line:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            found: int = first[state]
+            if found != NO_MATCH and (best == NO_MATCH or found < best):
+                if found == 0:
+                    return 0
+                best = found
+        return best
+
+    def find_error(self, logs: Iterable[str]) -> Optional[Tuple[str, str]]:
+        """
+        Returns the first log line containing a known error together with its resolution.
+
+        :param logs: The log lines to search for errors.
+        :type logs: Iterable[str]
+        :return: The matching line and its resolution, or None if no known error is found.
+        :rtype: Optional[Tuple[str, str]]
+        """
+        for line in logs:
+            index: int = self.match(line)
+            if index != NO_MATCH:
+                return line.strip(), self.resolutions[index]
+        return None
+
+
+def first_index(index: int, other: int) -> int:
+    """
+    Returns the smaller of two error indexes, ignoring missing ones.
+
+    :param index: An error index or -1.
+    :type index: int
+    :param other: Another error index or -1.
+    :type other: int
+    :return: The smallest valid index, or -1 if both are missing.
+    :rtype: int
+    """
+    if index == NO_MATCH:
+        return other
+    if other == NO_MATCH:
+        return index
+    return min(index, other)
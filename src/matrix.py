@@ -0,0 +1,159 @@
+import itertools
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+from command import COMMAND_DEPENDS_ON, COMMAND_ID, COMMAND_INPUTS, COMMAND_NAME
+from command import COMMAND_OUTPUTS, COMMAND_VALUES, Command, get_cmd_depends_on
+
+COMMAND_MATRIX = "matrix"
+COMMAND_MAX_PARALLEL = "max_parallel"
+
+# The placeholders replaced by the values of the instance, e.g. {shard}
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+ID_INVALID_CHARS = re.compile(r"[^\w-]")
+
+
+def load_commands(entries: List[Dict[str, Any]]) -> List[Command]:
+    """
+    Creates the commands of a configuration, expanding every command with a matrix into
+    one command per combination of the values of the matrix.
+
+    A dependency on a command with a matrix is a dependency on all of its instances.
+
+    :param entries: The commands of the configuration.
+    :type entries: List[Dict[str, Any]]
+    :return: The commands, the instances of a matrix taking its place in configuration order.
+    :rtype: List[Command]
+    :raises ValueError: If a matrix is invalid.
+    """
+    expanded: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]] = [
+        (entry, expand_matrix(entry)) for entry in entries
+    ]
+    instance_ids: Dict[str, List[str]] = {
+        entry[COMMAND_ID]: [instance[COMMAND_ID] for instance in instances]
+        for entry, instances in expanded
+        if COMMAND_MATRIX in entry
+    }
+    commands: List[Command] = []
+    for entry, instances in expanded:
+        for instance in instances:
+            depends_on: List[str] = [
+                dependency
+                for name in get_cmd_depends_on(instance)
+                for dependency in instance_ids.get(name, [name])
+            ]
+            command: Command = Command({**instance, COMMAND_DEPENDS_ON: depends_on})
+            if COMMAND_MATRIX in entry:
+                command.matrix = entry[COMMAND_ID]
+                command.max_parallel = get_max_parallel(entry)
+            commands.append(command)
+    return commands
+
+
+def expand_matrix(entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Returns the instances of a command, one per combination of the values of its matrix.
+
+    The id of every instance is the id of the command followed by its values, so that
+    each instance has its own history and logs. The {key} placeholders of its name,
+    values, inputs and outputs are replaced by the values of the instance, and the
+    values are appended to the name if it has no placeholder.
+
+    :param entry: The command, optionally containing a matrix mapping keys to lists of values, a number n standing for 0 to n-1.
+    :type entry: Dict[str, Any]
+    :return: The command itself if it has no matrix, else its instances.
+    :rtype: List[Dict[str, Any]]
+    :raises ValueError: If the matrix is invalid.
+    """
+    if COMMAND_MATRIX not in entry:
+        return [entry]
+    matrix: Dict[str, List[str]] = get_matrix(entry)
+    instances: List[Dict[str, Any]] = []
+    for combination in itertools.product(*matrix.values()):
+        values: Dict[str, str] = dict(zip(matrix, combination))
+        instance: Dict[str, Any] = {
+            key: value
+            for key, value in entry.items()
+            if key not in (COMMAND_MATRIX, COMMAND_MAX_PARALLEL)
+        }
+        suffix: str = "-".join(
+            ID_INVALID_CHARS.sub("_", value) for value in combination
+        )
+        instance[COMMAND_ID] = f"{entry[COMMAND_ID]}-{suffix}"
+        name: str = substitute(str(entry[COMMAND_NAME]), values)
+        if name == entry[COMMAND_NAME]:
+            name += " (" + ", ".join(f"{k}={v}" for k, v in values.items()) + ")"
+        instance[COMMAND_NAME] = name
+        for key in (COMMAND_VALUES, COMMAND_INPUTS, COMMAND_OUTPUTS):
+            if isinstance(entry.get(key), list):
+                instance[key] = [substitute(str(item), values) for item in entry[key]]
+            elif isinstance(entry.get(key), str):
+                instance[key] = substitute(entry[key], values)
+        instances.append(instance)
+    return instances
+
+
+def get_matrix(entry: Dict[str, Any]) -> Dict[str, List[str]]:
+    """
+    Returns the values of every key of the matrix of a command.
+
+    :param entry: The command containing the matrix.
+    :type entry: Dict[str, Any]
+    :return: The values of every key, as strings.
+    :rtype: Dict[str, List[str]]
+    :raises ValueError: If the matrix is not a mapping of names to non-empty lists of values or numbers.
+    """
+    matrix: Any = entry[COMMAND_MATRIX]
+    if not isinstance(matrix, dict) or not matrix:
+        raise ValueError(f"{COMMAND_MATRIX} must map names to lists of values")
+    values: Dict[str, List[str]] = {}
+    for key, items in matrix.items():
+        if not isinstance(key, str) or not key.isidentifier():
+            raise ValueError(f"{COMMAND_MATRIX} key {key!r} must be a name")
+        if isinstance(items, int) and not isinstance(items, bool) and items > 0:
+            items = list(range(items))
+        if (
+            not isinstance(items, list)
+            or not items
+            or not all(isinstance(item, (str, int, float)) for item in items)
+        ):
+            raise ValueError(
+                f"{COMMAND_MATRIX} '{key}' must be a non-empty list of values or a number"
+            )
+        values[key] = [str(item) for item in items]
+    return values
+
+
+def get_max_parallel(entry: Dict[str, Any]) -> int:
+    """
+    Returns the maximum number of instances of a matrix running at the same time.
+
+    :param entry: The command containing the matrix.
+    :type entry: Dict[str, Any]
+    :return: The maximum number of instances, the number of CPUs by default.
+    :rtype: int
+    :raises ValueError: If the maximum is not a positive integer.
+    """
+    max_parallel: Any = entry.get(COMMAND_MAX_PARALLEL, os.cpu_count() or 1)
+    if (
+        isinstance(max_parallel, bool)
+        or not isinstance(max_parallel, int)
+        or max_parallel < 1
+    ):
+        raise ValueError(f"{COMMAND_MAX_PARALLEL} must be a positive integer")
+    return max_parallel
+
+
+def substitute(text: str, values: Dict[str, str]) -> str:
+    """
+    Replaces the {key} placeholders of a text by the values of a matrix instance.
+
+    :param text: The text.
+    :type text: str
+    :param values: The value of every key of the matrix.
+    :type values: Dict[str, str]
+    :return: The text with the placeholders of the matrix keys replaced, the other ones left as is.
+    :rtype: str
+    """
+    return PLACEHOLDER.sub(lambda match: values.get(match[1], match[0]), text)
@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from atomic_file import write_atomically
+from history import History, HistoryRecord
+from log_store import iter_log_lines
+
+MILESTONE_MARKERS = 200
+CANDIDATE_LIMIT = 4 * MILESTONE_MARKERS
+BOOTSTRAP_LOGS = 3
+LINES_WINDOW = 10
+MAX_FRACTION = 0.99
+DUPLICATE = -1
+
+VARIABLE_PARTS = re.compile(r"\b[0-9a-f]{7,}\b|\d+")
+
+logger = logging.getLogger(__name__)
+
+root: Path = Path(__file__).parent.parent
+
+
+class MilestoneIndex:
+    def __init__(self, path: Path):
+        """
+        Initializes a MilestoneIndex object describing how the output of a command
+        progresses: its usual number of lines and the relative position of marker lines
+        found in every successful run.
+
+        :param path: The path to the JSON file storing the index, a missing or unreadable file giving an empty index.
+        :type path: Path
+        """
+        self.path: Path = path
+        self.runs: int = 0
+        self.lines: float = 0
+        self.markers: Dict[str, Dict[str, float]] = {}
+        if not path.is_file():
+            return
+        try:
+            with open(path, "r") as f:
+                data: Dict[str, Any] = json.load(f)
+            runs: int = data["runs"]
+            lines: float = data["lines"]
+            markers: Dict[str, Dict[str, float]] = data["markers"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug(f"Ignoring unreadable milestone index {path}: {e}")
+            return
+        self.runs, self.lines, self.markers = runs, lines, markers
+
+    def tracker(self) -> "MilestoneTracker":
+        """
+        Returns a tracker following the output of a new run against this index.
+
+        :return: The tracker of the new run.
+        :rtype: MilestoneTracker
+        """
+        return MilestoneTracker(self)
+
+    def update(self, tracker: "MilestoneTracker") -> None:
+        """
+        Updates the index with the output of a successful run.
+
+        :param tracker: The tracker that followed the whole output of the run.
+        :type tracker: MilestoneTracker
+        """
+        total: int = tracker.lines
+        if not total:
+            return
+        self.runs += 1
+        self.lines += (total - self.lines) / min(self.runs, LINES_WINDOW)
+
+        for key, marker in list(self.markers.items()):
+            position: Optional[int] = tracker.positions.get(key)
+            if position:
+                marker["offset"] += (position / total - marker["offset"]) / (
+                    marker["seen"] + 1
+                )
+                marker["seen"] += 1
+            else:
+                marker["missed"] += 1
+                if marker["missed"] > marker["seen"]:
+                    del self.markers[key]
+
+        candidates: List[Tuple[str, int]] = [
+            (key, position)
+            for key, position in tracker.candidates.items()
+            if position != DUPLICATE and key not in self.markers
+        ]
+        slots: int = min(MILESTONE_MARKERS - len(self.markers), len(candidates))
+        for i in range(slots):
+            key, position = candidates[i * len(candidates) // slots]
+            self.markers[key] = {"offset": position / total, "seen": 1, "missed": 0}
+
+    def save(self) -> None:
+        """
+        Writes the index atomically.
+        """
+        data: Dict[str, Any] = {
+            "runs": self.runs,
+            "lines": self.lines,
+            "markers": self.markers,
+        }
+        write_atomically(self.path, json.dumps(data).encode())
+
+
+class MilestoneTracker:
+    def __init__(self, index: MilestoneIndex):
+        """
+        Initializes a MilestoneTracker object estimating how far the output of a running
+        command got compared to the previous runs.
+
+        Besides the known markers, it samples evenly spaced lines of the output so
+        that the index can learn new markers from this run.
+
+        :param index: The index of the previous runs.
+        :type index: MilestoneIndex
+        """
+        self.index: MilestoneIndex = index
+        self.lines: int = 0
+        self.reached: float = 0
+        self.positions: Dict[str, int] = {}
+        self.candidates: Dict[str, int] = {}
+        self.stride: int = 1
+        self.next_candidate: int = 1
+
+    def feed(self, lines: Iterable[str]) -> None:
+        """
+        Follows new lines of the output.
+
+        :param lines: The lines written since the previous call.
+        :type lines: Iterable[str]
+        """
+        markers: Dict[str, Dict[str, float]] = self.index.markers
+        for line in lines:
+            self.lines += 1
+            key: str = normalize(line)
+            if not key:
+                continue
+            marker: Optional[Dict[str, float]] = markers.get(key)
+            if marker is not None:
+                if key not in self.positions:
+                    self.positions[key] = self.lines
+                    self.reached = max(self.reached, marker["offset"])
+            elif key in self.candidates:
+                self.candidates[key] = DUPLICATE
+            elif self.lines >= self.next_candidate:
+                self.candidates[key] = self.lines
+                self.next_candidate = self.lines + self.stride
+                if len(self.candidates) >= CANDIDATE_LIMIT:
+                    self.thin()
+
+    def thin(self) -> None:
+        """
+        Drops every other candidate line and doubles the sampling stride, keeping the
+        candidates evenly spaced in bounded memory.
+        """
+        kept: List[Tuple[str, int]] = [
+            item for item in self.candidates.items() if item[1] != DUPLICATE
+        ][::2]
+        self.candidates = dict(kept)
+        self.stride *= 2
+
+    def fraction(self) -> float:
+        """
+        Returns how far the output got compared to the previous runs.
+
+        :return: The estimated completed fraction, below 1 while the command runs.
+        :rtype: float
+        """
+        if self.index.lines <= 0:
+            return 0
+        return min(MAX_FRACTION, max(self.lines / self.index.lines, self.reached))
+
+
+def normalize(line: str) -> str:
+    """
+    Returns a line with its numbers and hashes replaced, so that the same step of two
+    runs gives the same key.
+
+    :param line: A log line.
+    :type line: str
+    :return: The normalized line.
+    :rtype: str
+    """
+    return VARIABLE_PARTS.sub("#", line.strip())[:200]
+
+
+def load_milestones(cmd_id: str, history: History) -> MilestoneIndex:
+    """
+    Returns the milestone index of a command, building it from the logs of its last
+    successful runs the first time.
+
+    :param cmd_id: The id of the command.
+    :type cmd_id: str
+    :param history: The history of the runs.
+    :type history: History
+    :return: The milestone index of the command.
+    :rtype: MilestoneIndex
+    """
+    index: MilestoneIndex = MilestoneIndex(
+        root / Path(f"build/milestones/{cmd_id}.json")
+    )
+    if index.runs:
+        return index
+    records: List[HistoryRecord] = history.records(cmd_id, BOOTSTRAP_LOGS, True)
+    for record in records:
+        if record.log and os.path.isfile(record.log):
+            tracker: MilestoneTracker = index.tracker()
+            tracker.feed(iter_log_lines(record.log))
+            index.update(tracker)
+            logger.debug(f"Indexed milestones of {record.log}")
+    if index.runs:
+        index.save()
+    return index
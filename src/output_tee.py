@@ -0,0 +1,95 @@
+import fcntl
+import logging
+import os
+import threading
+
+TEE_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class OutputTee:
+    def __init__(self, fd: int, console: int):
+        """
+        Initializes an OutputTee object showing the output of a command on the console
+        while it is passed on to the pump writing its log.
+
+        The output is copied by large chunks, the pipes being grown to hold a chunk where
+        the system allows it, so that few reads and writes are needed.
+
+        :param fd: The read end of the pipe the command writes its output to, closed with the tee.
+        :type fd: int
+        :param console: The file descriptor of the console, left open.
+        :type console: int
+        """
+        self.fd: int = fd
+        self.console: int = console
+        self.read_fd, self.write_fd = os.pipe()
+        for pipe in (fd, self.write_fd):
+            grow_pipe(pipe)
+
+    def start(self) -> int:
+        """
+        Copies the output on a thread until the end of the output.
+
+        :return: The read end of the pipe the output is passed on to.
+        :rtype: int
+        """
+        threading.Thread(target=self.copy, daemon=True).start()
+        return self.read_fd
+
+    def copy(self) -> None:
+        """
+        Copies the output until its end, or until the pump stops reading it.
+        """
+        try:
+            while self.copy_chunk():
+                pass
+        except BrokenPipeError:
+            logger.debug("Output no longer read, stop showing it")
+        finally:
+            os.close(self.write_fd)
+            os.close(self.fd)
+
+    def copy_chunk(self) -> bool:
+        """
+        Copies one chunk of output to the pump and to the console.
+
+        :return: Whether the end of the output was not reached.
+        :rtype: bool
+        """
+        data: bytes = os.read(self.fd, TEE_CHUNK_SIZE)
+        write_all(self.write_fd, data)
+        write_all(self.console, data)
+        return bool(data)
+
+
+def write_all(fd: int, data: bytes) -> None:
+    """
+    Writes all the data to a file descriptor.
+
+    :param fd: The file descriptor.
+    :type fd: int
+    :param data: The data to write.
+    :type data: bytes
+    """
+    view: memoryview = memoryview(data)
+    while view:
+        written: int = os.write(fd, view)
+        view = view[written:]
+
+
+def grow_pipe(fd: int) -> None:
+    """
+    Makes a pipe hold a chunk of output, so that fewer chunks are copied, if the system
+    allows it.
+
+    :param fd: An end of the pipe.
+    :type fd: int
+    """
+    if not hasattr(fcntl, "F_SETPIPE_SZ"):
+        return
+    try:
+        fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, TEE_CHUNK_SIZE)
+    except OSError as e:
+        logger.debug(f"Could not grow the pipe of the output: {e}")
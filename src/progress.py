@@ -1,16 +1,33 @@
 import logging
+from dataclasses import dataclass
 from sys import stdout
-from typing import List
+from typing import Any, List, Optional
 
-from progressbar import ProgressBar, Percentage, Bar, GranularBar, ETA
+from estimator import MEAN, Estimator
+from milestones import MilestoneTracker
 
 PROGRESS_DOT_CHAR_COUNT = 50
+MAX_FRACTION = 0.99
+
+STARTED = "started"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CACHED = "cached"
+RETRYING = "retrying"
 
 logger = logging.getLogger(__name__)
 
 
 class Progress:
-    def __init__(self, history: List[int], granular: bool):
+    def __init__(
+        self,
+        history: List[int],
+        granular: bool,
+        estimator: Optional[Estimator] = None,
+        kind: str = MEAN,
+        tracker: Optional[MilestoneTracker] = None,
+    ):
         """
         Initializes a Progress object.
 
@@ -18,25 +35,32 @@ class Progress:
         :type history: List[int]
         :param granular: Whether to use a granular progress bar.
         :type granular: bool
+        :param estimator: The statistics of the previous runs, computed from the history if not given.
+        :type estimator: Optional[Estimator]
+        :param kind: The statistic used as expected time, one of mean, ewma, median and p90.
+        :type kind: str
+        :param tracker: The tracker of the command's output, to advance the bar with the output instead of the time.
+        :type tracker: Optional[MilestoneTracker]
         """
-        self.avg_time: int = -1
-        self.max_time: int = -1
-        self.min_time: int = -1
+        self.estimator: Estimator = estimator or Estimator.from_times(history)
+        self.avg_time: int = self.estimator.expected(kind)
+        self.max_time: int = self.estimator.max_time
+        self.min_time: int = self.estimator.min_time
         self.counter: int = 0
-        self.bar: ProgressBar = None
-
-        if history:
-            self.avg_time = round(sum(history) / len(history))
-            self.max_value = max(history)
-            self.min_value = min(history)
+        self.tracker: Optional[MilestoneTracker] = tracker
+        # A progressbar.ProgressBar, imported only when a bar is drawn
+        self.bar: Any = None
 
         if self.avg_time >= 0:
-            widgets = [
+            from progressbar import ETA, Bar, GranularBar, Percentage, ProgressBar
+
+            widgets: List[Any] = [
                 Percentage(),
                 " ",
                 GranularBar() if granular else Bar(),
                 " ",
                 ETA(),
+                f" ({self.estimator.band()})",
             ]
             self.bar = ProgressBar(
                 widgets=widgets,
@@ -52,7 +76,10 @@ class Progress:
         Updates the progress bar.
         """
         if self.bar:
-            if self.bar.value < self.bar.max_value:
+            if self.tracker:
+                value: int = round(self.tracker.fraction() * self.bar.max_value)
+                self.bar.update(min(self.bar.max_value, max(self.bar.value, value)))
+            elif self.bar.value < self.bar.max_value:
                 self.bar.update(self.bar.value + 1)
         else:
             self.counter = self.counter + 1
@@ -80,3 +107,48 @@ class Progress:
         :rtype: int
         """
         return self.avg_time
+
+
+@dataclass
+class ProgressEvent:
+    """
+    The progress of a running command, reported to the callback of the async runner.
+
+    :param command_id: The id of the command.
+    :param name: The name of the command.
+    :param state: One of started, running, succeeded, failed and cached.
+    :param elapsed: The number of seconds since the command started.
+    :param expected_time: The expected duration in seconds, -1 if unknown.
+    :param fraction: The estimated completed fraction, None if unknown.
+    """
+
+    command_id: str
+    name: str
+    state: str
+    elapsed: float
+    expected_time: int
+    fraction: Optional[float]
+
+
+def get_fraction(
+    elapsed: float, expected_time: int, tracker: Optional[MilestoneTracker] = None
+) -> Optional[float]:
+    """
+    Returns how far a running command got, from its output if it is tracked and from
+    its expected time otherwise.
+
+    :param elapsed: The number of seconds since the command started.
+    :type elapsed: float
+    :param expected_time: The expected duration in seconds, -1 if unknown.
+    :type expected_time: int
+    :param tracker: The tracker of the command's output, if enabled.
+    :type tracker: Optional[MilestoneTracker]
+    :return: The estimated completed fraction, None if there is no previous run.
+    :rtype: Optional[float]
+    """
+    if tracker and tracker.index.lines > 0:
+        fraction: float = tracker.fraction()
+        return fraction
+    if expected_time < 0:
+        return None
+    return min(MAX_FRACTION, elapsed / max(expected_time, 1))
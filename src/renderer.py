@@ -0,0 +1,254 @@
+import logging
+import shutil
+import sys
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, TextIO
+
+from progress import CACHED, FAILED, SUCCEEDED, ProgressEvent
+from tracing import Tracer, span
+
+AUTO = "auto"
+MULTI = "multi"
+LINE = "line"
+STATUS = "status"
+DISPLAYS = [AUTO, MULTI, LINE, STATUS]
+
+DEFAULT_FPS = 10.0
+STATUS_INTERVAL = 30.0
+MAX_LINES = 10
+STATUS_WIDTH = 200
+NAME_WIDTH = 30
+BAR_WIDTH = 20
+
+CLEAR_LINE = "\x1b[2K"
+CLEAR_BELOW = "\x1b[J"
+
+
+class Renderer:
+    def __init__(
+        self,
+        stream: TextIO = sys.stdout,
+        display: str = AUTO,
+        fps: float = DEFAULT_FPS,
+        status_interval: float = STATUS_INTERVAL,
+        max_lines: int = MAX_LINES,
+        columns: int = 0,
+    ):
+        """
+        Initializes a Renderer object showing the progress of all the running commands.
+
+        The progress events are coalesced and drawn at most fps times per second, one
+        line per command or as a single status line on a terminal. When the stream is
+        not a terminal, a status line is written every status_interval seconds instead.
+        At most max_lines commands are shown, so that the output does not grow with the
+        number of commands or their runtime.
+
+        :param stream: The stream to draw on.
+        :type stream: TextIO
+        :param display: One of auto, multi, line and status, auto choosing multi on a terminal and status otherwise.
+        :type display: str
+        :param fps: The maximum number of redraws per second on a terminal.
+        :type fps: float
+        :param status_interval: The number of seconds between two status lines when not on a terminal.
+        :type status_interval: float
+        :param max_lines: The maximum number of commands shown.
+        :type max_lines: int
+        :param columns: The width of the terminal, 0 to use the terminal of this process.
+        :type columns: int
+        :raises ValueError: If the display is unknown or the rates are not positive.
+        """
+        if display not in DISPLAYS:
+            raise ValueError(f"display must be one of {', '.join(DISPLAYS)}")
+        if fps <= 0 or status_interval <= 0:
+            raise ValueError("fps and status_interval must be positive")
+        if display == AUTO:
+            display = MULTI if stream.isatty() else STATUS
+        self.stream: TextIO = stream
+        self.display: str = display
+        self.max_lines: int = max_lines
+        self.columns: int = columns
+        self.period: float = status_interval if display == STATUS else 1 / fps
+        self.running: Dict[str, ProgressEvent] = {}
+        self.finished: int = 0
+        self.failed: int = 0
+        self.cached: int = 0
+        self.drawn_lines: int = 0
+        self.lock: threading.Lock = threading.Lock()
+        self.next_draw: float = time.monotonic()
+        self.tracer: Optional[Tracer] = None
+        if display == STATUS:
+            self.next_draw += self.period
+
+    def update(self, event: ProgressEvent) -> None:
+        """
+        Records the progress of a command, redrawing if the previous frame is old enough.
+
+        :param event: The progress of the command.
+        :type event: ProgressEvent
+        """
+        with self.lock:
+            if event.state in (SUCCEEDED, FAILED, CACHED):
+                self.running.pop(event.command_id, None)
+                self.finished += 1
+                self.failed += event.state == FAILED
+                self.cached += event.state == CACHED
+            else:
+                self.running[event.command_id] = event
+            now: float = time.monotonic()
+            if now >= self.next_draw:
+                self.draw()
+                self.next_draw = now + self.period
+
+    def write(self, message: str) -> None:
+        """
+        Writes a message above the progress of the commands.
+
+        :param message: The message, without trailing line feed.
+        :type message: str
+        """
+        with self.lock:
+            self.clear()
+            self.stream.write(f"{message}\n")
+            if self.display != STATUS:
+                self.draw()
+            self.stream.flush()
+
+    def close(self) -> None:
+        """
+        Erases the progress of the commands from the terminal.
+        """
+        with self.lock:
+            self.clear()
+            self.stream.flush()
+
+    def draw(self) -> None:
+        """
+        Draws the progress of the running commands.
+        """
+        with span(self.tracer, "render", "renderer", display=self.display):
+            if self.display == STATUS:
+                if self.running:
+                    stamp: str = time.strftime("%H:%M:%S")
+                    self.stream.write(f"{stamp} {self.summary(self.width())}\n")
+            elif self.display == LINE:
+                self.stream.write(f"\r{CLEAR_LINE}{self.summary(self.width() - 1)}")
+            else:
+                self.clear()
+                lines: List[str] = [self.summary(self.width())]
+                events: List[ProgressEvent] = list(self.running.values())
+                lines += [format_event(event) for event in events[: self.max_lines]]
+                self.stream.write(
+                    "".join(f"{line[: self.width()]}\n" for line in lines)
+                )
+                self.drawn_lines = len(lines)
+            self.stream.flush()
+
+    def clear(self) -> None:
+        """
+        Moves the cursor back to where the progress was drawn and erases it.
+        """
+        if self.display == LINE:
+            self.stream.write(f"\r{CLEAR_LINE}")
+        elif self.display == MULTI and self.drawn_lines:
+            self.stream.write(f"\x1b[{self.drawn_lines}F{CLEAR_BELOW}")
+            self.drawn_lines = 0
+
+    def summary(self, width: int) -> str:
+        """
+        Returns a single line summarizing the progress of the commands.
+
+        :param width: The maximum length of the line.
+        :type width: int
+        :return: The summary.
+        :rtype: str
+        """
+        summary: str = f"{len(self.running)} running, {self.finished} finished"
+        if self.failed:
+            summary += f" ({self.failed} failed)"
+        if self.cached:
+            summary += f" ({self.cached} up to date)"
+        if self.display == MULTI:
+            return summary[:width]
+        parts: List[str] = [f"{summary}:"]
+        events: List[ProgressEvent] = list(self.running.values())
+        for i, event in enumerate(events[: self.max_lines]):
+            part: str = f"{event.name} {format_fraction(event.fraction)}"
+            more: str = f" +{len(events) - i} more"
+            if len(" ".join(parts + [part])) + len(more) > width:
+                return f"{' '.join(parts)}{more}"[:width]
+            parts.append(part)
+        if len(events) > self.max_lines:
+            parts.append(f"+{len(events) - self.max_lines} more")
+        return " ".join(parts)[:width]
+
+    def width(self) -> int:
+        """
+        Returns the maximum length of the lines drawn.
+
+        :return: The width of the terminal, or a fixed width for status lines.
+        :rtype: int
+        """
+        if self.display == STATUS:
+            return STATUS_WIDTH
+        return self.columns or shutil.get_terminal_size().columns
+
+
+class RendererHandler(logging.Handler):
+    def __init__(self, renderer: Renderer):
+        """
+        Initializes a RendererHandler object writing the log records above the progress
+        drawn by a renderer, so that they do not get mixed up.
+
+        :param renderer: The renderer drawing the progress.
+        :type renderer: Renderer
+        """
+        super().__init__()
+        self.renderer: Renderer = renderer
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """
+        Writes a log record.
+
+        :param record: The log record.
+        :type record: logging.LogRecord
+        """
+        try:
+            self.renderer.write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def format_event(event: ProgressEvent) -> str:
+    """
+    Returns a line showing the progress of a command.
+
+    :param event: The progress of the command.
+    :type event: ProgressEvent
+    :return: The name of the command, a bar, its elapsed and expected times.
+    :rtype: str
+    """
+    bar: str = " " * BAR_WIDTH
+    if event.fraction is not None:
+        filled: int = round(event.fraction * BAR_WIDTH)
+        bar = "#" * filled + " " * (BAR_WIDTH - filled)
+    elapsed: str = str(timedelta(seconds=round(event.elapsed)))
+    if event.expected_time >= 0:
+        elapsed += f" / {timedelta(seconds=event.expected_time)}"
+    name: str = event.name[:NAME_WIDTH]
+    return f"{name:<{NAME_WIDTH}} |{bar}| {format_fraction(event.fraction)} {elapsed}"
+
+
+def format_fraction(fraction: Optional[float]) -> str:
+    """
+    Returns a completed fraction as a percentage.
+
+    :param fraction: The completed fraction, None if unknown.
+    :type fraction: Optional[float]
+    :return: The percentage, or ? if unknown.
+    :rtype: str
+    """
+    if fraction is None:
+        return "  ?%"
+    return f"{fraction:>4.0%}"
@@ -0,0 +1,119 @@
+import time
+from sys import stdout
+from typing import List, Optional, TextIO
+
+from command import Command
+from history import History, HistoryRecord
+from resources import ResourceUsage
+
+CPU_BOUND = 0.8
+MOSTLY_WAITING = 0.3
+
+
+def format_report(command: Command, records: List[HistoryRecord]) -> List[str]:
+    """
+    Returns the report of the previous runs of a command, one line per run followed by
+    a summary.
+
+    :param command: The command.
+    :type command: Command
+    :param records: The previous runs of the command, oldest first.
+    :type records: List[HistoryRecord]
+    :return: The lines of the report.
+    :rtype: List[str]
+    """
+    lines: List[str] = [
+        f"{command.name} ({command.id})",
+        f"{'finished':<19} {'time':>7} {'exit':>4} {'user':>8} {'sys':>8} "
+        f"{'cpu':>5} {'rss MB':>8} {'in':>9} {'out':>9} {'ctx sw':>9}",
+    ]
+    for record in records:
+        finished: str = time.strftime(
+            "%Y-%m-%d %H:%M:%S", time.localtime(record.timestamp)
+        )
+        line: str = f"{finished:<19} {record.duration:>6}s {record.exit_code:>4}"
+        usage: Optional[ResourceUsage] = record.usage
+        if usage:
+            line += (
+                f" {usage.user_cpu:>7.1f}s {usage.sys_cpu:>7.1f}s"
+                f" {get_utilization(usage, record.duration):>5.1f}"
+                f" {usage.max_rss / 1024:>8.0f} {usage.in_blocks:>9}"
+                f" {usage.out_blocks:>9}"
+                f" {usage.voluntary_switches + usage.involuntary_switches:>9}"
+            )
+        lines.append(line)
+    lines.append(get_summary(records))
+    return lines
+
+
+def get_utilization(usage: ResourceUsage, duration: int) -> float:
+    """
+    Returns the average number of CPU cores the run kept busy.
+
+    :param usage: The resources used by the run.
+    :type usage: ResourceUsage
+    :param duration: The duration of the run in seconds.
+    :type duration: int
+    :return: The CPU time divided by the wall-clock time.
+    :rtype: float
+    """
+    utilization: float = usage.cpu_time() / max(duration, 1)
+    return utilization
+
+
+def get_summary(records: List[HistoryRecord]) -> str:
+    """
+    Returns a summary of the runs telling whether the command is CPU-bound.
+
+    :param records: The previous runs of a command.
+    :type records: List[HistoryRecord]
+    :return: The summary.
+    :rtype: str
+    """
+    if not records:
+        return "No previous runs"
+    failures: int = sum(1 for record in records if record.exit_code != 0)
+    summary: str = f"{len(records)} runs, {failures} failed"
+    measured: List[HistoryRecord] = [record for record in records if record.usage]
+    if not measured:
+        return summary
+    utilization: float = sum(
+        get_utilization(record.usage, record.duration)
+        for record in measured
+        if record.usage
+    ) / len(measured)
+    peak_rss: int = max(record.usage.max_rss for record in measured if record.usage)
+    kind: str = "mixed"
+    if utilization >= CPU_BOUND:
+        kind = "CPU-bound"
+    elif utilization < MOSTLY_WAITING:
+        kind = "mostly waiting on I/O or other processes"
+    return (
+        f"{summary}, {utilization:.1f} cores busy on average ({kind}), "
+        f"peak RSS {peak_rss / 1024:.0f} MB"
+    )
+
+
+def print_report(
+    commands: List[Command],
+    history: History,
+    window: int,
+    stream: Optional[TextIO] = None,
+) -> None:
+    """
+    Prints the report of the previous runs of the commands.
+
+    :param commands: The commands to report on.
+    :type commands: List[Command]
+    :param history: The history of the runs.
+    :type history: History
+    :param window: The maximum number of runs to report per command.
+    :type window: int
+    :param stream: The stream to print to, stdout by default.
+    :type stream: Optional[TextIO]
+    """
+    stream = stream or stdout
+    for command in commands:
+        lines: List[str] = format_report(command, history.records(command.id, window))
+        stream.write("\n".join(lines) + "\n\n")
+    stream.flush()
@@ -0,0 +1,72 @@
+import resource
+import sys
+from dataclasses import dataclass
+
+
+@dataclass
+class ResourceUsage:
+    """
+    The resources used by a finished command.
+
+    :param user_cpu: The CPU time spent in user mode, in seconds.
+    :param sys_cpu: The CPU time spent in kernel mode, in seconds.
+    :param max_rss: The peak resident set size, in kilobytes.
+    :param in_blocks: The number of block input operations.
+    :param out_blocks: The number of block output operations.
+    :param voluntary_switches: The number of voluntary context switches.
+    :param involuntary_switches: The number of involuntary context switches.
+    """
+
+    user_cpu: float
+    sys_cpu: float
+    max_rss: int
+    in_blocks: int
+    out_blocks: int
+    voluntary_switches: int
+    involuntary_switches: int
+
+    @classmethod
+    def from_rusage(cls, rusage: resource.struct_rusage) -> "ResourceUsage":
+        """
+        Returns the ResourceUsage of a struct_rusage returned by os.wait4.
+
+        :param rusage: The resource usage of a child process.
+        :type rusage: resource.struct_rusage
+        :return: The resource usage.
+        :rtype: ResourceUsage
+        """
+        max_rss: int = rusage.ru_maxrss
+        if sys.platform == "darwin":
+            max_rss //= 1024
+        return cls(
+            rusage.ru_utime,
+            rusage.ru_stime,
+            max_rss,
+            rusage.ru_inblock,
+            rusage.ru_oublock,
+            rusage.ru_nvcsw,
+            rusage.ru_nivcsw,
+        )
+
+    def cpu_time(self) -> float:
+        """
+        Returns the total CPU time.
+
+        :return: The user and kernel CPU time, in seconds.
+        :rtype: float
+        """
+        return self.user_cpu + self.sys_cpu
+
+    def summary(self) -> str:
+        """
+        Returns a one line summary of the resource usage.
+
+        :return: The summary.
+        :rtype: str
+        """
+        return (
+            f"CPU {self.user_cpu:.1f}s user {self.sys_cpu:.1f}s sys, "
+            f"max RSS {self.max_rss / 1024:.0f} MB, "
+            f"I/O {self.in_blocks}/{self.out_blocks} blocks, "
+            f"{self.voluntary_switches}/{self.involuntary_switches} context switches"
+        )
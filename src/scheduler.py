@@ -0,0 +1,481 @@
+import logging
+import os
+import signal
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Set
+
+from command import COMMANDS_KEY
+from command import Command, RunOptions
+from exit_waiter import ExitWaiter
+from matrix import load_commands
+
+MAX_PARALLEL_KEY = "max_parallel"
+FAIL_FAST_KEY = "fail_fast"
+STOP_GRACE = 2.0
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    def __init__(
+        self, commands: List[Command], max_parallel: int = 1, fail_fast: bool = True
+    ):
+        """
+        Initializes a Scheduler object.
+
+        :param commands: The commands to run, in configuration order.
+        :type commands: List[Command]
+        :param max_parallel: The maximum number of commands running at the same time.
+        :type max_parallel: int
+        :param fail_fast: Whether to stop starting new commands after the first failure.
+        :type fail_fast: bool
+        :raises ValueError: If the dependency graph is invalid.
+        """
+        if max_parallel < 1:
+            raise ValueError("max_parallel must be at least 1")
+        self.commands: List[Command] = commands
+        self.max_parallel: int = max_parallel
+        self.fail_fast: bool = fail_fast
+        self.succeeded: Set[str] = set()
+        check_dependencies(commands)
+
+    def run(self, options: RunOptions) -> None:
+        """
+        Runs the commands, starting every command as soon as its dependencies succeeded.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :raises RuntimeError: If any of the commands failed.
+        """
+        pending: List[Command] = self.ordered_commands(options)
+        succeeded: Set[str] = self.resume(pending, options)
+        self.succeeded = succeeded
+        failed: Set[str] = set()
+        skipped: Set[str] = set()
+        cached: Set[str] = set()
+        running: Dict[Future[bool], Command] = {}
+
+        with ThreadPoolExecutor(max_workers=self.pool_size()) as pool:
+            try:
+                while pending or running:
+                    for command in self.next_commands(
+                        pending, succeeded, failed, skipped, list(running.values())
+                    ):
+                        future = pool.submit(command.run, options)
+                        running[future] = command
+                    if not running:
+                        break
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        command = running.pop(future)
+                        try:
+                            if future.result():
+                                cached.add(command.id)
+                            succeeded.add(command.id)
+                            if options.checkpoint:
+                                options.checkpoint.complete(command)
+                        except RuntimeError as e:
+                            logger.error(str(e))
+                            failed.add(command.id)
+            except BaseException:
+                stop_commands(list(running.values()), options)
+                raise
+
+        if options.checkpoint and len(succeeded) == len(self.commands):
+            options.checkpoint.clear()
+        report_matrices(self.commands, succeeded, failed)
+        report_outcome(pending, skipped, failed, cached)
+
+    async def run_async(
+        self, options: RunOptions, only: Optional[Set[str]] = None
+    ) -> None:
+        """
+        Runs the commands on the running event loop, starting every command as soon as
+        its dependencies succeeded.
+
+        The running commands are stopped if the run is cancelled.
+
+        :param options: The options of the run.
+        :type options: RunOptions
+        :param only: The ids of the commands to run, the other ones being considered successful, all of them if not given.
+        :type only: Optional[Set[str]]
+        :raises RuntimeError: If any of the commands failed.
+        """
+        import asyncio
+
+        pending: List[Command] = self.ordered_commands(options)
+        succeeded: Set[str] = self.resume(pending, options)
+        self.succeeded = succeeded
+        if only is not None:
+            succeeded.update(
+                command.id for command in pending if command.id not in only
+            )
+            pending = [command for command in pending if command.id in only]
+        failed: Set[str] = set()
+        skipped: Set[str] = set()
+        cached: Set[str] = set()
+        running: Dict[asyncio.Task[bool], Command] = {}
+
+        try:
+            while pending or running:
+                for command in self.next_commands(
+                    pending, succeeded, failed, skipped, list(running.values())
+                ):
+                    task = asyncio.create_task(command.run_async(options))
+                    running[task] = command
+                if not running:
+                    break
+                finished, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in finished:
+                    command = running.pop(task)
+                    try:
+                        if task.result():
+                            cached.add(command.id)
+                        succeeded.add(command.id)
+                        if options.checkpoint:
+                            options.checkpoint.complete(command)
+                    except RuntimeError as e:
+                        logger.error(str(e))
+                        failed.add(command.id)
+        finally:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+        if options.checkpoint and len(succeeded) == len(self.commands):
+            options.checkpoint.clear()
+        report_matrices(
+            [
+                command
+                for command in self.commands
+                if only is None or command.id in only
+            ],
+            succeeded,
+            failed,
+        )
+        report_outcome(pending, skipped, failed, cached)
+
+    def affected(self, paths: Set[str]) -> Set[str]:
+        """
+        Returns the commands to run again after files changed: the ones with a matching
+        input glob, and all the commands depending on them.
+
+        :param paths: The normalized paths of the files that changed.
+        :type paths: Set[str]
+        :return: The ids of the commands.
+        :rtype: Set[str]
+        """
+        from file_watcher import matches
+        from fingerprint import ENV_PREFIX
+
+        affected: Set[str] = {
+            command.id
+            for command in self.commands
+            if any(
+                matches(path, os.path.normpath(pattern))
+                for pattern in command.inputs
+                if not pattern.startswith(ENV_PREFIX)
+                for path in paths
+            )
+        }
+        added: bool = True
+        while added:
+            dependents: List[Command] = [
+                command
+                for command in self.commands
+                if command.id not in affected
+                and any(dependency in affected for dependency in command.depends_on)
+            ]
+            affected.update(command.id for command in dependents)
+            added = bool(dependents)
+        return affected
+
+    def next_commands(
+        self,
+        pending: List[Command],
+        succeeded: Set[str],
+        failed: Set[str],
+        skipped: Set[str],
+        running: List[Command],
+    ) -> List[Command]:
+        """
+        Removes from the pending commands the ones to start now and the ones that can
+        never run.
+
+        :param pending: The commands that were not started yet.
+        :type pending: List[Command]
+        :param succeeded: The ids of the commands that finished successfully.
+        :type succeeded: Set[str]
+        :param failed: The ids of the commands that failed.
+        :type failed: Set[str]
+        :param skipped: The ids of the commands skipped so far, updated with the new ones.
+        :type skipped: Set[str]
+        :param running: The commands running.
+        :type running: List[Command]
+        :return: The commands to start, the instances of a matrix counted against the parallelism of the matrix and the other ones against max_parallel.
+        :rtype: List[Command]
+        """
+        for command in self.blocked(pending, failed | skipped):
+            logger.info(f"Command '{command.name}' SKIPPED")
+            pending.remove(command)
+            skipped.add(command.id)
+        if self.fail_fast and failed:
+            return []
+        slots: Counter[str] = Counter(command.matrix for command in running)
+        starting: List[Command] = []
+        for command in ready(pending, succeeded):
+            limit: int = command.max_parallel if command.matrix else self.max_parallel
+            if slots[command.matrix] < limit:
+                slots[command.matrix] += 1
+                starting.append(command)
+        for command in starting:
+            pending.remove(command)
+        return starting
+
+    def pool_size(self) -> int:
+        """
+        Returns the maximum number of commands running at the same time.
+
+        :return: The max_parallel of the scheduler plus the parallelism of every matrix.
+        :rtype: int
+        """
+        matrices: Dict[str, int] = {
+            command.matrix: command.max_parallel
+            for command in self.commands
+            if command.matrix
+        }
+        return self.max_parallel + sum(matrices.values())
+
+    def ordered_commands(self, options: RunOptions) -> List[Command]:
+        """
+        Returns the commands in configuration order, except for the instances of every
+        matrix which are sorted longest expected first, so that the slowest shards do not
+        start last. The instances that never ran come first.
+
+        :param options: The options of the run, giving the history of the commands.
+        :type options: RunOptions
+        :return: The commands in the order they are started when they are ready.
+        :rtype: List[Command]
+        """
+        instances: Dict[str, List[Command]] = {}
+        for command in self.commands:
+            if command.matrix:
+                instances.setdefault(command.matrix, []).append(command)
+        if not instances:
+            return list(self.commands)
+        expected: Dict[str, float] = {}
+        for commands in instances.values():
+            for command in commands:
+                expected_time: int = options.history.estimator(
+                    command.id, options.history_window
+                ).expected(command.estimator)
+                expected[command.id] = (
+                    expected_time if expected_time >= 0 else float("inf")
+                )
+            commands.sort(key=lambda command: expected[command.id], reverse=True)
+        return [
+            instances[command.matrix].pop(0) if command.matrix else command
+            for command in self.commands
+        ]
+
+    def resume(self, pending: List[Command], options: RunOptions) -> Set[str]:
+        """
+        Starts the checkpoint of the run, removing from the pending commands the ones
+        completed by the previous run when resuming it.
+
+        :param pending: The commands that were not started yet.
+        :type pending: List[Command]
+        :param options: The options of the run.
+        :type options: RunOptions
+        :return: The ids of the commands completed by the previous run.
+        :rtype: Set[str]
+        """
+        if not options.checkpoint:
+            return set()
+        completed: List[Command] = options.checkpoint.start(self.commands)
+        for command in completed:
+            pending.remove(command)
+        if completed:
+            ids: str = ", ".join(command.id for command in completed)
+            logger.info(f"Resuming the previous run, already completed: {ids}")
+        return {command.id for command in completed}
+
+    def blocked(self, pending: List[Command], failed: Set[str]) -> List[Command]:
+        """
+        Returns the pending commands that can never run because a dependency failed.
+
+        :param pending: The commands that were not started yet.
+        :type pending: List[Command]
+        :param failed: The ids of the commands that failed or were skipped.
+        :type failed: Set[str]
+        :return: The commands depending on a failed command.
+        :rtype: List[Command]
+        """
+        if self.fail_fast:
+            return []
+        return [
+            command
+            for command in pending
+            if any(dependency in failed for dependency in command.depends_on)
+        ]
+
+
+def stop_commands(
+    commands: List[Command], options: RunOptions, grace: float = STOP_GRACE
+) -> None:
+    """
+    Stops the running commands of an interrupted run, so that their threads return.
+
+    The commands run in their own session and never get the SIGINT of the terminal, so
+    their process groups are sent SIGTERM, then SIGKILL after the grace period. No
+    command is started or retried afterwards.
+
+    :param commands: The running commands.
+    :type commands: List[Command]
+    :param options: The options of the run.
+    :type options: RunOptions
+    :param grace: The number of seconds between SIGTERM and SIGKILL.
+    :type grace: float
+    """
+    options.interrupted.set()
+    waiters: List[ExitWaiter] = [
+        command.waiter for command in commands if command.waiter is not None
+    ]
+    if waiters:
+        logger.info(f"Run interrupted, stopping {len(waiters)} running commands")
+    for waiter in waiters:
+        waiter.signal(signal.SIGTERM, True)
+    deadline: float = time.monotonic() + grace
+    for waiter in waiters:
+        waiter.exited.wait(max(0.0, deadline - time.monotonic()))
+    for waiter in waiters:
+        waiter.signal(signal.SIGKILL, True)
+
+
+def report_outcome(
+    pending: List[Command], skipped: Set[str], failed: Set[str], cached: Set[str]
+) -> None:
+    """
+    Logs the commands that were up to date or did not run, and raises if any command
+    failed.
+
+    :param pending: The commands that were never started.
+    :type pending: List[Command]
+    :param skipped: The ids of the commands skipped because a dependency failed.
+    :type skipped: Set[str]
+    :param failed: The ids of the commands that failed.
+    :type failed: Set[str]
+    :param cached: The ids of the commands skipped because they were up to date.
+    :type cached: Set[str]
+    :raises RuntimeError: If any of the commands failed.
+    """
+    if cached:
+        logger.info(f"Commands up to date: {', '.join(sorted(cached))}")
+    not_run: List[str] = [command.id for command in pending] + sorted(skipped)
+    if not_run:
+        logger.info(f"Commands not run: {', '.join(not_run)}")
+    if failed:
+        raise RuntimeError(f"Commands FAILED: {', '.join(sorted(failed))}")
+
+
+def report_matrices(
+    commands: List[Command], succeeded: Set[str], failed: Set[str]
+) -> None:
+    """
+    Logs the number of instances of every matrix that passed, failed or did not run.
+
+    :param commands: The commands of the run.
+    :type commands: List[Command]
+    :param succeeded: The ids of the commands that finished successfully or were up to date.
+    :type succeeded: Set[str]
+    :param failed: The ids of the commands that failed.
+    :type failed: Set[str]
+    """
+    instances: Dict[str, List[str]] = {}
+    for command in commands:
+        if command.matrix:
+            instances.setdefault(command.matrix, []).append(command.id)
+    for matrix, ids in instances.items():
+        passed: int = sum(cmd_id in succeeded for cmd_id in ids)
+        failures: List[str] = [cmd_id for cmd_id in ids if cmd_id in failed]
+        summary: str = f"Matrix '{matrix}': {passed} of {len(ids)} passed"
+        if failures:
+            summary += f", {len(failures)} FAILED ({', '.join(failures)})"
+        not_run: int = len(ids) - passed - len(failures)
+        if not_run:
+            summary += f", {not_run} not run"
+        logger.log(logging.ERROR if failures else logging.INFO, summary)
+
+
+def ready(pending: List[Command], succeeded: Set[str]) -> List[Command]:
+    """
+    Returns the pending commands whose dependencies all succeeded, in configuration order.
+
+    :param pending: The commands that were not started yet.
+    :type pending: List[Command]
+    :param succeeded: The ids of the commands that finished successfully.
+    :type succeeded: Set[str]
+    :return: The commands that can be started.
+    :rtype: List[Command]
+    """
+    return [
+        command
+        for command in pending
+        if all(dependency in succeeded for dependency in command.depends_on)
+    ]
+
+
+def check_dependencies(commands: List[Command]) -> None:
+    """
+    Checks that the command ids are unique and that the dependencies form a DAG.
+
+    :param commands: The commands to check.
+    :type commands: List[Command]
+    :raises ValueError: If an id is duplicated, a dependency is unknown or there is a cycle.
+    """
+    ids: Set[str] = set()
+    for command in commands:
+        if command.id in ids:
+            raise ValueError(f"Duplicate command id '{command.id}'")
+        ids.add(command.id)
+    for command in commands:
+        for dependency in command.depends_on:
+            if dependency not in ids:
+                raise ValueError(
+                    f"Command '{command.id}' depends on unknown command '{dependency}'"
+                )
+
+    resolved: Set[str] = set()
+    remaining: List[Command] = list(commands)
+    while remaining:
+        resolvable: List[Command] = ready(remaining, resolved)
+        if not resolvable:
+            cycle: str = ", ".join(command.id for command in remaining)
+            raise ValueError(f"Dependency cycle between commands: {cycle}")
+        for command in resolvable:
+            remaining.remove(command)
+            resolved.add(command.id)
+
+
+def load_scheduler(data: Dict[str, Any]) -> Scheduler:
+    """
+    Creates a Scheduler from a parsed configuration file.
+
+    :param data: The parsed yaml configuration.
+    :type data: Dict[str, Any]
+    :return: A Scheduler for the configured commands.
+    :rtype: Scheduler
+    :raises ValueError: If the scheduling settings are invalid.
+    """
+    max_parallel: Any = data.get(MAX_PARALLEL_KEY, 1)
+    if not isinstance(max_parallel, int) or isinstance(max_parallel, bool):
+        raise ValueError("max_parallel must be an integer")
+    fail_fast: Any = data.get(FAIL_FAST_KEY, True)
+    if not isinstance(fail_fast, bool):
+        raise ValueError("fail_fast must be true or false")
+    commands: List[Command] = load_commands(data[COMMANDS_KEY])
+    return Scheduler(commands, max_parallel, fail_fast)
@@ -0,0 +1,178 @@
+import contextlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any, ContextManager, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import cProfile
+
+PROFILE_LINES = 20
+
+logger = logging.getLogger(__name__)
+
+NO_SPAN: ContextManager[None] = contextlib.nullcontext()
+
+
+class Tracer:
+    def __init__(self) -> None:
+        """
+        Initializes a Tracer object recording spans of time as Chrome trace events, to be
+        opened with Perfetto or chrome://tracing.
+
+        Every span belongs to a lane, shown as a thread: one per command and one for the
+        whole pipeline, whatever the threads or the event loop the spans ran on.
+        """
+        self.events: List[Dict[str, Any]] = []
+        self.lanes: Dict[str, int] = {}
+        self.lock: threading.Lock = threading.Lock()
+        self.pid: int = os.getpid()
+
+    @contextlib.contextmanager
+    def span(self, name: str, lane: str, **args: Any) -> Iterator[None]:
+        """
+        Records the time spent in a block.
+
+        :param name: The name of the span.
+        :type name: str
+        :param lane: The name of the lane of the span, e.g. the id of a command.
+        :type lane: str
+        :param args: Values shown with the span.
+        :type args: Any
+        :return: A context timing the block.
+        :rtype: Iterator[None]
+        """
+        start: int = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end: int = time.perf_counter_ns()
+            with self.lock:
+                self.events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": start / 1000,
+                        "dur": (end - start) / 1000,
+                        "pid": self.pid,
+                        "tid": self.lane(lane),
+                        "args": args,
+                    }
+                )
+
+    def lane(self, name: str) -> int:
+        """
+        Returns the id of a lane, naming it the first time it is used. Called with the
+        lock held.
+
+        :param name: The name of the lane.
+        :type name: str
+        :return: The id of the lane.
+        :rtype: int
+        """
+        if name not in self.lanes:
+            self.lanes[name] = len(self.lanes) + 1
+            self.events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self.pid,
+                    "tid": self.lanes[name],
+                    "args": {"name": name},
+                }
+            )
+        return self.lanes[name]
+
+    def save(self, path: str) -> None:
+        """
+        Writes the trace in the Chrome trace event format.
+
+        :param path: The path to the trace file.
+        :type path: str
+        """
+        with self.lock:
+            events: List[Dict[str, Any]] = list(self.events)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        logger.info(f"Trace written to {path}")
+
+
+def span(
+    tracer: Optional[Tracer], name: str, lane: str, **args: Any
+) -> ContextManager[None]:
+    """
+    Returns a context recording the time spent in a block if tracing is enabled.
+
+    :param tracer: The tracer, None when tracing is disabled.
+    :type tracer: Optional[Tracer]
+    :param name: The name of the span.
+    :type name: str
+    :param lane: The name of the lane of the span.
+    :type lane: str
+    :param args: Values shown with the span.
+    :type args: Any
+    :return: The context, doing nothing when tracing is disabled.
+    :rtype: ContextManager[None]
+    """
+    if tracer is None:
+        return NO_SPAN
+    return tracer.span(name, lane, **args)
+
+
+class Profiler:
+    def __init__(self) -> None:
+        """
+        Initializes a Profiler object profiling the tool itself with cProfile, in the
+        main thread and in every thread started while it runs.
+        """
+        self.profiles: List["cProfile.Profile"] = []
+        self.lock: threading.Lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Starts profiling the current thread and the threads started from now on.
+        """
+        threading.setprofile(self.profile_thread)
+        self.profile_thread()
+
+    def profile_thread(self, *args: Any) -> None:
+        """
+        Starts profiling the current thread, called by every new thread.
+
+        :param args: The arguments of the profile function, ignored.
+        :type args: Any
+        """
+        import cProfile
+
+        profile: cProfile.Profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: the profile of the main thread covers every thread
+            return
+        with self.lock:
+            self.profiles.append(profile)
+
+    def stop(self, path: str) -> None:
+        """
+        Stops profiling, writes the stats of all the threads and prints the functions
+        taking the most cumulative time.
+
+        :param path: The path to the stats file, read with python -m pstats.
+        :type path: str
+        """
+        import pstats
+
+        threading.setprofile(None)
+        with self.lock:
+            profiles: List["cProfile.Profile"] = list(self.profiles)
+        profiles[0].disable()
+        stats: pstats.Stats = pstats.Stats(profiles[0], stream=sys.stderr)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(path)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_LINES)
+        logger.info(f"Profile written to {path}, read it with python -m pstats {path}")
@@ -0,0 +1,71 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from atomic_file import get_cache_file, read_cache, write_cache
+from matcher import TriageMatcher
+
+CACHE_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+root: Path = Path(__file__).parent.parent
+
+# The matchers loaded by this process, with the modification time and size of their file
+matchers: Dict[str, Tuple[int, int, TriageMatcher]] = {}
+
+
+def load_matcher(
+    triage_file_path: str, cache_dir: Optional[Path] = None
+) -> TriageMatcher:
+    """
+    Returns the compiled matcher of a triage file, reusing the matcher already loaded by
+    this process or the on-disk cache when the triage file did not change since it was
+    compiled.
+
+    The cache entry is keyed by the path of the triage file and validated against its
+    modification time and the hash of its content.
+
+    :param triage_file_path: The path to the JSON file containing triages.
+    :type triage_file_path: str
+    :param cache_dir: The directory of the cache, build/cache/triage by default.
+    :type cache_dir: Optional[Path]
+    :return: The compiled matcher of the triage file.
+    :rtype: TriageMatcher
+    :raises Exception: If the JSON file is invalid.
+    """
+    path: str = os.path.abspath(triage_file_path)
+    stat: os.stat_result = os.stat(path)
+    loaded: Optional[Tuple[int, int, TriageMatcher]] = matchers.get(path)
+    if loaded and loaded[:2] == (stat.st_mtime_ns, stat.st_size):
+        return loaded[2]
+    cache_file: Path = get_cache_file(path, cache_dir or root / "build/cache/triage")
+    with open(path, "rb") as f:
+        mtime_ns: int = os.fstat(f.fileno()).st_mtime_ns
+        content: bytes = f.read()
+    content_hash: str = hashlib.sha256(content).hexdigest()
+    key: Dict[str, Any] = {
+        "version": CACHE_VERSION,
+        "path": path,
+        "mtime_ns": mtime_ns,
+        "content_hash": content_hash,
+    }
+
+    entry: Optional[Dict[str, Any]] = read_cache(cache_file, key)
+    if entry:
+        logger.debug(f"Loaded compiled triages from cache: {cache_file}")
+        matcher: TriageMatcher = entry["matcher"]
+        matchers[path] = (mtime_ns, len(content), matcher)
+        return matcher
+
+    try:
+        triages: Dict[str, str] = json.loads(content)
+    except json.JSONDecodeError as e:
+        raise Exception(f"Invalid JSON file: {e}")
+    matcher = TriageMatcher(triages)
+    write_cache(cache_file, {**key, "matcher": matcher})
+    matchers[path] = (mtime_ns, len(content), matcher)
+    return matcher
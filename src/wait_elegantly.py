@@ -1,50 +1,219 @@
 import logging
+import os
 import time
-from argparse import ArgumentParser
+from argparse import ArgumentParser, Namespace
+from dataclasses import replace
 from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Type
 
-import yaml
+from checkpoint import Checkpoint
+from command import RunOptions
+from config_cache import load_config_scheduler
+from file_watcher import DEBOUNCE
+from history import HISTORY_WINDOW, History, open_history
+from log_store import COMPRESSIONS, NONE
+from renderer import AUTO, DEFAULT_FPS, DISPLAYS, STATUS, STATUS_INTERVAL
+from renderer import Renderer, RendererHandler
+from report import print_report
+from scheduler import Scheduler
+from tracing import Profiler, Tracer, span
 
-from command import COMMANDS_KEY
-from command import Command
+LOG_FORMAT = "%(asctime)s %(levelname)-8s %(message)s"
+LOG_DATE_FORMAT = "%H:%M:%S"
+PIPELINE = "pipeline"
 
 logger = logging.getLogger(__name__)
 
 
-def wait_elegantly(config: str, triage: str, granular: bool) -> None:
+def wait_elegantly(config: str, options: RunOptions) -> None:
     """
     Executes a series of commands specified in a configuration file and reports progress.
 
     :param config: The path to the configuration file in YAML format.
     :type config: str
-    :param triage: The path to the triage file containing error resolutions.
-    :type triage: str
-    :param granular: Whether to use a granular progress bar.
-    :type granular: bool
+    :param options: The options of the run.
+    :type options: RunOptions
     """
     logger.debug(f"Loading yaml configuration file: {config}")
-    if triage:
-        logger.debug(f"Using triage file: {triage}")
+    if options.triage_file:
+        logger.debug(f"Using triage file: {options.triage_file}")
     else:
         logger.debug("No triage file given")
-    with open(config, "r") as f:
-        data = yaml.safe_load(f)
+    with span(options.tracer, "config load", PIPELINE):
+        scheduler: Scheduler = load_config_scheduler(config)
+    start_time = time.time()
+    with span(options.tracer, "pipeline", PIPELINE):
+        scheduler.run(options)
+
+    total_time = str(timedelta(seconds=round(time.time() - start_time)))
+
+    logger.info(f"Total time: {total_time}")
+
+
+async def wait_elegantly_async(config: str, options: RunOptions) -> None:
+    """
+    Executes a series of commands specified in a configuration file on the running event
+    loop, reporting progress to the callback of the options.
+
+    :param config: The path to the configuration file in YAML format.
+    :type config: str
+    :param options: The options of the run.
+    :type options: RunOptions
+    :raises RuntimeError: If any of the commands failed.
+    """
+    logger.debug(f"Loading yaml configuration file: {config}")
+    with span(options.tracer, "config load", PIPELINE):
+        scheduler: Scheduler = load_config_scheduler(config)
     start_time = time.time()
-    [Command(command).run(triage, granular) for command in data[COMMANDS_KEY]]
+    with span(options.tracer, "pipeline", PIPELINE):
+        await scheduler.run_async(options)
 
     total_time = str(timedelta(seconds=round(time.time() - start_time)))
 
     logger.info(f"Total time: {total_time}")
 
 
-def args_parser() -> ArgumentParser:
+async def watch(config: str, options: RunOptions, debounce: float = DEBOUNCE) -> None:
+    """
+    Executes the commands specified in a configuration file, then executes again the
+    commands whose inputs changed and the commands depending on them after every burst
+    of changes, until cancelled.
+
+    A run is cancelled as soon as a change affects one of its commands, which run again
+    with the affected ones. The commands that failed or did not run are run again with
+    the commands affected by the next change.
+
+    :param config: The path to the configuration file in YAML format.
+    :type config: str
+    :param options: The options of the runs, the checkpoint only being used by the first one.
+    :type options: RunOptions
+    :param debounce: The number of seconds without any change ending a burst of changes.
+    :type debounce: float
+    """
+    import asyncio
+
+    from file_watcher import open_watcher
+
+    with span(options.tracer, "config load", PIPELINE):
+        scheduler: Scheduler = load_config_scheduler(config)
+    build: str = os.path.relpath(Path(__file__).parent.parent / "build")
+    watcher = open_watcher(
+        [pattern for command in scheduler.commands for pattern in command.inputs],
+        [pattern for command in scheduler.commands for pattern in command.outputs]
+        + [os.path.join(build, "**")],
+    )
+    queued: Set[str] = {command.id for command in scheduler.commands}
+    running: Set[str] = set()
+    unfinished: Set[str] = set()
+    run: Optional[asyncio.Task[None]] = None
+    changes: Optional[asyncio.Future[Set[str]]] = None
+    try:
+        while True:
+            if run is None and queued:
+                running, queued = queued, set()
+                run = asyncio.create_task(run_commands(scheduler, options, running))
+                options = replace(options, checkpoint=None)
+            if changes is None:
+                changes = asyncio.ensure_future(
+                    asyncio.to_thread(watcher.wait, debounce)
+                )
+            waiting: Set[asyncio.Future[Any]] = (
+                {changes} if run is None else {changes, run}
+            )
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if run in done:
+                run = None
+                unfinished |= running - scheduler.succeeded
+                if not queued:
+                    logger.info("Watching the inputs for changes, Ctrl-C to stop")
+            if changes not in done:
+                continue
+            affected: Set[str] = scheduler.affected(changes.result())
+            changes = None
+            if not affected:
+                continue
+            logger.info(f"Inputs changed, running again: {', '.join(sorted(affected))}")
+            queued |= affected | unfinished
+            unfinished = set()
+            if run and affected & running:
+                logger.info("Cancelling the run outdated by the changes")
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+                run = None
+                queued |= running - scheduler.succeeded
+    finally:
+        watcher.close()
+        if run:
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+
+
+async def run_commands(
+    scheduler: Scheduler, options: RunOptions, only: Set[str]
+) -> None:
+    """
+    Executes some of the commands of a watched configuration, logging their failure
+    instead of raising it.
+
+    :param scheduler: The scheduler of the configuration.
+    :type scheduler: Scheduler
+    :param options: The options of the run.
+    :type options: RunOptions
+    :param only: The ids of the commands to run, the other ones being considered successful.
+    :type only: Set[str]
+    """
+    start_time = time.time()
+    try:
+        with span(options.tracer, "pipeline", PIPELINE):
+            await scheduler.run_async(options, only)
+    except RuntimeError as e:
+        logger.error(str(e))
+
+    total_time = str(timedelta(seconds=round(time.time() - start_time)))
+
+    logger.info(f"Total time: {total_time}")
+
+
+def report(config: str, options: RunOptions) -> None:
+    """
+    Prints the previous runs of the commands specified in a configuration file.
+
+    :param config: The path to the configuration file in YAML format.
+    :type config: str
+    :param options: The options of the run, giving the history to report on.
+    :type options: RunOptions
+    """
+    scheduler: Scheduler = load_config_scheduler(config)
+    print_report(scheduler.commands, options.history, options.history_window)
+
+
+def load_config(config: str) -> Dict[str, Any]:
+    """
+    Loads a configuration file.
+
+    :param config: The path to the configuration file in YAML format.
+    :type config: str
+    :return: The parsed configuration.
+    :rtype: Dict[str, Any]
+    """
+    import yaml
+
+    with open(config, "r") as f:
+        data: Dict[str, Any] = yaml.safe_load(f)
+    return data
+
+
+def args_parser(parser_class: Type[ArgumentParser] = ArgumentParser) -> ArgumentParser:
     """
     Parses command line arguments.
 
+    :param parser_class: The class of the parser.
+    :type parser_class: Type[ArgumentParser]
     :return: An ArgumentParser object containing parsed command line arguments.
     :rtype: ArgumentParser
     """
-    arg_parser: ArgumentParser = ArgumentParser(
+    arg_parser: ArgumentParser = parser_class(
         description="Wait elegantly while commands executes"
     )
     arg_parser.add_argument("config", type=str, help="Path to a config yaml file")
@@ -55,23 +224,220 @@ def args_parser() -> ArgumentParser:
         "-v", "--verbose", action="store_true", help="Set the log level to DEBUG"
     )
     arg_parser.add_argument(
-        "-g", "--granular", action="store_true", help="Set progress bar to granular"
+        "-g",
+        "--granular",
+        action="store_true",
+        help="Set progress bar to granular, implies --display bars",
+    )
+    arg_parser.add_argument(
+        "-l",
+        "--live-triage",
+        action="store_true",
+        help="Look for known errors while the commands are running",
+    )
+    arg_parser.add_argument(
+        "-r",
+        "--reverse-triage",
+        action="store_true",
+        help="Look for known errors from the end of the log of a failed command",
+    )
+    arg_parser.add_argument(
+        "--live-output",
+        action="store_true",
+        help="Show the output of the commands while they run, with status lines as progress",
+    )
+    arg_parser.add_argument(
+        "--history",
+        choices=["sqlite", "text"],
+        default="sqlite",
+        help="Storage of the previous runs",
+    )
+    arg_parser.add_argument(
+        "--history-window",
+        type=int,
+        default=HISTORY_WINDOW,
+        help="Number of previous runs used to estimate the time of a command",
+    )
+    arg_parser.add_argument(
+        "--compress",
+        choices=COMPRESSIONS,
+        default=NONE,
+        help="Compress the logs as they are written, zstd needs the zstandard package",
+    )
+    arg_parser.add_argument(
+        "--keep-logs",
+        type=int,
+        default=0,
+        help="Number of logs kept per command, 0 to keep them all",
+    )
+    arg_parser.add_argument(
+        "--max-log-mb",
+        type=int,
+        default=0,
+        help="Maximum total size of the logs in MB, 0 for no limit",
+    )
+    arg_parser.add_argument(
+        "--timeout-factor",
+        type=float,
+        default=0,
+        help="Stop the commands running longer than this multiple of their p95 duration",
+    )
+    arg_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip the commands completed by the previous run of the configuration",
+    )
+    arg_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Run the commands even if their inputs did not change",
+    )
+    arg_parser.add_argument(
+        "--display",
+        choices=["bars"] + DISPLAYS,
+        default=None,
+        help="How to show the progress: a bar per command, the running commands on a "
+        "terminal (multi), a single line, or periodic status lines (auto chooses between "
+        "multi and status, the default without --granular)",
+    )
+    arg_parser.add_argument(
+        "--fps",
+        type=float,
+        default=DEFAULT_FPS,
+        help="Maximum number of redraws per second of the progress on a terminal",
+    )
+    arg_parser.add_argument(
+        "--status-interval",
+        type=float,
+        default=STATUS_INTERVAL,
+        help="Number of seconds between two status lines",
+    )
+    arg_parser.add_argument(
+        "--trace",
+        type=str,
+        metavar="PATH",
+        help="Write a timeline of the phases of the run to this file, to open with "
+        "Perfetto or chrome://tracing",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        type=str,
+        metavar="PATH",
+        help="Profile wait_elegantly.py itself with cProfile and write the stats to this "
+        "file, to read with python -m pstats",
+    )
+    arg_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running the commands whose inputs change, and the commands depending "
+        "on them, until interrupted",
+    )
+    arg_parser.add_argument(
+        "--debounce",
+        type=float,
+        default=DEBOUNCE,
+        help="Number of seconds without any change to the inputs before running again "
+        "with --watch",
+    )
+    arg_parser.add_argument(
+        "--report",
+        action="store_true",
+        help="Show the duration and resource usage of the previous runs instead of running",
     )
     return arg_parser
 
 
+def get_run_options(args: Namespace, history: Optional[History] = None) -> RunOptions:
+    """
+    Returns the options of the run given on the command line.
+
+    :param args: The parsed command line arguments.
+    :type args: Namespace
+    :param history: The history already opened, opened from the arguments if not given.
+    :type history: Optional[History]
+    :return: The options of the run.
+    :rtype: RunOptions
+    """
+    return RunOptions(
+        triage_file=args.triage or "",
+        granular=args.granular,
+        live_triage=args.live_triage,
+        reverse_triage=args.reverse_triage,
+        history=history or open_history(args.history),
+        history_window=args.history_window,
+        cache=not args.no_cache,
+        compression=args.compress,
+        keep_logs=args.keep_logs,
+        max_log_bytes=args.max_log_mb * 1024 * 1024,
+        timeout_factor=args.timeout_factor,
+        tracer=Tracer() if args.trace else None,
+        checkpoint=Checkpoint(args.config, args.resume),
+        config=os.path.abspath(args.config),
+        live_output=args.live_output,
+    )
+
+
+def get_renderer(args: Namespace) -> Optional[Renderer]:
+    """
+    Returns the renderer of the progress chosen on the command line.
+
+    :param args: The parsed command line arguments.
+    :type args: Namespace
+    :return: The renderer, or None to draw a progress bar per command. Only status lines are written when the output is shown, so they do not garble it.
+    :rtype: Optional[Renderer]
+    """
+    display: str = args.display or ("bars" if args.granular else AUTO)
+    if args.live_output and not args.report:
+        display = STATUS
+    if args.granular and display != "bars" and not args.report:
+        logger.warning(f"--granular is ignored with the {display} display")
+    if display == "bars" or args.report:
+        return None
+    return Renderer(display=display, fps=args.fps, status_interval=args.status_interval)
+
+
 if __name__ == "__main__":
     parser: ArgumentParser = args_parser()
     args = parser.parse_args()
+    profiler: Optional[Profiler] = None
+    if args.profile:
+        profiler = Profiler()
+        profiler.start()
     log_level = logging.INFO
     if args.verbose:
         log_level = logging.DEBUG
+    renderer: Optional[Renderer] = get_renderer(args)
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if renderer and renderer.display != STATUS:
+        handlers = [RendererHandler(renderer)]
     logging.basicConfig(
-        format="%(asctime)s %(levelname)-8s %(message)s",
+        format=LOG_FORMAT,
         level=log_level,
-        datefmt="%H:%M:%S",
+        datefmt=LOG_DATE_FORMAT,
+        handlers=handlers,
     )
     config_file: str = args.config
-    triage_file: str = args.triage
-    granular_bar: bool = args.granular
-    wait_elegantly(config_file, triage_file, granular_bar)
+    options: RunOptions = get_run_options(args)
+    if args.report:
+        report(config_file, options)
+    else:
+        if renderer:
+            options.on_progress = renderer.update
+            renderer.tracer = options.tracer
+        try:
+            if args.watch:
+                import asyncio
+
+                try:
+                    asyncio.run(watch(config_file, options, args.debounce))
+                except KeyboardInterrupt:
+                    logger.info("Stopped watching")
+            else:
+                wait_elegantly(config_file, options)
+        finally:
+            if renderer:
+                renderer.close()
+            if options.tracer:
+                options.tracer.save(args.trace)
+            if profiler:
+                profiler.stop(args.profile)
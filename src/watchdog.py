@@ -0,0 +1,86 @@
+import logging
+import signal
+import time
+from typing import Optional
+
+from exit_waiter import ExitWaiter
+from log_pump import LogPump
+
+KILL_GRACE = 10.0
+
+logger = logging.getLogger(__name__)
+
+
+class Watchdog:
+    def __init__(
+        self,
+        name: str,
+        waiter: ExitWaiter,
+        output: LogPump,
+        timeout: float = 0,
+        stall_timeout: float = 0,
+        kill_grace: float = KILL_GRACE,
+    ):
+        """
+        Initializes a Watchdog object stopping a command that runs for too long or stops
+        writing output.
+
+        The whole process group of the command is sent SIGTERM, then SIGKILL if it is
+        still running kill_grace seconds later. The processes it leaves behind are
+        killed by the waiter when it exits.
+
+        :param name: The name of the command.
+        :type name: str
+        :param waiter: The waiter of the process running the command.
+        :type waiter: ExitWaiter
+        :param output: The pump copying the output of the command.
+        :type output: LogPump
+        :param timeout: The maximum number of seconds the command may run, 0 for no limit.
+        :type timeout: float
+        :param stall_timeout: The maximum number of seconds without output, 0 for no limit.
+        :type stall_timeout: float
+        :param kill_grace: The number of seconds between SIGTERM and SIGKILL.
+        :type kill_grace: float
+        """
+        self.name: str = name
+        self.waiter: ExitWaiter = waiter
+        self.output: LogPump = output
+        self.timeout: float = timeout
+        self.stall_timeout: float = stall_timeout
+        self.kill_grace: float = kill_grace
+        self.start_time: float = time.monotonic()
+        self.stop_time: Optional[float] = None
+        self.killed: bool = False
+        self.reason: str = ""
+
+    def check(self) -> None:
+        """
+        Stops the command if it timed out or stalled, and kills it if it did not stop
+        in time. Called periodically while the command runs.
+        """
+        if self.waiter.exited.is_set():
+            return
+        now: float = time.monotonic()
+        if self.stop_time is not None:
+            if not self.killed and now - self.stop_time >= self.kill_grace:
+                logger.info(f"Killing command '{self.name}', still running")
+                self.killed = True
+                self.waiter.signal(signal.SIGKILL, True)
+        elif self.timeout and now - self.start_time >= self.timeout:
+            self.stop(f"timed out after {self.timeout:g}s")
+        elif self.stall_timeout and now - self.output.last_output >= self.stall_timeout:
+            self.stop(f"stalled, no output for {self.stall_timeout:g}s")
+
+    def stop(self, reason: str) -> None:
+        """
+        Sends SIGTERM to the command, unless it is already being stopped.
+
+        :param reason: Why the command is stopped.
+        :type reason: str
+        """
+        if self.stop_time is not None or self.waiter.exited.is_set():
+            return
+        logger.info(f"Stopping command '{self.name}', {reason}")
+        self.reason = reason
+        self.stop_time = time.monotonic()
+        self.waiter.signal(signal.SIGTERM, True)
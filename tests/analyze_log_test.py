@@ -1,6 +1,17 @@
+import gzip
+from pathlib import Path
+
 import pytest
 
-from src.analyze_log import analyze_log_file, check_valid_file, load_logs, load_triages
+from src.analyze_log import (
+    StreamingTriage,
+    analyze_log_file,
+    analyze_log_tail,
+    check_valid_file,
+    iter_logs,
+    load_logs,
+    load_triages,
+)
 
 
 def test_analysis_empty() -> None:
@@ -40,3 +51,73 @@ def test_load_triages() -> None:
     assert (
         triages["[ERROR] Ohh an error happened"] == "No worries. Here is a workaround!"
     )
+
+
+def test_streaming_triage() -> None:
+    triage = StreamingTriage("tests/assets/sample_triage_file.json")
+    assert not triage.feed(["[INFO] Starting"])
+    assert triage.feed(["[ERROR] Ohh an error happened. Wonder what is it."])
+    assert triage.feed(["[ERROR] Ohh an error happened again."])
+    assert triage.finish() == (
+        "[ERROR] Ohh an error happened. Wonder what is it.",
+        "No worries. Here is a workaround!",
+    )
+
+
+def test_streaming_triage_unknown_error() -> None:
+    triage = StreamingTriage("tests/assets/sample_triage_file.json")
+    triage.feed(["[INFO] Starting"])
+    assert triage.finish() == ("", "")
+
+
+def test_iter_logs_reversed(tmp_path: Path) -> None:
+    log_file = tmp_path / "log.txt"
+    log_file.write_text("first\nsecond\n\nlast\n")
+    assert list(iter_logs(str(log_file), reverse=True)) == [
+        "last",
+        "",
+        "second",
+        "first",
+    ]
+    log_file.write_text("only")
+    assert list(iter_logs(str(log_file), reverse=True)) == ["only"]
+    log_file.write_text("")
+    assert list(iter_logs(str(log_file), reverse=True)) == []
+
+
+def test_analysis_reverse_finds_last_error(tmp_path: Path) -> None:
+    log_file = tmp_path / "log.txt"
+    log_file.write_text(
+        "[ERROR] Ohh an error happened early\n[ERROR] Ohh an error happened late\n"
+    )
+    result = analyze_log_file(
+        str(log_file), "tests/assets/sample_triage_file.json", reverse=True
+    )
+    assert result[0] == "[ERROR] Ohh an error happened late"
+
+
+def test_analysis_of_compressed_log(tmp_path: Path) -> None:
+    log = tmp_path / "build.txt.gz"
+    with gzip.open(log, "wb") as f:
+        f.write(Path("tests/assets/sample_log_file_with_error.txt").read_bytes())
+    result = analyze_log_file(str(log), "tests/assets/sample_triage_file.json")
+    assert result[1] == "No worries. Here is a workaround!"
+    assert list(iter_logs(str(log), True)) == list(iter_logs(str(log)))[::-1]
+
+
+def test_analysis_of_tail() -> None:
+    tail = ["[INFO] building", "[ERROR] Ohh an error happened. Wonder what is it."]
+    result = analyze_log_tail(
+        tail, "does_not_exist.txt", "tests/assets/sample_triage_file.json"
+    )
+    assert result[1] == "No worries. Here is a workaround!"
+
+
+def test_analysis_of_tail_falls_back_to_log() -> None:
+    result = analyze_log_tail(
+        ["[INFO] done"],
+        "tests/assets/sample_log_file_with_error.txt",
+        "tests/assets/sample_triage_file.json",
+        True,
+    )
+    assert result[1] == "No worries. Here is a workaround!"
@@ -0,0 +1,74 @@
+import gzip
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from src.batch_analysis import (
+    analyze_logs,
+    filter_failed_logs,
+    find_logs,
+    format_batch_report,
+)
+from src.history import HistoryRecord, SqliteHistory
+
+TRIAGE = "tests/assets/sample_triage_file.json"
+ERROR = "[ERROR] Ohh an error happened"
+
+
+def write_logs(log_dir: Path) -> List[str]:
+    log_dir.mkdir()
+    logs = {
+        "build_10-00-00_01-05-2026.txt": f"[INFO] start\n{ERROR}\n{ERROR} again\n",
+        "build_11-00-00_02-05-2026.txt": "[INFO] start\nboom\n",
+        "test_10-00-00_02-05-2026.txt": f"{ERROR}\n",
+        "test_11-00-00_02-05-2026.txt": "",
+    }
+    for name, content in logs.items():
+        (log_dir / name).write_text(content)
+    (log_dir / "lint_10-00-00_02-05-2026.txt.gz").write_bytes(
+        gzip.compress(f"{ERROR}\n".encode())
+    )
+    (log_dir / "notes.txt").write_text(ERROR)
+    return find_logs(str(log_dir))
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_analyze_logs(tmp_path: Path, jobs: int) -> None:
+    paths = write_logs(tmp_path / "log")
+    assert len(paths) == 5
+
+    report = analyze_logs(paths, TRIAGE, jobs)
+    assert report.logs == 5
+    assert report.hits == {ERROR: 4}
+    assert report.logs_per_error == {ERROR: 3}
+    assert report.per_command == {
+        "build": {ERROR: 1},
+        "test": {ERROR: 1},
+        "lint": {ERROR: 1},
+    }
+    assert report.per_day == {"2026-05-01": {ERROR: 1}, "2026-05-02": {ERROR: 2}}
+    assert [Path(path).name for path in report.unknown] == [
+        "build_11-00-00_02-05-2026.txt",
+        "test_11-00-00_02-05-2026.txt",
+    ]
+
+    lines = format_batch_report(report)
+    assert lines[0] == "5 logs, 3 with known errors, 2 without"
+    assert lines[3] == f"{3:>7} {4:>7}  {ERROR}"
+    assert lines[-3:] == ["Unknown errors"] + [f"  {path}" for path in report.unknown]
+
+
+def test_find_logs_glob(tmp_path: Path) -> None:
+    write_logs(tmp_path / "log")
+    assert len(find_logs(str(tmp_path / "**" / "*.txt"))) == 5
+    with pytest.raises(ValueError):
+        find_logs(str(tmp_path / "*.log"))
+
+
+def test_filter_failed_logs(tmp_path: Path) -> None:
+    paths = write_logs(tmp_path / "log")
+    history = SqliteHistory(tmp_path / "history.db")
+    history.add("build", HistoryRecord(0, 1, 0, "", paths[0]))
+    history.add("build", HistoryRecord(0, 1, 2, "", paths[1]))
+    assert filter_failed_logs(paths, history) == [paths[1]]
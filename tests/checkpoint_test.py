@@ -0,0 +1,82 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+from src.checkpoint import Checkpoint
+from src.command import RunOptions
+from src.matrix import load_commands
+from src.scheduler import Scheduler
+
+CONFIG = "commands: []\n"
+
+
+def run_pipeline(
+    tmp_path: Path,
+    values: List[str],
+    resume: bool,
+    fail: str = "",
+    depends_on: Optional[Dict[str, List[str]]] = None,
+) -> List[str]:
+    commands = load_commands(
+        [
+            {
+                "name": cmd_id,
+                "id": cmd_id,
+                "values": [value],
+                "depends_on": (depends_on or {}).get(cmd_id, []),
+            }
+            for cmd_id, value in zip(("a", "b", "c"), values)
+        ]
+    )
+    checkpoint = Checkpoint(str(tmp_path / "config.yaml"), resume, tmp_path / "cp")
+    order: List[str] = []
+
+    def run(self: Any, *args: Any) -> None:
+        order.append(self.id)
+        if self.id == fail:
+            raise RuntimeError(f"Command '{self.id}' FAILED")
+
+    with patch("command.Command.run", run):
+        try:
+            Scheduler(commands).run(RunOptions(checkpoint=checkpoint))
+        except RuntimeError:
+            pass
+    return order
+
+
+def test_resume_skips_completed_commands(tmp_path: Path) -> None:
+    (tmp_path / "config.yaml").write_text(CONFIG)
+    values = ["true", "true", "true"]
+    assert run_pipeline(tmp_path, values, False, fail="b") == ["a", "b"]
+    assert run_pipeline(tmp_path, values, True, fail="c") == ["b", "c"]
+    assert run_pipeline(tmp_path, values, True) == ["c"]
+    assert not list((tmp_path / "cp").iterdir())
+    assert run_pipeline(tmp_path, values, True) == ["a", "b", "c"]
+
+
+def test_resume_without_flag_runs_everything(tmp_path: Path) -> None:
+    (tmp_path / "config.yaml").write_text(CONFIG)
+    values = ["true", "true", "true"]
+    run_pipeline(tmp_path, values, False, fail="c")
+    assert run_pipeline(tmp_path, values, False, fail="c") == ["a", "b", "c"]
+
+
+def test_changed_command_runs_again(tmp_path: Path) -> None:
+    (tmp_path / "config.yaml").write_text(CONFIG)
+    run_pipeline(tmp_path, ["true", "true", "true"], False, fail="c")
+    assert run_pipeline(tmp_path, ["echo", "true", "true"], True) == ["a", "c"]
+
+
+def test_dependents_of_changed_command_run_again(tmp_path: Path) -> None:
+    (tmp_path / "config.yaml").write_text(CONFIG)
+    depends_on = {"b": ["a"]}
+    run_pipeline(tmp_path, ["true", "true", "true"], False, "c", depends_on)
+    order = run_pipeline(tmp_path, ["echo", "true", "true"], True, "", depends_on)
+    assert order == ["a", "b", "c"]
+
+
+def test_unrelated_changes_keep_completed_commands(tmp_path: Path) -> None:
+    (tmp_path / "config.yaml").write_text(CONFIG)
+    run_pipeline(tmp_path, ["true", "true", "true"], False, fail="c")
+    (tmp_path / "config.yaml").write_text(CONFIG + "# changed\n")
+    assert run_pipeline(tmp_path, ["true", "true", "false"], True) == ["c"]
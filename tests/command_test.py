@@ -1,8 +1,24 @@
-from unittest.mock import patch
+import asyncio
+import gzip
+import time
+from pathlib import Path
+from subprocess import Popen
+from typing import List
+from unittest.mock import MagicMock, patch
 
 import pytest
 
-from src.command import Command, get_cmd_name, get_cmd_id, get_log_file_path
+from src.estimator import Estimator
+from src.history import SqliteHistory
+from src.progress import ProgressEvent
+from src.command import (
+    Command,
+    RunOptions,
+    get_cmd_name,
+    get_cmd_id,
+    get_log_file_path,
+    update_progress,
+)
 
 
 def test_get_cmd_name() -> None:
@@ -31,29 +47,219 @@ def test_get_cmd_id() -> None:
         get_cmd_id(command)
 
 
-def test_run_command_success() -> None:
-    command = {
-        "name": "test_command",
-        "id": "test_command",
-        "values": ["echo", "hello"],
-    }
-    cmd = Command(command)
-    log_file_path = get_log_file_path("test_run_command_success.txt")
-    with patch("subprocess.Popen"):
-        process = cmd.run_command(log_file_path)
-        process.wait()
-        assert process.returncode == 0
+def test_update_progress_returns_on_exit() -> None:
+    progress = MagicMock()
+    start_time = time.monotonic()
+    process = Popen(["true"])
+    update_progress(process, progress)
+    assert time.monotonic() - start_time < 0.5
+    assert process.returncode == 0
+    progress.update.assert_not_called()
 
 
-def test_run_command_failure() -> None:
+def test_update_progress_ticks_while_running() -> None:
+    progress = MagicMock()
+    process = Popen(["sleep", "0.35"])
+    update_progress(process, progress, interval=0.1)
+    assert 2 <= progress.update.call_count <= 4
+
+
+def test_run_stops_on_known_error(tmp_path: Path) -> None:
     command = {
         "name": "test_command",
-        "id": "test_command",
-        "values": ["ls", "/invalid/path"],
+        "id": "test_fail_fast_on_triage",
+        "values": [
+            "sh",
+            "-c",
+            "echo '[ERROR] Ohh an error happened' && sleep 30",
+        ],
+        "fail_fast_on_triage": True,
     }
     cmd = Command(command)
-    log_file_path = get_log_file_path("test_run_command_failure.txt")
-    with patch("subprocess.Popen"):
-        process = cmd.run_command(log_file_path)
-        process.wait()
-        assert process.returncode != 0
+    start_time = time.monotonic()
+    with pytest.raises(RuntimeError):
+        cmd.run(
+            RunOptions(
+                "tests/assets/sample_triage_file.json",
+                history=SqliteHistory(tmp_path / "history.db"),
+            )
+        )
+    assert time.monotonic() - start_time < 10
+
+
+def test_run_async_reports_progress(tmp_path: Path) -> None:
+    cmd = Command(
+        {
+            "name": "test_command",
+            "id": "test_run_async",
+            "values": ["sh", "-c", "echo hello && sleep 0.3"],
+        }
+    )
+    events: List[ProgressEvent] = []
+    options = RunOptions(
+        history=SqliteHistory(tmp_path / "history.db"), on_progress=events.append
+    )
+    asyncio.run(cmd.run_async(options, interval=0.1))
+    states = [event.state for event in events]
+    assert states[0] == "started"
+    assert "running" in states
+    assert states[-1] == "succeeded"
+    assert events[-1].fraction == 1.0
+    records = options.history.records("test_run_async")
+    assert len(records) == 1
+    assert Path(records[0].log).read_text() == "hello\n"
+
+
+def test_run_async_stops_on_known_error(tmp_path: Path) -> None:
+    cmd = Command(
+        {
+            "name": "test_command",
+            "id": "test_run_async_fail_fast",
+            "values": ["sh", "-c", "echo '[ERROR] Ohh an error happened'; sleep 30"],
+            "fail_fast_on_triage": True,
+        }
+    )
+    events: List[ProgressEvent] = []
+    options = RunOptions(
+        "tests/assets/sample_triage_file.json",
+        history=SqliteHistory(tmp_path / "history.db"),
+        on_progress=events.append,
+    )
+    start_time = time.monotonic()
+    with pytest.raises(RuntimeError):
+        asyncio.run(cmd.run_async(options))
+    assert time.monotonic() - start_time < 10
+    assert events[-1].state == "failed"
+
+
+def test_run_skips_up_to_date_command(tmp_path: Path) -> None:
+    (tmp_path / "input.txt").write_text("1")
+    cmd = Command(
+        {
+            "name": "test_command",
+            "id": "test_run_skips_up_to_date",
+            "values": ["sh", "-c", f"cp {tmp_path}/input.txt {tmp_path}/output.txt"],
+            "inputs": [str(tmp_path / "*.txt")],
+            "outputs": str(tmp_path / "output.txt"),
+        }
+    )
+    options = RunOptions(history=SqliteHistory(tmp_path / "history.db"))
+    try:
+        assert not cmd.run(options)
+        assert cmd.run(options)
+        (tmp_path / "input.txt").write_text("2")
+        assert not cmd.run(options)
+        assert not cmd.run(RunOptions(history=options.history, cache=False))
+        assert len(options.history.times("test_run_skips_up_to_date")) == 3
+    finally:
+        cmd.result_cache(options).path.unlink()  # type: ignore[union-attr]
+
+
+def test_run_with_compressed_log(tmp_path: Path) -> None:
+    cmd = Command(
+        {
+            "name": "test_command",
+            "id": "test_run_with_compressed_log",
+            "values": ["sh", "-c", "echo '[ERROR] Ohh an error happened'; exit 1"],
+        }
+    )
+    options = RunOptions(
+        "tests/assets/sample_triage_file.json",
+        history=SqliteHistory(tmp_path / "history.db"),
+        compression="gzip",
+        keep_logs=1,
+    )
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            cmd.run(options)
+    records = options.history.records("test_run_with_compressed_log")
+    assert records[-1].log.endswith(".txt.gz")
+    assert gzip.decompress(Path(records[-1].log).read_bytes()).startswith(b"[ERROR]")
+    assert not Path(records[0].log).exists() or records[0].log == records[1].log
+    Path(records[-1].log).unlink()
+
+
+def test_run_failure_shows_last_lines(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    cmd = Command(
+        {
+            "name": "test_command",
+            "id": "test_run_failure_shows_last_lines",
+            "values": [
+                "sh",
+                "-c",
+                "seq 100; echo '[ERROR] Ohh an error happened'; exit 1",
+            ],
+        }
+    )
+    options = RunOptions(
+        "tests/assets/sample_triage_file.json",
+        history=SqliteHistory(tmp_path / "history.db"),
+    )
+    caplog.set_level("INFO")
+    with patch("analyze_log.analyze_log_file") as analyze_log_file:
+        with pytest.raises(RuntimeError):
+            cmd.run(options)
+    analyze_log_file.assert_not_called()
+    assert "Last 50 lines of the output:\n    52\n" in caplog.text
+    assert "No worries. Here is a workaround!" in caplog.text
+    Path(options.history.records("test_run_failure_shows_last_lines")[-1].log).unlink()
+
+
+def test_run_retries_with_backoff(tmp_path: Path) -> None:
+    counter = tmp_path / "attempts"
+    cmd = Command(
+        {
+            "name": "test_command",
+            "id": "test_run_retries_with_backoff",
+            "values": [
+                "sh",
+                "-c",
+                f"echo x >> {counter}; test $(wc -l < {counter}) = 3",
+            ],
+            "retries": 3,
+            "retry_delay": 2,
+        }
+    )
+    options = RunOptions(history=SqliteHistory(tmp_path / "history.db"))
+    with patch.object(options.interrupted, "wait", return_value=False) as wait:
+        assert not cmd.run(options)
+    assert [call.args[0] for call in wait.call_args_list] == [2, 4]
+    records = options.history.records("test_run_retries_with_backoff")
+    assert [record.exit_code for record in records] == [1, 1, 0]
+    for log in {record.log for record in records}:
+        Path(log).unlink()
+
+
+def test_run_stops_on_timeout(tmp_path: Path) -> None:
+    cmd = Command(
+        {
+            "name": "test_command",
+            "id": "test_run_stops_on_timeout",
+            "values": ["sleep", "30"],
+            "timeout": 1,
+        }
+    )
+    options = RunOptions(history=SqliteHistory(tmp_path / "history.db"))
+    start_time = time.monotonic()
+    with pytest.raises(RuntimeError, match="timed out after 1s"):
+        cmd.run(options)
+    assert time.monotonic() - start_time < 10
+    Path(options.history.records("test_run_stops_on_timeout")[-1].log).unlink()
+
+
+def test_timeout_from_history() -> None:
+    cmd = Command({"name": "test", "id": "test", "values": ["true"]})
+    options = RunOptions(timeout_factor=2)
+    assert cmd.get_timeout(options, Estimator.from_times([100] * 4)) == 0
+    assert cmd.get_timeout(options, Estimator.from_times([100] * 5)) == 200
+    assert cmd.get_timeout(options, Estimator.from_times([1] * 5)) == 60
+    assert cmd.get_timeout(RunOptions(), Estimator.from_times([100] * 5)) == 0
+
+
+def test_invalid_retries() -> None:
+    with pytest.raises(ValueError):
+        Command({"name": "test", "id": "test", "values": ["true"], "retries": -1})
+    with pytest.raises(ValueError):
+        Command({"name": "test", "id": "test", "values": ["true"], "timeout": "1m"})
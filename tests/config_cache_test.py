@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.atomic_file import get_cache_file
+from src.config_cache import load_config_scheduler
+
+CONFIG = "commands:\n- name: build\n  id: build\n  values: [make]\n"
+
+
+def test_load_config_scheduler_uses_cache(tmp_path: Path) -> None:
+    config = tmp_path / "config.yaml"
+    config.write_text(CONFIG)
+    cache_dir = tmp_path / "cache"
+
+    scheduler = load_config_scheduler(str(config), cache_dir)
+    assert [command.id for command in scheduler.commands] == ["build"]
+    assert get_cache_file(str(config), cache_dir).is_file()
+
+    with patch("yaml.safe_load") as safe_load:
+        cached = load_config_scheduler(str(config), cache_dir)
+        safe_load.assert_not_called()
+    assert [command.values for command in cached.commands] == [["make"]]
+
+
+def test_load_config_scheduler_invalidated_on_change(tmp_path: Path) -> None:
+    config = tmp_path / "config.yaml"
+    config.write_text(CONFIG)
+    cache_dir = tmp_path / "cache"
+    load_config_scheduler(str(config), cache_dir)
+
+    config.write_text(CONFIG.replace("make", "ninja"))
+    stat = config.stat()
+    os.utime(config, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    scheduler = load_config_scheduler(str(config), cache_dir)
+    assert scheduler.commands[0].values == ["ninja"]
+
+
+def test_cached_config_builds_a_new_scheduler(tmp_path: Path) -> None:
+    config = tmp_path / "config.yaml"
+    config.write_text(CONFIG)
+    cache_dir = tmp_path / "cache"
+    scheduler = load_config_scheduler(str(config), cache_dir)
+    scheduler.succeeded.add("build")
+
+    cached = load_config_scheduler(str(config), cache_dir)
+    assert cached is not scheduler
+    assert cached.succeeded == set()
+    assert cached.commands[0] is not scheduler.commands[0]
+
+
+def test_invalid_config_is_not_cached(tmp_path: Path) -> None:
+    config = tmp_path / "config.yaml"
+    config.write_text(CONFIG.replace("id: build", "id: b/uild"))
+    cache_dir = tmp_path / "cache"
+    with pytest.raises(ValueError):
+        load_config_scheduler(str(config), cache_dir)
+    assert not get_cache_file(str(config), cache_dir).exists()
+
+
+def test_startup_does_not_import_heavy_modules() -> None:
+    modules = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, wait_elegantly; print(' '.join(sys.modules))",
+        ],
+        env={**os.environ, "PYTHONPATH": "src"},
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    for module in ("yaml", "progressbar", "asyncio", "analyze_log", "fingerprint"):
+        assert module not in modules
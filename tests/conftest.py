@@ -0,0 +1,30 @@
+import importlib
+from pathlib import Path
+
+import pytest
+
+# The modules writing their logs, histories, checkpoints and caches under build/
+BUILD_MODULES = [
+    "checkpoint",
+    "command",
+    "config_cache",
+    "fingerprint",
+    "history",
+    "milestones",
+    "triage_cache",
+]
+
+
+@pytest.fixture(autouse=True)
+def build_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    Points the build directory of the tested modules to a temporary directory, so that
+    the tests never write into the build directory of the repository.
+
+    The modules are patched both as imported by the tests and as imported by each other.
+    """
+    root: Path = tmp_path / "root"
+    for name in BUILD_MODULES:
+        for module_name in (name, f"src.{name}"):
+            monkeypatch.setattr(importlib.import_module(module_name), "root", root)
+    return root
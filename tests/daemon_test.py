@@ -0,0 +1,136 @@
+import asyncio
+import io
+import json
+import logging
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import pytest
+
+from src.client import run_client
+from src.daemon import ClientLogHandler, Daemon
+from src.history import SqliteHistory
+
+
+def write_config(tmp_path: Path, name: str, values: List[str]) -> Path:
+    config = tmp_path / f"{name}.yaml"
+    config.write_text(
+        f"commands:\n- name: {name}\n  id: {name}\n  values: {values!r}\n".replace(
+            "'", '"'
+        )
+    )
+    return config
+
+
+def run_status_client(args: List[str], socket_path: str) -> Tuple[int, str]:
+    output = io.StringIO()
+    return run_client(args + ["--display", "status"], socket_path, output), (
+        output.getvalue()
+    )
+
+
+def serve(
+    tmp_path: Path,
+    requests: List[List[str]],
+    max_parallel: int = 2,
+    run: Callable[[List[str], str], Tuple[int, str]] = run_status_client,
+) -> List[Tuple[int, str]]:
+    socket_path = str(tmp_path / "daemon.sock")
+    daemon = Daemon(socket_path, max_parallel, SqliteHistory(tmp_path / "history.db"))
+
+    def client(args: List[str]) -> Tuple[int, str]:
+        return run(args, socket_path)
+
+    async def run_clients() -> List[Tuple[int, str]]:
+        started = asyncio.Event()
+        server = asyncio.create_task(daemon.serve(started))
+        await started.wait()
+        results = await asyncio.gather(
+            *(asyncio.to_thread(client, args) for args in requests)
+        )
+        server.cancel()
+        await asyncio.wait({server})
+        return list(results)
+
+    root = logging.getLogger()
+    handler = ClientLogHandler(logging.NullHandler())
+    root.addHandler(handler)
+    level = root.level
+    root.setLevel(logging.DEBUG)
+    try:
+        return asyncio.run(run_clients())
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(level)
+
+
+def test_daemon_runs_config(tmp_path: Path) -> None:
+    config = write_config(tmp_path, "daemon_test_ok", ["echo", "hello"])
+    failing = write_config(tmp_path, "daemon_test_fail", ["false"])
+    results = serve(tmp_path, [[str(config)], [str(failing)], ["--fps", "x"]])
+    assert results[0][0] == 0
+    assert "Command 'daemon_test_ok' SUCCESSFUL" in results[0][1]
+    assert results[1][0] == 1
+    assert "Commands FAILED: daemon_test_fail" in results[1][1]
+    assert results[2][0] == 2
+    assert "error:" in results[2][1]
+    assert not (tmp_path / "daemon.sock").exists()
+
+
+def test_daemon_limits_commands_across_clients(tmp_path: Path) -> None:
+    configs = [
+        write_config(tmp_path, f"daemon_test_sleep{i}", ["sleep", "0.5"])
+        for i in range(2)
+    ]
+    start_time = time.monotonic()
+    results = serve(tmp_path, [[str(config)] for config in configs], 1)
+    assert [code for code, _ in results] == [0, 0]
+    assert time.monotonic() - start_time >= 1
+
+
+def test_daemon_runs_commands_in_client_directory_and_environment(
+    tmp_path: Path,
+) -> None:
+    work = tmp_path / "work"
+    work.mkdir()
+    config = write_config(
+        tmp_path,
+        "daemon_test_env",
+        ["sh", "-c", "pwd > out.txt; echo $DAEMON_TEST_VAR >> out.txt"],
+    )
+
+    def run_elsewhere(args: List[str], socket_path: str) -> Tuple[int, str]:
+        request = {
+            "args": args + ["--display", "status"],
+            "cwd": str(work),
+            "env": {**os.environ, "DAEMON_TEST_VAR": "from client"},
+        }
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            client.sendall(json.dumps(request).encode() + b"\n")
+            messages = [json.loads(line) for line in client.makefile("rb")]
+        output = "".join(message.get("out", "") for message in messages)
+        return messages[-1]["exit"], output
+
+    results = serve(tmp_path, [[str(config)]], run=run_elsewhere)
+    assert results[0][0] == 0, results[0][1]
+    assert (work / "out.txt").read_text().splitlines() == [str(work), "from client"]
+    assert "DAEMON_TEST_VAR" not in os.environ
+
+
+def test_daemon_refuses_second_instance(tmp_path: Path) -> None:
+    socket_path = str(tmp_path / "daemon.sock")
+
+    async def run() -> None:
+        started = asyncio.Event()
+        server = asyncio.create_task(Daemon(socket_path, 1).serve(started))
+        await started.wait()
+        with pytest.raises(ValueError):
+            await Daemon(socket_path, 1).serve()
+        server.cancel()
+        await asyncio.wait({server})
+
+    asyncio.run(run())
@@ -0,0 +1,49 @@
+import json
+import random
+
+from src.estimator import Estimator, P2Quantile
+
+
+def test_p2_quantile_accuracy() -> None:
+    random.seed(0)
+    values = [random.gauss(100, 10) for _ in range(5000)]
+    median = P2Quantile(0.5)
+    p90 = P2Quantile(0.9)
+    for value in values:
+        median.add(value)
+        p90.add(value)
+    values.sort()
+    assert abs(median.value() - values[2500]) < 1
+    assert abs(p90.value() - values[4500]) < 1
+
+
+def test_p2_quantile_few_values() -> None:
+    quantile = P2Quantile(0.5)
+    assert quantile.value() == 0
+    for value in (3, 1, 2):
+        quantile.add(value)
+    assert quantile.value() == 2
+
+
+def test_estimator_rejects_outliers() -> None:
+    estimator = Estimator.from_times([10, 11, 10, 12, 11, 10, 3600, 11])
+    assert estimator.rejected == 1
+    assert estimator.max_time == 12
+    assert estimator.expected() == 11
+    assert estimator.band().startswith("p50-p90: 11s-")
+
+
+def test_estimator_accepts_lasting_slowdown() -> None:
+    estimator = Estimator.from_times([10] * 10 + [100] * 3)
+    assert estimator.rejected == 2
+    assert estimator.max_time == 100
+    assert estimator.expected("ewma") > 10
+
+
+def test_estimator_state_round_trip() -> None:
+    estimator = Estimator.from_times([5, 7, 6, 8, 9, 6])
+    restored = Estimator(json.loads(json.dumps(estimator.state())))
+    restored.add(7)
+    estimator.add(7)
+    assert restored.state() == estimator.state()
+    assert Estimator().expected() == -1
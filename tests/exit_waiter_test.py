@@ -0,0 +1,70 @@
+import asyncio
+import signal
+import time
+from subprocess import Popen
+from unittest.mock import patch
+
+from src.exit_waiter import ExitWaiter
+
+
+def test_wait_returns_when_process_exits() -> None:
+    process = Popen(["true"])
+    waiter = ExitWaiter(process)
+    assert waiter.wait(5)
+    assert process.returncode == 0
+
+
+def test_wait_times_out_while_running() -> None:
+    process = Popen(["sleep", "5"])
+    waiter = ExitWaiter(process)
+    start_time = time.monotonic()
+    assert not waiter.wait(0.1)
+    assert time.monotonic() - start_time < 1
+    process.kill()
+    assert waiter.wait(5)
+
+
+def test_wait_with_thread_fallback() -> None:
+    with patch("os.pidfd_open", side_effect=OSError):
+        process = Popen(["false"])
+        waiter = ExitWaiter(process)
+    assert waiter.selector is None
+    assert waiter.wait(5)
+    assert process.returncode == 1
+
+
+def test_wait_records_resource_usage() -> None:
+    process = Popen(["sh", "-c", "i=0; while [ $i -lt 20000 ]; do i=$((i+1)); done"])
+    waiter = ExitWaiter(process)
+    assert waiter.wait(10)
+    assert waiter.usage is not None
+    assert waiter.usage.cpu_time() > 0
+    assert waiter.usage.max_rss > 0
+
+
+def test_wait_async() -> None:
+    process = Popen(["sleep", "0.2"])
+    waiter = ExitWaiter(process)
+    assert not asyncio.run(waiter.wait_async(0.01))
+    assert asyncio.run(waiter.wait_async(5))
+    assert process.returncode == 0
+    assert waiter.usage is not None
+
+
+def test_wait_async_with_thread_fallback() -> None:
+    with patch("os.pidfd_open", side_effect=OSError):
+        process = Popen(["false"])
+        waiter = ExitWaiter(process)
+    assert asyncio.run(waiter.wait_async(5))
+    assert process.returncode == 1
+
+
+def test_signal_not_sent_once_reaped() -> None:
+    process = Popen(["true"], start_new_session=True)
+    waiter = ExitWaiter(process)
+    assert waiter.wait(5)
+    with patch("os.killpg") as killpg, patch("os.kill") as kill:
+        waiter.signal(signal.SIGKILL, True)
+        waiter.signal(signal.SIGKILL)
+    killpg.assert_not_called()
+    kill.assert_not_called()
@@ -0,0 +1,107 @@
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Set
+
+import pytest
+
+from src.file_watcher import FileWatcher, InotifyWatcher, PollingWatcher
+from src.file_watcher import get_watch_root, matches
+
+
+def open_inotify(patterns: List[str], ignored: List[str]) -> InotifyWatcher:
+    try:
+        return InotifyWatcher(patterns, ignored)
+    except (AttributeError, OSError):
+        pytest.skip("inotify is not available")
+
+
+def open_polling(patterns: List[str], ignored: List[str]) -> FileWatcher:
+    return PollingWatcher(patterns, ignored, interval=0.05)
+
+
+WATCHERS = [open_inotify, open_polling]
+
+
+def write_later(*paths: Path, delay: float = 0.2) -> None:
+    def write() -> None:
+        time.sleep(delay)
+        for path in paths:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(str(time.time()))
+
+    threading.Thread(target=write, daemon=True).start()
+
+
+@pytest.mark.parametrize(
+    "path, pattern, expected",
+    [
+        ("src/a.c", "src/*.c", True),
+        ("src/sub/a.c", "src/*.c", False),
+        ("src/a.c", "src/**/*.c", True),
+        ("src/sub/deep/a.c", "src/**/*.c", True),
+        ("src/a.h", "src/**/*.c", False),
+        ("Makefile", "Makefile", True),
+        ("src/a1.c", "src/a?.c", True),
+        ("src/b.c", "src/[!a].c", True),
+        ("build/log/x.txt", "build/**", True),
+    ],
+)
+def test_matches(path: str, pattern: str, expected: bool) -> None:
+    assert matches(path, pattern) == expected
+
+
+def test_watch_root(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src").mkdir()
+    assert get_watch_root("Makefile") == (".", False)
+    assert get_watch_root("src/*.c") == ("src", False)
+    assert get_watch_root("src/**/*.c") == ("src", True)
+    assert get_watch_root("generated/a.c") == (".", True)
+    assert get_watch_root(str(tmp_path / "src" / "*.c")) == (
+        str(tmp_path / "src"),
+        False,
+    )
+
+
+@pytest.mark.parametrize("open_watcher", WATCHERS)
+def test_changes_are_debounced(
+    tmp_path: Path, open_watcher: Callable[[List[str], List[str]], FileWatcher]
+) -> None:
+    (tmp_path / "src").mkdir()
+    watcher = open_watcher([str(tmp_path / "src" / "**" / "*.c")], [])
+    a, b = tmp_path / "src" / "a.c", tmp_path / "src" / "new" / "b.c"
+    write_later(a, b)
+    changed: Set[str] = watcher.wait(debounce=0.3)
+    watcher.close()
+    assert changed == {str(a), str(b)}
+
+
+@pytest.mark.parametrize("open_watcher", WATCHERS)
+def test_ignored_and_unwatched_files_are_not_reported(
+    tmp_path: Path, open_watcher: Callable[[List[str], List[str]], FileWatcher]
+) -> None:
+    watcher = open_watcher(
+        [str(tmp_path / "*.c"), "$CFLAGS"], [str(tmp_path / "generated.c")]
+    )
+    write_later(tmp_path / "generated.c", tmp_path / "notes.txt")
+    write_later(tmp_path / "a.c", delay=0.5)
+    changed: Set[str] = watcher.wait(debounce=0.1)
+    watcher.close()
+    assert changed == {str(tmp_path / "a.c")}
+
+
+def test_file_watcher_is_abstract() -> None:
+    with pytest.raises(TypeError):
+        FileWatcher([], [])  # type: ignore[abstract]
+
+
+def test_close_stops_waiting(tmp_path: Path) -> None:
+    watcher = open_inotify([str(tmp_path / "*.c")], [])
+    timer = threading.Timer(0.2, watcher.close)
+    timer.start()
+    start_time = time.monotonic()
+    assert watcher.wait() == set()
+    assert time.monotonic() - start_time < 2
+    timer.join()
+    assert watcher.fd == -1
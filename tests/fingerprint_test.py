@@ -0,0 +1,104 @@
+import os
+from pathlib import Path
+from typing import Dict
+from unittest.mock import patch
+
+from src.fingerprint import ResultCache, hash_files
+
+
+def make_cache(tmp_path: Path) -> ResultCache:
+    return ResultCache(
+        "build",
+        ["make"],
+        [str(tmp_path / "src" / "**" / "*.c"), "$CFLAGS"],
+        [str(tmp_path / "out")],
+        tmp_path / "cache",
+    )
+
+
+def test_hit_after_successful_run(tmp_path: Path) -> None:
+    (tmp_path / "src" / "lib").mkdir(parents=True)
+    (tmp_path / "src" / "lib" / "a.c").write_text("int a;")
+    (tmp_path / "out").write_text("binary")
+    with patch.dict(os.environ, {"CFLAGS": "-O2"}):
+        cache = make_cache(tmp_path)
+        assert not cache.hit()
+        cache.save()
+        assert make_cache(tmp_path).hit()
+
+        (tmp_path / "src" / "b.c").write_text("int b;")
+        assert not make_cache(tmp_path).hit()
+        make_cache(tmp_path).save()
+        assert make_cache(tmp_path).hit()
+
+    assert not make_cache(tmp_path).hit()
+
+
+def test_miss_when_output_changed(tmp_path: Path) -> None:
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.c").write_text("int a;")
+    (tmp_path / "out").write_text("binary")
+    make_cache(tmp_path).save()
+    (tmp_path / "out").write_text("other")
+    assert not make_cache(tmp_path).hit()
+    (tmp_path / "out").unlink()
+    assert not make_cache(tmp_path).hit()
+
+
+def test_hash_files_reuses_unchanged_hashes(tmp_path: Path) -> None:
+    path = tmp_path / "a.c"
+    path.write_text("int a;")
+    states = hash_files([str(path)], {})
+    with patch("src.fingerprint.hash_file") as hash_file:
+        assert hash_files([str(path)], states) == states
+        hash_file.assert_not_called()
+
+
+def test_inputs_relative_to_cwd_with_env(tmp_path: Path) -> None:
+    (tmp_path / "a.c").write_text("int a;")
+
+    def cache(env: Dict[str, str]) -> ResultCache:
+        return ResultCache(
+            "build",
+            ["make"],
+            ["*.c", "$CFLAGS"],
+            [],
+            tmp_path / "cache",
+            str(tmp_path),
+            env,
+        )
+
+    cache({"CFLAGS": "-O2"}).save()
+    assert cache({"CFLAGS": "-O2"}).hit()
+    assert not cache({"CFLAGS": "-O0"}).hit()
+    missing = cache({})
+    missing.fingerprint()
+    assert list(missing.files) == [str(tmp_path / "a.c")]
+
+
+def test_state_kept_per_config_and_cwd(tmp_path: Path) -> None:
+    (tmp_path / "one").mkdir()
+    (tmp_path / "two").mkdir()
+    (tmp_path / "one" / "a.c").write_text("int a;")
+    (tmp_path / "two" / "a.c").write_text("int b;")
+
+    def cache(config: str, cwd: str) -> ResultCache:
+        return ResultCache(
+            "build",
+            ["make"],
+            ["*.c"],
+            [],
+            tmp_path / "cache",
+            str(tmp_path / cwd),
+            {},
+            str(tmp_path / config),
+        )
+
+    cache("one.yaml", "one").save()
+    cache("two.yaml", "one").save()
+    cache("one.yaml", "two").save()
+    (tmp_path / "one" / "a.c").write_text("int c;")
+    cache("two.yaml", "one").save()
+    assert not cache("one.yaml", "one").hit()
+    assert cache("two.yaml", "one").hit()
+    assert cache("one.yaml", "two").hit()
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from src.history import (
+    History,
+    HistoryRecord,
+    SqliteHistory,
+    TextHistory,
+    get_history_times,
+)
+from src.resources import ResourceUsage
+
+
+def test_sqlite_history_window(tmp_path: Path) -> None:
+    history = SqliteHistory(tmp_path / "history.db")
+    for duration in range(1, 6):
+        history.add("build", HistoryRecord(duration, duration, 0, "host"))
+    history.add("build", HistoryRecord(6, 60, 1, "host"))
+    assert history.times("build") == [1, 2, 3, 4, 5]
+    assert history.times("build", 2) == [4, 5]
+    assert history.times("test") == []
+    records = history.records("build", 2)
+    assert [record.exit_code for record in records] == [0, 1]
+    assert records[1] == HistoryRecord(6, 60, 1, "host", "")
+
+
+def test_sqlite_history_stores_usage(tmp_path: Path) -> None:
+    history = SqliteHistory(tmp_path / "history.db")
+    usage = ResourceUsage(1.5, 0.25, 2048, 8, 16, 3, 4)
+    history.add("build", HistoryRecord(1, 2, 0, "host", "build.log", usage))
+    history.add("build", HistoryRecord(2, 3))
+    records = history.records("build")
+    assert vars(records[0].usage) == vars(usage)
+    assert records[1].usage is None
+
+
+def test_sqlite_history_imports_text_files(tmp_path: Path) -> None:
+    (tmp_path / "build.txt").write_text("3\n4\n")
+    history = SqliteHistory(tmp_path / "history.db")
+    assert history.times("build") == [3, 4]
+    history.add("build", HistoryRecord(0, 5))
+    assert SqliteHistory(tmp_path / "history.db").times("build") == [3, 4, 5]
+
+
+def test_sqlite_history_concurrent_writers(tmp_path: Path) -> None:
+    def write(worker: int) -> None:
+        history = SqliteHistory(tmp_path / "history.db")
+        for duration in range(50):
+            history.add("build", HistoryRecord(0, duration, 0, f"host{worker}"))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, range(8)))
+    assert len(SqliteHistory(tmp_path / "history.db").times("build", 1000)) == 400
+
+
+def test_history_is_abstract() -> None:
+    with pytest.raises(TypeError):
+        History()  # type: ignore[abstract]
+
+
+def test_text_history(tmp_path: Path) -> None:
+    history = TextHistory(tmp_path)
+    history.add("build", HistoryRecord(0, 3))
+    history.add("build", HistoryRecord(0, 4, 1))
+    history.add("build", HistoryRecord(0, 5))
+    assert history.times("build") == [3, 5]
+    assert history.times("build", 1) == [5]
+    assert get_history_times(tmp_path / "build.txt") == [3, 5]
+
+
+def test_sqlite_history_stores_estimator(tmp_path: Path) -> None:
+    history = SqliteHistory(tmp_path / "history.db")
+    assert history.estimator("build").count == 0
+    for duration in (10, 12, 11):
+        history.add("build", HistoryRecord(0, duration))
+    history.add("build", HistoryRecord(0, 99, 1))
+    estimator = history.estimator("build")
+    assert estimator.count == 3
+    assert estimator.expected() == 11
+
+
+def test_sqlite_history_estimator_forgets_runs_out_of_window(tmp_path: Path) -> None:
+    history = SqliteHistory(tmp_path / "history.db")
+    for duration in [100] * 5 + [10] * 5:
+        history.add("build", HistoryRecord(0, duration))
+    assert history.estimator("build", 5).expected() == 10
+    assert history.estimator("build", 10).expected() == 55
+    history.add("build", HistoryRecord(0, 20))
+    estimator = history.estimator("build", 10)
+    assert estimator.count == 10
+    assert estimator.expected() == 47
+    assert history.estimator("build", 2).expected() == 15
@@ -0,0 +1,52 @@
+import asyncio
+import gzip
+import os
+from pathlib import Path
+from subprocess import Popen
+
+from src.log_pump import LogPump
+from src.log_store import open_log_writer
+
+
+def start(tmp_path: Path) -> LogPump:
+    read_fd, write_fd = os.pipe()
+    Popen(["sh", "-c", "echo first; echo second; printf last"], stdout=write_fd)
+    os.close(write_fd)
+    return LogPump(read_fd, open_log_writer(str(tmp_path / "log.txt.gz")), True)
+
+
+def test_pump_on_thread(tmp_path: Path) -> None:
+    pump = start(tmp_path)
+    pump.start()
+    assert pump.wait()
+    assert pump.read_lines() == ["first", "second"]
+    assert pump.read_lines(True) == ["last"]
+    pump.close()
+    assert gzip.decompress((tmp_path / "log.txt.gz").read_bytes()) == (
+        b"first\nsecond\nlast"
+    )
+
+
+def test_pump_on_event_loop(tmp_path: Path) -> None:
+    async def run() -> None:
+        pump = start(tmp_path)
+        pump.attach()
+        assert await pump.wait_async()
+        assert pump.read_lines(True) == ["first", "second", "last"]
+        pump.close()
+
+    asyncio.run(run())
+    assert gzip.decompress((tmp_path / "log.txt.gz").read_bytes()).endswith(b"last")
+
+
+def test_tail_is_bounded(tmp_path: Path) -> None:
+    read_fd, write_fd = os.pipe()
+    Popen(["seq", "1000"], stdout=write_fd)
+    os.close(write_fd)
+    pump = LogPump(read_fd, open_log_writer(str(tmp_path / "log.txt")), False, 10, 12)
+    pump.start()
+    assert pump.wait()
+    assert pump.tail_lines() == ["998", "999", "1000"]
+    assert pump.read_lines(True) == []
+    pump.close()
+    assert (tmp_path / "log.txt").read_text().endswith("999\n1000\n")
@@ -0,0 +1,42 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from src.log_store import iter_log_lines, open_log_writer, prune_logs
+
+
+def test_gzip_round_trip(tmp_path: Path) -> None:
+    log = tmp_path / "build.txt.gz"
+    with open_log_writer(str(log)) as f:
+        f.write(b"first\nsecond")
+    assert list(iter_log_lines(str(log))) == ["first", "second"]
+
+
+def test_zstd_round_trip(tmp_path: Path) -> None:
+    pytest.importorskip("zstandard")
+    log = tmp_path / "build.txt.zst"
+    with open_log_writer(str(log)) as f:
+        f.write(b"first\nsecond\n")
+    assert list(iter_log_lines(str(log))) == ["first", "second"]
+
+
+def make_log(directory: Path, cmd_id: str, minute: int, size: int) -> Path:
+    log = directory / f"{cmd_id}_10-{minute:02}-00_01-01-2026.txt"
+    log.write_bytes(b"x" * size)
+    os.utime(log, (minute, minute))
+    return log
+
+
+def test_prune_keeps_last_logs_of_command(tmp_path: Path) -> None:
+    logs = [make_log(tmp_path, "build", minute, 10) for minute in range(5)]
+    other = make_log(tmp_path, "build_docs", 0, 10)
+    prune_logs(tmp_path, "build", keep=2, current=logs[-1])
+    assert sorted(tmp_path.iterdir()) == sorted([logs[3], logs[4], other])
+
+
+def test_prune_bounds_total_size(tmp_path: Path) -> None:
+    logs = [make_log(tmp_path, "build", minute, 10) for minute in range(5)]
+    other = make_log(tmp_path, "test", 5, 10)
+    prune_logs(tmp_path, "test", max_bytes=35, current=other)
+    assert sorted(tmp_path.iterdir()) == sorted([logs[3], logs[4], other])
@@ -0,0 +1,43 @@
+import random
+from typing import Dict
+
+from src.matcher import NESTED_LOOP_MAX_ERRORS, TriageMatcher
+
+
+def many_triages(triages: Dict[str, str]) -> Dict[str, str]:
+    padding = {f"unused error {i}": "" for i in range(NESTED_LOOP_MAX_ERRORS)}
+    return {**triages, **padding}
+
+
+def test_match_first_error_in_triage_order() -> None:
+    matcher = TriageMatcher(many_triages({"fatal": "first", "error": "second"}))
+    assert matcher.match("an error, then fatal") == 0
+    assert matcher.match("an error only") == 1
+    assert matcher.match("nothing to see") == -1
+
+
+def test_match_through_failure_links() -> None:
+    matcher = TriageMatcher(many_triages({"abcd": "long", "bc": "short"}))
+    assert matcher.match("xabcx") == 1
+    assert matcher.match("abcd") == 0
+
+
+def test_find_error_returns_first_line() -> None:
+    triages = many_triages({"[ERROR]": "Check the error", "[FATAL]": "Restart"})
+    matcher = TriageMatcher(triages)
+    logs = ["[INFO] ok", "  [FATAL] crash  ", "[ERROR] failure"]
+    assert matcher.find_error(logs) == ("[FATAL] crash", "Restart")
+    assert matcher.find_error(["[INFO] ok"]) is None
+
+
+def test_match_agrees_with_nested_loop() -> None:
+    random.seed(0)
+    triages = {
+        "".join(random.choices("abc", k=random.randint(1, 4))): "" for _ in range(60)
+    }
+    errors = list(triages)
+    matcher = TriageMatcher(triages)
+    for _ in range(500):
+        line = "".join(random.choices("abcd", k=20))
+        expected = next((i for i, error in enumerate(errors) if error in line), -1)
+        assert matcher.match(line) == expected
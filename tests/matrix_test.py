@@ -0,0 +1,67 @@
+from typing import Any, Dict, List
+
+import pytest
+
+from src.matrix import expand_matrix, load_commands
+
+
+def test_expand_matrix() -> None:
+    instances = expand_matrix(
+        {
+            "name": "Tests",
+            "id": "tests",
+            "matrix": {"python": ["3.10", "3.11"], "shard": 2},
+            "values": ["tox", "-e", "py{python}", "--shard={shard}/2", "{other}"],
+            "max_parallel": 2,
+        }
+    )
+    assert [instance["id"] for instance in instances] == [
+        "tests-3_10-0",
+        "tests-3_10-1",
+        "tests-3_11-0",
+        "tests-3_11-1",
+    ]
+    assert instances[1]["name"] == "Tests (python=3.10, shard=1)"
+    assert instances[1]["values"] == ["tox", "-e", "py3.10", "--shard=1/2", "{other}"]
+    assert "matrix" not in instances[1] and "max_parallel" not in instances[1]
+
+
+def test_expand_matrix_name_placeholder() -> None:
+    entry = {"name": "Shard {n}", "id": "s", "matrix": {"n": [1]}, "values": ["true"]}
+    assert expand_matrix(entry)[0]["name"] == "Shard 1"
+
+
+def test_load_commands_depends_on_matrix() -> None:
+    entries: List[Dict[str, Any]] = [
+        {"name": "a", "id": "a", "matrix": {"n": 3}, "values": ["true"]},
+        {"name": "b", "id": "b", "depends_on": "a", "values": ["true"]},
+    ]
+    commands = load_commands(entries)
+    assert [command.id for command in commands] == ["a-0", "a-1", "a-2", "b"]
+    assert commands[0].matrix == "a"
+    assert commands[3].matrix == ""
+    assert commands[3].depends_on == ["a-0", "a-1", "a-2"]
+    assert entries[1]["depends_on"] == "a"
+
+
+@pytest.mark.parametrize(
+    "matrix", [[], {}, {"n": []}, {"n": 0}, {"n": [{}]}, {"not a name": [1]}]
+)
+def test_invalid_matrix(matrix: object) -> None:
+    with pytest.raises(ValueError):
+        load_commands([{"name": "a", "id": "a", "matrix": matrix, "values": ["true"]}])
+
+
+def test_invalid_max_parallel() -> None:
+    with pytest.raises(ValueError):
+        load_commands(
+            [
+                {
+                    "name": "a",
+                    "id": "a",
+                    "matrix": {"n": 2},
+                    "max_parallel": 0,
+                    "values": ["true"],
+                }
+            ]
+        )
@@ -0,0 +1,85 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from src.history import HistoryRecord, SqliteHistory
+from src.milestones import (
+    CANDIDATE_LIMIT,
+    MilestoneIndex,
+    load_milestones,
+    normalize,
+)
+
+
+def build_log(steps: int) -> List[str]:
+    lines: List[str] = []
+    for step in range(steps):
+        lines.append(f"Step {step} of {steps}: stage-{chr(ord('a') + step)}")
+        lines.extend(f"compiling file_{step}_{i}.c" for i in range(9))
+    return lines
+
+
+def test_normalize() -> None:
+    assert normalize("  took 12.5s for abcdef0123 ") == "took #.#s for #"
+
+
+def test_index_learns_markers(tmp_path: Path) -> None:
+    index = MilestoneIndex(tmp_path / "index.json")
+    tracker = index.tracker()
+    tracker.feed(build_log(10))
+    index.update(tracker)
+    index.save()
+
+    index = MilestoneIndex(tmp_path / "index.json")
+    assert index.runs == 1
+    assert index.lines == 100
+    assert "Step # of #: stage-f" in index.markers
+
+    tracker = index.tracker()
+    tracker.feed(build_log(10)[:50])
+    assert tracker.fraction() == 0.5
+
+
+def test_markers_override_line_count(tmp_path: Path) -> None:
+    index = MilestoneIndex(tmp_path / "index.json")
+    tracker = index.tracker()
+    tracker.feed(build_log(10))
+    index.update(tracker)
+
+    tracker = index.tracker()
+    tracker.feed(["Step 8 of 10: stage-i"])
+    assert tracker.fraction() == 0.81
+
+
+def test_tracker_memory_is_bounded(tmp_path: Path) -> None:
+    tracker = MilestoneIndex(tmp_path / "index.json").tracker()
+    tracker.feed(f"unique line {chr(65 + i % 26)} {i}" for i in range(100000))
+    assert len(tracker.candidates) < CANDIDATE_LIMIT
+
+
+def test_load_milestones_from_previous_logs(tmp_path: Path) -> None:
+    log_file = tmp_path / "log.txt"
+    log_file.write_text("\n".join(build_log(5)))
+    history = SqliteHistory(tmp_path / "history.db")
+    history.add("test_milestones", HistoryRecord(0, 10, 0, "", str(log_file)))
+    index = load_milestones("test_milestones", history)
+    assert index.runs == 1
+    assert index.lines == 50
+
+
+@pytest.mark.parametrize("content", ['{"runs": 3, "lin', '{"runs": 3}', "[]"])
+def test_corrupt_index_is_rebuilt(
+    tmp_path: Path, build_root: Path, content: str
+) -> None:
+    index_file = build_root / "build" / "milestones" / "test_milestones.json"
+    index_file.parent.mkdir(parents=True)
+    index_file.write_text(content)
+    log_file = tmp_path / "log.txt"
+    log_file.write_text("\n".join(build_log(5)))
+    history = SqliteHistory(tmp_path / "history.db")
+    history.add("test_milestones", HistoryRecord(0, 10, 0, "", str(log_file)))
+    index = load_milestones("test_milestones", history)
+    assert index.runs == 1
+    assert index.lines == 50
+    assert MilestoneIndex(index_file).runs == 1
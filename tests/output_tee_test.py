@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from src.log_pump import LogPump
+from src.output_tee import OutputTee
+
+SCRIPT = "import sys; sys.stdout.buffer.write(bytes(range(256)) * 12289)"
+
+
+@pytest.mark.parametrize("mode", ["write", "append"])
+def test_output_tee(tmp_path: Path, mode: str) -> None:
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen([sys.executable, "-c", SCRIPT], stdout=write_fd)
+    os.close(write_fd)
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_APPEND if mode == "append" else 0)
+    console = os.open(tmp_path / "console", flags)
+    tee = OutputTee(read_fd, console)
+    pump = LogPump(tee.start(), open(tmp_path / "log", "wb"))
+    pump.start()
+    process.wait()
+    assert pump.wait()
+    pump.close()
+    os.close(console)
+
+    expected = bytes(range(256)) * 12289
+    assert (tmp_path / "log").read_bytes() == expected
+    assert (tmp_path / "console").read_bytes() == expected
@@ -1,6 +1,7 @@
 from typing import List
 from unittest.mock import patch
 
+from src.estimator import Estimator
 from src.progress import Progress
 
 
@@ -8,8 +9,8 @@ def test_progress_init_with_history() -> None:
     history: List[int] = [1, 2, 3]
     progress = Progress(history, False)
     assert progress.avg_time == 2
-    assert progress.max_value == 3
-    assert progress.min_value == 1
+    assert progress.max_time == 3
+    assert progress.min_time == 1
 
 
 def test_progress_init_without_history() -> None:
@@ -50,3 +51,10 @@ def test_progress_finish_without_bar() -> None:
     with patch("sys.stdout.write") as mock_stdout:
         progress.finish()
         mock_stdout.assert_called_with("\n")
+
+
+def test_progress_init_with_estimator() -> None:
+    estimator = Estimator.from_times([10, 10, 10, 10, 10, 10, 100])
+    progress = Progress([], False, estimator, "median")
+    assert progress.avg_time == 10
+    assert progress.max_time == 10
@@ -0,0 +1,62 @@
+import io
+import time
+
+from src.progress import ProgressEvent
+from src.renderer import Renderer, format_event
+
+
+class Terminal(io.StringIO):
+    def isatty(self) -> bool:
+        return True
+
+
+def make_event(cmd_id: str, state: str = "running") -> ProgressEvent:
+    return ProgressEvent(cmd_id, cmd_id, state, 5, 10, 0.5)
+
+
+def test_status_lines_are_rate_limited() -> None:
+    stream = io.StringIO()
+    renderer = Renderer(stream, status_interval=0.2)
+    assert renderer.display == "status"
+    for _ in range(100):
+        renderer.update(make_event("build"))
+    assert stream.getvalue() == ""
+    time.sleep(0.2)
+    renderer.update(make_event("build"))
+    renderer.update(make_event("test"))
+    assert stream.getvalue().count("\n") == 1
+    assert stream.getvalue().endswith("1 running, 0 finished: build  50%\n")
+
+
+def test_multi_line_redraws_are_capped() -> None:
+    stream = Terminal()
+    renderer = Renderer(stream, fps=1, max_lines=2)
+    assert renderer.display == "multi"
+    for i in range(50):
+        renderer.update(make_event(str(i)))
+    assert stream.getvalue().count("\n") == 2
+    renderer.next_draw = 0
+    renderer.update(make_event("0", "failed"))
+    frame = stream.getvalue().split("\x1b[2F\x1b[J")[-1]
+    assert frame.splitlines()[0] == "49 running, 1 finished (1 failed)"
+    assert len(frame.splitlines()) == 3
+
+
+def test_write_keeps_progress_below() -> None:
+    stream = Terminal()
+    renderer = Renderer(stream, display="line")
+    renderer.update(make_event("build"))
+    renderer.write("message")
+    assert stream.getvalue().endswith(
+        "\r\x1b[2Kmessage\n\r\x1b[2K1 running, 0 finished: build  50%"
+    )
+    renderer.close()
+    assert stream.getvalue().endswith("\r\x1b[2K")
+
+
+def test_format_event() -> None:
+    assert format_event(make_event("build")).endswith(
+        "|##########          |  50% 0:00:05 / 0:00:10"
+    )
+    event = ProgressEvent("build", "build", "running", 5, -1, None)
+    assert format_event(event).endswith("|                    |   ?% 0:00:05")
@@ -0,0 +1,24 @@
+from src.command import Command
+from src.history import HistoryRecord
+from src.report import format_report
+from src.resources import ResourceUsage
+
+
+def test_format_report() -> None:
+    command = Command({"name": "Build", "id": "build", "values": ["true"]})
+    records = [
+        HistoryRecord(0, 10, 0, "host", "", ResourceUsage(9, 1, 102400, 0, 0, 1, 1)),
+        HistoryRecord(0, 10, 1),
+    ]
+    lines = format_report(command, records)
+    assert lines[0] == "Build (build)"
+    assert len(lines) == 5
+    assert "100" in lines[2]
+    assert lines[4] == (
+        "2 runs, 1 failed, 1.0 cores busy on average (CPU-bound), peak RSS 100 MB"
+    )
+
+
+def test_format_report_without_runs() -> None:
+    command = Command({"name": "Build", "id": "build", "values": ["true"]})
+    assert format_report(command, [])[-1] == "No previous runs"
@@ -0,0 +1,17 @@
+import resource
+
+from src.resources import ResourceUsage
+
+
+def test_from_rusage() -> None:
+    usage = ResourceUsage.from_rusage(resource.getrusage(resource.RUSAGE_SELF))
+    assert usage.cpu_time() == usage.user_cpu + usage.sys_cpu
+    assert usage.max_rss > 0
+
+
+def test_summary() -> None:
+    usage = ResourceUsage(1.25, 0.5, 204800, 10, 20, 3, 4)
+    assert usage.summary() == (
+        "CPU 1.2s user 0.5s sys, max RSS 200 MB, I/O 10/20 blocks, "
+        "3/4 context switches"
+    )
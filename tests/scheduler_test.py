@@ -0,0 +1,250 @@
+import asyncio
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.command import Command, RunOptions
+from src.estimator import Estimator
+from src.history import HistoryRecord, SqliteHistory
+from src.matrix import load_commands
+from src.scheduler import Scheduler, load_scheduler
+
+
+def make_command(cmd_id: str, depends_on: List[str]) -> Command:
+    return Command(
+        {"name": cmd_id, "id": cmd_id, "values": ["true"], "depends_on": depends_on}
+    )
+
+
+def test_independent_commands_run_in_parallel() -> None:
+    commands = [make_command(cmd_id, []) for cmd_id in ("a", "b", "c")]
+
+    def run(self: Command, *args: Any) -> None:
+        time.sleep(0.3)
+
+    with patch.object(Command, "run", run):
+        start_time = time.time()
+        Scheduler(commands, max_parallel=3).run(RunOptions())
+        assert time.time() - start_time < 0.6
+
+
+def test_dependencies_run_first() -> None:
+    commands = [
+        make_command("test", ["build"]),
+        make_command("build", ["fetch"]),
+        make_command("fetch", []),
+    ]
+    order: List[str] = []
+
+    def run(self: Command, *args: Any) -> None:
+        order.append(self.id)
+
+    with patch.object(Command, "run", run):
+        Scheduler(commands, max_parallel=4).run(RunOptions())
+    assert order == ["fetch", "build", "test"]
+
+
+def test_fail_fast_stops_scheduling() -> None:
+    commands = [make_command("a", []), make_command("b", [])]
+    order: List[str] = []
+
+    def run(self: Command, *args: Any) -> None:
+        order.append(self.id)
+        raise RuntimeError(f"Command '{self.id}' FAILED")
+
+    with patch.object(Command, "run", run):
+        with pytest.raises(RuntimeError):
+            Scheduler(commands, max_parallel=1).run(RunOptions())
+    assert order == ["a"]
+
+
+def test_independent_branches_finish_without_fail_fast() -> None:
+    commands = [
+        make_command("a", []),
+        make_command("after_a", ["a"]),
+        make_command("b", []),
+    ]
+    order: List[str] = []
+
+    def run(self: Command, *args: Any) -> None:
+        order.append(self.id)
+        if self.id == "a":
+            raise RuntimeError(f"Command '{self.id}' FAILED")
+
+    with patch.object(Command, "run", run):
+        with pytest.raises(RuntimeError, match="a"):
+            Scheduler(commands, max_parallel=1, fail_fast=False).run(RunOptions())
+    assert order == ["a", "b"]
+
+
+def test_run_async_supervises_many_commands(tmp_path: Path) -> None:
+    commands = [
+        Command({"name": str(i), "id": f"async_{i}", "values": ["sleep", "0.5"]})
+        for i in range(100)
+    ]
+    commands.append(
+        Command(
+            {
+                "name": "last",
+                "id": "async_last",
+                "values": ["true"],
+                "depends_on": ["async_0"],
+            }
+        )
+    )
+    options = RunOptions(history=SqliteHistory(tmp_path / "history.db"))
+    start_time = time.time()
+    asyncio.run(Scheduler(commands, max_parallel=len(commands)).run_async(options))
+    assert time.time() - start_time < 10
+    assert len(options.history.times("async_last")) == 1
+
+
+def test_run_async_stops_on_failure(tmp_path: Path) -> None:
+    commands = [
+        Command({"name": "a", "id": "async_a", "values": ["false"]}),
+        Command(
+            {
+                "name": "b",
+                "id": "async_b",
+                "values": ["true"],
+                "depends_on": ["async_a"],
+            }
+        ),
+    ]
+    options = RunOptions(history=SqliteHistory(tmp_path / "history.db"))
+    with pytest.raises(RuntimeError, match="async_a"):
+        asyncio.run(Scheduler(commands).run_async(options))
+    assert options.history.times("async_b") == []
+
+
+def test_interrupted_run_stops_running_commands(tmp_path: Path) -> None:
+    commands = [
+        Command({"name": "sleep", "id": "interrupt_sleep", "values": ["sleep", "20"]})
+    ]
+    options = RunOptions(
+        history=SqliteHistory(tmp_path / "history.db"), on_progress=lambda event: None
+    )
+    main_thread = threading.main_thread().ident or 0
+    threading.Timer(1, signal.pthread_kill, (main_thread, signal.SIGINT)).start()
+    start_time = time.monotonic()
+    with pytest.raises(KeyboardInterrupt):
+        Scheduler(commands).run(options)
+    assert time.monotonic() - start_time < 10
+    assert options.interrupted.is_set()
+
+
+def test_run_async_only_runs_the_given_commands(tmp_path: Path) -> None:
+    commands = [
+        Command({"name": "a", "id": "only_a", "values": ["false"]}),
+        Command(
+            {
+                "name": "b",
+                "id": "only_b",
+                "values": ["true"],
+                "depends_on": ["only_a"],
+            }
+        ),
+    ]
+    options = RunOptions(history=SqliteHistory(tmp_path / "history.db"))
+    scheduler = Scheduler(commands)
+    asyncio.run(scheduler.run_async(options, only={"only_b"}))
+    assert options.history.records("only_a") == []
+    assert len(options.history.times("only_b")) == 1
+    assert scheduler.succeeded == {"only_a", "only_b"}
+
+
+def test_affected_commands_include_dependents() -> None:
+    commands = [
+        Command({"name": "c", "id": "c", "values": ["true"], "inputs": ["src/*.c"]}),
+        Command({"name": "h", "id": "h", "values": ["true"], "inputs": ["./inc/*.h"]}),
+        make_command("link", ["c"]),
+        make_command("test", ["link"]),
+        make_command("lint", []),
+    ]
+    scheduler = Scheduler(commands)
+    assert scheduler.affected({"src/a.c"}) == {"c", "link", "test"}
+    assert scheduler.affected({"inc/a.h"}) == {"h"}
+    assert scheduler.affected({"README.md"}) == set()
+
+
+def test_invalid_dependencies() -> None:
+    with pytest.raises(ValueError):
+        Scheduler([make_command("a", ["missing"])])
+    with pytest.raises(ValueError):
+        Scheduler([make_command("a", ["b"]), make_command("b", ["a"])])
+    with pytest.raises(ValueError):
+        Scheduler([make_command("a", []), make_command("a", [])])
+
+
+def test_load_scheduler() -> None:
+    data: Dict[str, Any] = {
+        "max_parallel": 4,
+        "fail_fast": False,
+        "commands": [{"name": "a", "id": "a", "values": ["true"]}],
+    }
+    scheduler = load_scheduler(data)
+    assert scheduler.max_parallel == 4
+    assert not scheduler.fail_fast
+    assert scheduler.commands[0].depends_on == []
+
+    with pytest.raises(ValueError):
+        load_scheduler({"max_parallel": "4", "commands": []})
+
+
+def test_matrix_runs_longest_expected_first(tmp_path: Path) -> None:
+    commands = load_commands(
+        [{"name": "t", "id": "t", "matrix": {"n": 4}, "values": ["true"]}]
+    )
+    history = SqliteHistory(tmp_path / "history.db")
+    for cmd_id, duration in (("t-0", 5), ("t-1", 20), ("t-3", 10)):
+        history.add(cmd_id, HistoryRecord(time.time(), duration))
+    order: List[str] = []
+
+    def run(self: Command, *args: Any) -> None:
+        order.append(self.id)
+
+    with patch("command.Command.run", run):
+        Scheduler(commands).run(RunOptions(history=history))
+    assert order[0] == "t-2"
+    assert order[1:] == ["t-1", "t-3", "t-0"]
+
+
+def test_matrix_parallelism_and_summary(caplog: pytest.LogCaptureFixture) -> None:
+    commands = load_commands(
+        [
+            {
+                "name": "t",
+                "id": "t",
+                "matrix": {"n": 6},
+                "max_parallel": 3,
+                "values": ["true"],
+            },
+            {"name": "lint", "id": "lint", "values": ["true"]},
+        ]
+    )
+    running: List[str] = []
+    peak: List[int] = []
+    lock = threading.Lock()
+
+    def run(self: Command, *args: Any) -> None:
+        with lock:
+            running.append(self.id)
+            peak.append(sum(cmd_id.startswith("t-") for cmd_id in running))
+        time.sleep(0.1)
+        with lock:
+            running.remove(self.id)
+        if self.id == "t-4":
+            raise RuntimeError(f"Command '{self.id}' FAILED")
+
+    with patch("command.Command.run", run):
+        with pytest.raises(RuntimeError, match="t-4"):
+            Scheduler(commands, fail_fast=False).run(
+                RunOptions(history=MagicMock(**{"estimator.return_value": Estimator()}))
+            )
+    assert max(peak) == 3
+    assert "Matrix 't': 5 of 6 passed, 1 FAILED (t-4)" in caplog.text
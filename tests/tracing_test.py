@@ -0,0 +1,86 @@
+import json
+import pstats
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+
+from src.command import Command, RunOptions
+from src.history import SqliteHistory
+from src.tracing import NO_SPAN, Profiler, Tracer, span
+
+
+def load_spans(path: Path) -> Dict[str, List[Dict[str, Any]]]:
+    events: List[Dict[str, Any]] = json.loads(path.read_text())["traceEvents"]
+    lanes = {e["tid"]: e["args"]["name"] for e in events if e["ph"] == "M"}
+    spans: Dict[str, List[Dict[str, Any]]] = {}
+    for event in events:
+        if event["ph"] == "X":
+            spans.setdefault(lanes[event["tid"]], []).append(event)
+    return spans
+
+
+def test_tracer_writes_nested_spans(tmp_path: Path) -> None:
+    tracer = Tracer()
+    with tracer.span("outer", "pipeline", attempt=0):
+        with tracer.span("inner", "pipeline"):
+            pass
+        with tracer.span("other", "command"):
+            pass
+    tracer.save(str(tmp_path / "trace.json"))
+
+    spans = load_spans(tmp_path / "trace.json")
+    inner, outer = spans["pipeline"]
+    assert (inner["name"], outer["name"]) == ("inner", "outer")
+    assert outer["args"] == {"attempt": 0}
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+    assert [event["name"] for event in spans["command"]] == ["other"]
+
+
+def test_span_disabled() -> None:
+    assert span(None, "name", "lane") is NO_SPAN
+
+
+def test_run_traces_phases(tmp_path: Path) -> None:
+    cmd = Command(
+        {"name": "test_command", "id": "test_run_traces_phases", "values": ["false"]}
+    )
+    options = RunOptions(
+        "tests/assets/sample_triage_file.json",
+        history=SqliteHistory(tmp_path / "history.db"),
+        tracer=Tracer(),
+    )
+    try:
+        cmd.run(options)
+    except RuntimeError:
+        pass
+    assert options.tracer
+    options.tracer.save(str(tmp_path / "trace.json"))
+
+    names = [e["name"] for e in load_spans(tmp_path / "trace.json")[cmd.id]]
+    assert names == [
+        "history load",
+        "spawn",
+        "execution",
+        "history write",
+        "log prune",
+        "triage",
+        "run test_command",
+    ]
+    Path(options.history.records(cmd.id)[-1].log).unlink()
+
+
+def test_profiler_dumps_stats_of_all_threads(tmp_path: Path) -> None:
+    def work() -> int:
+        return sum(range(1000))
+
+    profiler = Profiler()
+    profiler.start()
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+    profiler.stop(str(tmp_path / "profile.prof"))
+
+    stats = pstats.Stats(str(tmp_path / "profile.prof"))
+    functions = [function for _, _, function in stats.stats]  # type: ignore[attr-defined]
+    assert "work" in functions
@@ -0,0 +1,63 @@
+import json
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.atomic_file import get_cache_file
+from src.triage_cache import load_matcher
+
+
+def test_load_matcher_uses_cache(tmp_path: Path) -> None:
+    triage_file = tmp_path / "triage.json"
+    triage_file.write_text(json.dumps({"[ERROR]": "Fix it"}))
+    cache_dir = tmp_path / "cache"
+
+    matcher = load_matcher(str(triage_file), cache_dir)
+    assert matcher.resolutions == ["Fix it"]
+    assert get_cache_file(str(triage_file), cache_dir).is_file()
+
+    with patch("json.loads") as mock_loads:
+        assert load_matcher(str(triage_file), cache_dir).resolutions == ["Fix it"]
+        mock_loads.assert_not_called()
+
+
+def test_load_matcher_invalidated_on_change(tmp_path: Path) -> None:
+    triage_file = tmp_path / "triage.json"
+    triage_file.write_text(json.dumps({"[ERROR]": "Fix it"}))
+    cache_dir = tmp_path / "cache"
+    load_matcher(str(triage_file), cache_dir)
+
+    triage_file.write_text(json.dumps({"[ERROR]": "Fix it differently"}))
+    stat = triage_file.stat()
+    os.utime(triage_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert load_matcher(str(triage_file), cache_dir).resolutions == [
+        "Fix it differently"
+    ]
+
+
+def test_load_matcher_ignores_corrupt_cache(tmp_path: Path) -> None:
+    triage_file = tmp_path / "triage.json"
+    triage_file.write_text(json.dumps({"[ERROR]": "Fix it"}))
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    get_cache_file(str(triage_file), cache_dir).write_bytes(b"corrupt")
+    assert load_matcher(str(triage_file), cache_dir).resolutions == ["Fix it"]
+
+
+def test_load_matcher_invalid_json(tmp_path: Path) -> None:
+    triage_file = tmp_path / "triage.json"
+    triage_file.write_text("{invalid")
+    with pytest.raises(Exception):
+        load_matcher(str(triage_file), tmp_path / "cache")
+
+
+def test_load_matcher_keeps_loaded_matchers(tmp_path: Path) -> None:
+    triage_file = tmp_path / "triage.json"
+    triage_file.write_text(json.dumps({"[ERROR]": "Fix it"}))
+    cache_dir = tmp_path / "cache"
+    matcher = load_matcher(str(triage_file), cache_dir)
+    with patch("src.triage_cache.read_cache") as read_cache:
+        assert load_matcher(str(triage_file), cache_dir) is matcher
+        read_cache.assert_not_called()
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+from pathlib import Path
+from typing import Any, Callable, Coroutine
+
+import pytest
+
+from src.command import RunOptions
+from src.history import SqliteHistory
+from src.renderer import MULTI, STATUS
+from src.wait_elegantly import args_parser, get_renderer, watch
+
+CONFIG = """
+commands:
+  - name: build
+    id: watch_build
+    values: ["sh", "-c", "echo >> {tmp}/build.runs; sleep {sleep}"]
+    inputs: ["{tmp}/src/*.c"]
+  - name: test
+    id: watch_test
+    values: ["sh", "-c", "echo >> {tmp}/test.runs"]
+    depends_on: [watch_build]
+  - name: lint
+    id: watch_lint
+    values: ["sh", "-c", "echo >> {tmp}/lint.runs"]
+    inputs: ["{tmp}/*.md"]
+"""
+
+
+def watch_until(
+    tmp_path: Path, sleep: float, scenario: Callable[[], Coroutine[Any, Any, None]]
+) -> None:
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.c").write_text("int a;")
+    config = tmp_path / "config.yaml"
+    config.write_text(CONFIG.format(tmp=tmp_path, sleep=sleep))
+    options = RunOptions(history=SqliteHistory(tmp_path / "history.db"), cache=False)
+
+    async def run() -> None:
+        task = asyncio.create_task(watch(str(config), options, debounce=0.1))
+        try:
+            await asyncio.wait_for(scenario(), 20)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def runs(tmp_path: Path, name: str) -> int:
+    path = tmp_path / f"{name}.runs"
+    return len(path.read_text().splitlines()) if path.exists() else 0
+
+
+async def until(condition: Callable[[], bool]) -> None:
+    while not condition():
+        await asyncio.sleep(0.05)
+
+
+def test_watch_runs_affected_commands_and_dependents(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        await until(lambda: runs(tmp_path, "test") == 1)
+        await asyncio.sleep(1)
+        (tmp_path / "src" / "a.c").write_text("int b;")
+        await until(lambda: runs(tmp_path, "test") == 2)
+
+    watch_until(tmp_path, 0, scenario)
+    assert runs(tmp_path, "build") == 2
+    assert runs(tmp_path, "lint") == 1
+
+
+def test_watch_cancels_outdated_run(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        await until(lambda: runs(tmp_path, "build") == 1)
+        (tmp_path / "src" / "a.c").write_text("int b;")
+        await until(lambda: runs(tmp_path, "build") == 2)
+
+    start_time = time.monotonic()
+    watch_until(tmp_path, 30, scenario)
+    assert time.monotonic() - start_time < 20
+    assert runs(tmp_path, "test") == 0
+
+
+def test_granular_shows_progress_bars(caplog: pytest.LogCaptureFixture) -> None:
+    assert get_renderer(args_parser().parse_args(["config.yaml", "-g"])) is None
+    assert not caplog.records
+    renderer = get_renderer(args_parser().parse_args(["config.yaml"]))
+    assert renderer is not None and renderer.display in (MULTI, STATUS)
+
+
+def test_granular_ignored_with_another_display(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    args = args_parser().parse_args(["config.yaml", "-g", "--display", "line"])
+    with caplog.at_level(logging.WARNING):
+        renderer = get_renderer(args)
+    assert renderer is not None and renderer.display == "line"
+    assert "--granular is ignored with the line display" in caplog.text
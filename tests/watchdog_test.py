@@ -0,0 +1,67 @@
+import os
+import time
+from pathlib import Path
+from subprocess import Popen
+from typing import Tuple
+
+from src.exit_waiter import ExitWaiter
+from src.log_pump import LogPump
+from src.watchdog import Watchdog
+
+
+def start(tmp_path: Path, script: str) -> Tuple[ExitWaiter, LogPump]:
+    read_fd, write_fd = os.pipe()
+    process = Popen(
+        ["sh", "-c", script], stdout=write_fd, stderr=write_fd, start_new_session=True
+    )
+    os.close(write_fd)
+    output = LogPump(read_fd, open(tmp_path / "log.txt", "wb"))
+    output.start()
+    return ExitWaiter(process), output
+
+
+def watch(watchdog: Watchdog, waiter: ExitWaiter) -> None:
+    while not waiter.wait(0.05):
+        watchdog.check()
+
+
+def test_timeout_stops_process_group(tmp_path: Path) -> None:
+    waiter, output = start(tmp_path, "sleep 30 & echo started; wait")
+    watchdog = Watchdog("test", waiter, output, timeout=0.2)
+    start_time = time.monotonic()
+    watch(watchdog, waiter)
+    assert watchdog.reason == "timed out after 0.2s"
+    assert waiter.process.returncode != 0
+    assert output.wait(2)
+    assert time.monotonic() - start_time < 5
+    output.close()
+
+
+def test_stop_kills_processes_left_behind(tmp_path: Path) -> None:
+    waiter, output = start(
+        tmp_path,
+        "trap 'exit 1' TERM; (trap '' TERM; exec sleep 30) & echo started; wait",
+    )
+    watchdog = Watchdog("test", waiter, output, timeout=0.2)
+    watch(watchdog, waiter)
+    assert waiter.process.returncode == 1
+    assert output.wait(2)
+    output.close()
+
+
+def test_stall_escalates_to_kill(tmp_path: Path) -> None:
+    waiter, output = start(tmp_path, "trap '' TERM; echo started; sleep 30")
+    watchdog = Watchdog("test", waiter, output, stall_timeout=0.2, kill_grace=0.2)
+    watch(watchdog, waiter)
+    assert watchdog.reason == "stalled, no output for 0.2s"
+    assert watchdog.killed
+    output.close()
+
+
+def test_no_limit(tmp_path: Path) -> None:
+    waiter, output = start(tmp_path, "sleep 0.3")
+    watchdog = Watchdog("test", waiter, output)
+    watch(watchdog, waiter)
+    assert not watchdog.reason
+    assert waiter.process.returncode == 0
+    output.close()